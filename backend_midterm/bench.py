@@ -0,0 +1,139 @@
+# bench.py  (load test แบบทำซ้ำได้: รันแอปใน process กับฐานข้อมูลชั่วคราว แล้วรายงานผลเป็น JSON)
+#   python bench.py                          -> ทุก workload, พิมพ์ JSON
+#   python bench.py --out bench.json --concurrency 32 --requests 2000
+#   BOOKING_MODE=queue python bench.py --only booking
+#   python bench.py --db synth.db            -> คัดลอกฐานข้อมูลที่สร้างด้วย synth.py มาใช้แทนการ seed
+from __future__ import annotations
+import argparse, json, os, random, shutil, sqlite3, subprocess, sys, tempfile, threading, time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+WORKLOADS = ["catalog", "detail", "search", "mixed", "booking"]
+
+
+def _pct(sorted_ms: list[float], p: float) -> float:
+    if not sorted_ms: return 0.0
+    return round(sorted_ms[min(int(len(sorted_ms) * p), len(sorted_ms) - 1)], 3)
+
+def _run(client, make_request, n: int, concurrency: int) -> dict:
+    """ยิง n request ด้วย thread concurrency ตัว; make_request(i) -> (method, url, json body | None)"""
+    lat, status = [], Counter()
+    lock = threading.Lock()
+    def one(i):
+        method, url, body = make_request(i)
+        t0 = time.perf_counter()
+        r = client.request(method, url, json=body)
+        ms = (time.perf_counter() - t0) * 1000
+        with lock:
+            lat.append(ms); status[r.status_code] += 1
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(n)))
+    secs = time.perf_counter() - t0
+    lat.sort()
+    return {"requests": n, "seconds": round(secs, 3), "rps": round(n / secs, 1),
+            "p50_ms": _pct(lat, 0.50), "p99_ms": _pct(lat, 0.99), "max_ms": round(lat[-1], 3) if lat else 0.0,
+            "status": {str(k): v for k, v in sorted(status.items())}}
+
+def _car_counts(db: str, service_id: int, car_type: str) -> tuple[int, int]:
+    """(ที่นั่งรวมในตั๋วของตู้นี้, reserved_seats) อ่านจาก SQLite ตรง ๆ"""
+    with sqlite3.connect(db) as conn:
+        tickets = conn.execute("SELECT COALESCE(SUM(quantity), 0) FROM ticket WHERE service_id = ? AND car_type = ?",
+                               (service_id, car_type)).fetchone()[0]
+        reserved = conn.execute("SELECT reserved_seats FROM servicecar WHERE service_id = ? AND car_type = ?",
+                                (service_id, car_type)).fetchone()[0]
+    return tickets, reserved
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None) -> dict:
+    ap = argparse.ArgumentParser(description="Railway API benchmark (ฐานข้อมูลชั่วคราว)")
+    ap.add_argument("--requests", type=int, default=1000, help="request ต่อ workload อ่าน")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--burst", type=int, default=0, help="จำนวนคำขอจองใน burst (0 = ที่นั่งทั้งหมด + 25%%)")
+    ap.add_argument("--car-type", default="Reserved")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--only", choices=WORKLOADS, action="append")
+    ap.add_argument("--out", help="เขียน JSON ลงไฟล์ (ไม่ใส่ = stdout)")
+    ap.add_argument("--db", help="ฐานข้อมูลเริ่มต้น (เช่นจาก synth.py) แทนการ seed")
+    ap.add_argument("--keep", action="store_true", help="ไม่ลบโฟลเดอร์ฐานข้อมูลชั่วคราว")
+    args = ap.parse_args(argv)
+    workloads = args.only or WORKLOADS
+    rnd = random.Random(args.seed)
+
+    # แอปเปิด database.db ตาม cwd -> ย้ายไปโฟลเดอร์ชั่วคราวก่อน import main
+    here = os.path.dirname(os.path.abspath(__file__))
+    tmp = tempfile.mkdtemp(prefix="railway-bench-")
+    db = os.path.join(tmp, "database.db")
+    if args.db: shutil.copyfile(args.db, db)
+    cwd = os.getcwd()
+    os.chdir(tmp); sys.path.insert(0, here)
+    try:
+        from fastapi.testclient import TestClient
+        import main as app_main
+        from reservation import BOOKING_MODE
+
+        report = {"commit": _commit(), "booking_mode": BOOKING_MODE, "concurrency": args.concurrency,
+                  "seed": args.seed, "results": {}}
+        with TestClient(app_main.app) as c:
+            report["seed_report"] = app_main.app.state.seed_report
+            ids = [s["id"] for s in c.get("/services").json()]
+            today = date.today()
+
+            def catalog(i):
+                return "GET", ("/lines", "/stations", "/services")[i % 3], None
+            def detail(i):
+                return "GET", f"/services/{rnd.choice(ids)}", None
+            def search(i):
+                h = rnd.randrange(5, 22)
+                return "GET", f"/services/search?start={today}T{h:02d}:00:00&end={today}T{h + 2:02d}:00:00", None
+            def mixed(i):
+                return (catalog, detail, detail, search)[i % 4](i)
+
+            for name, make in (("catalog", catalog), ("detail", detail), ("search", search), ("mixed", mixed)):
+                if name in workloads:
+                    _run(c, make, min(args.requests, 50), args.concurrency)   # warm-up (cache, timetable)
+                    report["results"][name] = _run(c, make, args.requests, args.concurrency)
+
+            if "booking" in workloads:
+                # burst จองทีละ 1 ที่ บนตู้เดียว มากกว่าที่นั่งที่มี -> ส่วนเกินต้องได้ 409 และต้องไม่ขายเกิน
+                target = rnd.choice(ids)
+                car = next(x for x in c.get(f"/services/{target}").json()["cars"] if x["car_type"] == args.car_type)
+                burst = args.burst or car["available_seats"] + max(car["available_seats"] // 4, 1)
+                before = _car_counts(db, target, app_main.CarTypeEnum(args.car_type).name)
+                body = {"service_id": target, "car_type": args.car_type, "quantity": 1}
+                res = _run(c, lambda i: ("POST", "/tickets", body), burst, args.concurrency)
+                ok = res["status"].get("200", 0)
+                res.update(service_id=target, total_seats=car["total_seats"], sold=ok,
+                           rate_409=round(res["status"].get("409", 0) / burst, 4))
+                report["results"]["booking"] = res
+        # หลัง shutdown (memory mode flush แล้ว): ตรวจจาก DB โดยตรง
+        if "booking" in workloads:
+            tickets, reserved = _car_counts(db, target, app_main.CarTypeEnum(args.car_type).name)
+            res = report["results"]["booking"]
+            # ฐานที่มีตั๋วอยู่ก่อน: เทียบส่วนต่าง (ตั๋วตลอดสายทีละ 1 ที่ -> reserved_seats เพิ่มเท่าจำนวนที่ขายได้พอดี)
+            res.update(tickets_in_db=tickets, reserved_seats=reserved,
+                       consistent=tickets - before[0] == reserved - before[1] == res["sold"] and reserved <= res["total_seats"])
+    finally:
+        os.chdir(cwd)
+        if not args.keep: shutil.rmtree(tmp, ignore_errors=True)
+        else: report["database"] = db
+
+    out = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w") as f: f.write(out + "\n")
+    else:
+        print(out)
+    return report
+
+
+if __name__ == "__main__":
+    rep = main()
+    sys.exit(0 if rep["results"].get("booking", {}).get("consistent", True) else 1)
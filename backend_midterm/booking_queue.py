@@ -0,0 +1,187 @@
+# booking_queue.py  (จองหลายรายการในทรานแซกชันเดียว: คิว + writer เดียว + group commit, และ batch แบบ all-or-nothing)
+from __future__ import annotations
+import os, queue, threading, time
+from concurrent.futures import Future, InvalidStateError
+from typing import Optional
+
+from sqlmodel import Session, select
+from sqlalchemy import update, insert, bindparam, func
+
+from database import engine
+from model import Service, ServiceCar, ServiceStop, Ticket, TicketRequest, TicketOut, CarTypeEnum
+from inventory import leg_orders, load_tree, pack
+from reservation import SoldOut
+import metrics
+
+BOOKING_BATCH_MAX = int(os.getenv("BOOKING_BATCH_MAX", "256"))
+BOOKING_LINGER_MS = float(os.getenv("BOOKING_LINGER_MS", "2"))
+
+
+class Conflict(Exception):
+    """มีคนอื่นแก้ ServiceCar ระหว่าง batch (version ไม่ตรง) -> ทำทั้ง batch ใหม่"""
+
+
+def reserve_batch(session: Session, reqs: list[TicketRequest], row=Ticket) -> tuple[list, dict]:
+    """จองหลายรายการใน session เดียว: โหลดขบวน/ตู้/ป้ายของทุกรายการด้วย query คงที่ แล้วจองตามลำดับ
+    คืน (ผลต่อรายการ: แถวจาก row(...) ที่ยังไม่ insert หรือ Exception, {car_id: (car, tree)} ที่ต้องเขียนกลับ)
+    row = Ticket หรือ factory ของ SeatHold (holds.py); ผู้เรียก write_cars แล้วค่อย insert_rows"""
+    sids = {r.service_id for r in reqs}
+    found = set(session.exec(select(Service.id).where(Service.id.in_(sids))).all())
+    cars = {(c.service_id, c.car_type): c for c in session.exec(select(ServiceCar).where(ServiceCar.service_id.in_(sids)))}
+    stops: dict[int, list] = {}
+    q = (select(ServiceStop.service_id, ServiceStop.station_id, ServiceStop.stop_order)
+         .where(ServiceStop.service_id.in_(sids)).order_by(ServiceStop.service_id, ServiceStop.stop_order))
+    for sid, st, order in session.exec(q):
+        stops.setdefault(sid, []).append((st, order))
+
+    trees, results = {}, []
+    for r in reqs:
+        car = cars.get((r.service_id, CarTypeEnum(r.car_type)))
+        if r.service_id not in found: results.append(LookupError("Service not found")); continue
+        if car is None: results.append(LookupError("Car type not found for this service")); continue
+        st = stops.get(r.service_id, [])
+        try:
+            a, b = leg_orders(st, r.from_station_id, r.to_station_id)
+        except ValueError as e:
+            results.append(e); continue
+        first = st[0][1]
+        if car.id not in trees: trees[car.id] = (car, load_tree(car.segment_load, car.reserved_seats, len(st) - 1))
+        tree = trees[car.id][1]
+        if tree.max(a - first, b - first) + r.quantity > car.total_seats:
+            results.append(SoldOut()); continue
+        tree.add(a - first, b - first, r.quantity)
+        t = row(service_id=r.service_id, car_type=r.car_type, quantity=r.quantity, from_order=a, to_order=b)
+        results.append(t)
+    return results, trees
+
+def insert_rows(session: Session, rows: list):
+    """INSERT แถวใหม่ (Ticket / SeatHold) ทั้งชุดด้วย executemany เดียว โดยจอง id เองแบบ patterns.materialize
+    ต้องเรียกหลัง write_cars: ถือ write lock ของ SQLite อยู่แล้ว max(id) จึงไม่เปลี่ยนจนกว่าจะ commit
+    (ไม่จับคู่ id จาก RETURNING เพราะ SQLite ไม่รับประกันลำดับแถวที่คืน)"""
+    if not rows: return
+    table = type(rows[0]).__table__
+    next_id = (session.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+    for i, t in enumerate(rows): t.id = next_id + i
+    session.execute(insert(table), [{c.name: getattr(t, c.name) for c in table.columns} for t in rows])
+
+def write_cars(session: Session, trees: dict):
+    """เขียน segment_load/reserved_seats กลับแบบ CAS ด้วย version เป็น UPDATE เดียว (executemany);
+    rowcount รวมไม่ครบทุกตู้ = มีคนแก้ก่อน -> rollback แล้ว raise Conflict"""
+    if not trees: return
+    c = ServiceCar.__table__.c
+    res = session.execute(update(ServiceCar.__table__)
+                          .where(c.id == bindparam("car_id"), c.version == bindparam("old_version"))
+                          .values(segment_load=bindparam("load"), reserved_seats=bindparam("reserved"), version=c.version + 1),
+                          [{"car_id": car.id, "old_version": car.version, "load": pack(tree), "reserved": tree.max(0, tree.n)}
+                           for car, tree in trees.values()])
+    if res.rowcount != len(trees):
+        session.rollback(); raise Conflict()
+
+def _to_out(t: Ticket) -> TicketOut:
+    return TicketOut(id=t.id, service_id=t.service_id, car_type=t.car_type, quantity=t.quantity,
+                     from_order=t.from_order, to_order=t.to_order)
+
+
+def _resolve(fut: Future, res):
+    """ส่งผลให้ Future ของ request; Future ที่มีผลไปแล้วไม่ทำให้ writer thread ตาย"""
+    try:
+        if isinstance(res, Exception): fut.set_exception(res)
+        else: fut.set_result(res)
+    except InvalidStateError:
+        pass
+
+
+class BookingQueue:
+    """POST /tickets ส่งคำขอเข้าคิว แล้วรอ Future; writer thread เดียวดึงครั้งละไม่เกิน max_batch รายการ
+    (หรือรอไม่เกิน linger_ms หลังรายการแรก) ตรวจที่นั่งแล้ว commit ทั้งชุดทีเดียว
+    ผลของแต่ละรายการ: TicketOut หรือ LookupError (404) / ValueError (400) / SoldOut (409)"""
+
+    def __init__(self, max_batch: int = BOOKING_BATCH_MAX, linger_ms: float = BOOKING_LINGER_MS):
+        self.max_batch, self.linger = max_batch, linger_ms / 1000
+        self._q: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, req: TicketRequest) -> Future:
+        fut: Future = Future()
+        self._q.put((req, fut))
+        return fut
+
+    # ---------- writer ----------
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is None: return
+            batch = [item]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._q.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._commit(batch); return
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: list):
+        # request ที่หมดเวลารอ/ถูกยกเลิกไปก่อน (Future ถูก cancel) -> ไม่จอง; ที่เหลือ Future เป็น running ยกเลิกไม่ได้แล้ว
+        batch = [(req, fut) for req, fut in batch if fut.set_running_or_notify_cancel()]
+        if not batch: return
+        for _ in range(3):
+            try:
+                results = self._apply([req for req, _ in batch])
+                break
+            except Conflict:
+                metrics.booking_retries.inc("queue")
+                continue
+            except Exception as e:
+                for _, fut in batch: _resolve(fut, e)
+                return
+        else:
+            results = [SoldOut("concurrency conflict")] * len(batch)
+        for (_, fut), res in zip(batch, results): _resolve(fut, res)
+
+    def _apply(self, reqs: list[TicketRequest]) -> list:
+        """ทั้ง batch ในทรานแซกชันเดียว; รายการที่จองไม่ได้ไม่ทำให้รายการอื่นล้ม"""
+        with Session(engine) as session:
+            results, trees = reserve_batch(session, reqs)
+            write_cars(session, trees)
+            insert_rows(session, [t for t in results if isinstance(t, Ticket)])
+            out = [_to_out(t) if isinstance(t, Ticket) else t for t in results]
+            session.commit()
+            return out
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="booking-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """ปิดคิว: รายการที่ค้างอยู่ถูก commit ก่อน writer จบ"""
+        if self._thread is not None:
+            self._q.put(None); self._thread.join(); self._thread = None
+
+
+def book_all_or_nothing(reqs: list[TicketRequest], retries: int = 3) -> list[TicketOut]:
+    """จองทุกรายการในทรานแซกชันเดียว ถ้ารายการใดจองไม่ได้ -> rollback ทั้งหมดแล้ว raise error ของรายการแรกที่ล้ม
+    (ข้อความขึ้นต้นด้วย "Item i:")"""
+    for _ in range(retries):
+        with Session(engine) as session:
+            results, trees = reserve_batch(session, reqs)
+            for i, res in enumerate(results):
+                if isinstance(res, Exception):
+                    session.rollback()
+                    raise type(res)(f"Item {i}: {str(res) or 'Not enough seats'}")
+            try:
+                write_cars(session, trees)
+            except Conflict:
+                metrics.booking_retries.inc("batch")
+                continue
+            insert_rows(session, results)
+            out = [_to_out(t) for t in results]
+            session.commit()
+            return out
+    raise SoldOut("concurrency conflict")
+
+
+booking_queue = BookingQueue()
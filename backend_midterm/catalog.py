@@ -0,0 +1,119 @@
+# catalog.py  (in-process cache ของข้อมูลที่แทบไม่เปลี่ยน: สาย, สถานี, ป้ายหยุด/ผังตู้ของขบวน)
+from __future__ import annotations
+import sqlite3, threading
+from typing import Any, Callable, Hashable, Optional
+
+from database import MULTI_WORKER
+
+
+class SharedVersion:
+    """version ของ catalog ที่ทุก process เห็นร่วมกัน: แถวเดียวในตาราง catalogversion
+    เช็กถูก ๆ ด้วย PRAGMA data_version บน connection ของตัวเอง — ค่าเปลี่ยนเมื่อ connection อื่น (process ไหนก็ได้) commit
+    จึงอ่านตาราง version เฉพาะเมื่อมี commit ใหม่ ไม่ใช่ทุก request"""
+
+    def __init__(self, path: str = "database.db"):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._data_version: Optional[int] = None
+        self._value = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA busy_timeout=5000")
+        return self._conn
+
+    def _read(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT version FROM catalogversion WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    def current(self) -> int:
+        with self._lock:
+            conn = self._connection()
+            dv = conn.execute("PRAGMA data_version").fetchone()[0]
+            if dv != self._data_version:
+                self._data_version, self._value = dv, self._read(conn)
+            return self._value
+
+    def bump(self) -> int:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT INTO catalogversion (id, version) VALUES (1, 1) "
+                         "ON CONFLICT(id) DO UPDATE SET version = version + 1")
+            # commit ของ connection ตัวเองไม่เปลี่ยน data_version -> อัปเดตค่าที่จำไว้เอง
+            self._value = self._read(conn)
+            return self._value
+
+
+class CatalogCache:
+    """cache แบบมี version: create_service เรียก bump() แล้วทุก entry ที่สร้างจาก version เก่าจะถูกทิ้ง
+    shared (MULTI_WORKER=1): bump() เพิ่ม version กลางใน DB ด้วย และทุก get เช็กว่า worker อื่น bump หรือยัง"""
+
+    def __init__(self, shared: Optional[SharedVersion] = None):
+        self.version = 0
+        self.shared = shared
+        self._seen = 0   # version กลางล่าสุดที่เห็น
+        self._lock = threading.Lock()
+        self._data: dict[Hashable, tuple[int, Any]] = {}
+        self._building: dict[Hashable, threading.Lock] = {}
+
+    def _invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+
+    def bump(self) -> int:
+        if self.shared is not None: self._seen = self.shared.bump()
+        self._invalidate()
+        return self.version
+
+    def sync(self):
+        """ทิ้ง cache ถ้า version กลางเปลี่ยน (worker อื่นแก้ catalog)"""
+        if self.shared is None: return
+        v = self.shared.current()
+        if v != self._seen:
+            self._seen = v
+            self._invalidate()
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """คืนค่าจาก cache หรือเรียก build(); คืน None ได้ (จะไม่ถูก cache)
+        build ทีละ key ทีละคน (single-flight) — request ที่มาพร้อมกันรอผลเดียวกันแทนการ build ซ้ำ"""
+        self.sync()
+        v = self.version
+        hit = self._data.get(key)
+        if hit is not None and hit[0] == v:
+            return hit[1]
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            v = self.version
+            hit = self._data.get(key)
+            if hit is not None and hit[0] == v:
+                return hit[1]
+            val = build()
+            if val is not None:
+                with self._lock:
+                    # ถ้ามีคน bump ระหว่าง build ค่าที่ได้อาจเก่าแล้ว — ไม่เก็บ
+                    if self.version == v: self._data[key] = (v, val)
+            return val
+
+    def get_many(self, ns: str, ids: list, build_many: Callable[[list], dict]) -> dict:
+        """เหมือน get() แต่หลาย id ในครั้งเดียว: build_many(ids ที่ miss) -> {id: value}"""
+        self.sync()
+        v = self.version
+        out, miss = {}, []
+        for i in ids:
+            hit = self._data.get((ns, i))
+            if hit is not None and hit[0] == v: out[i] = hit[1]
+            else: miss.append(i)
+        if miss:
+            built = build_many(miss)
+            with self._lock:
+                if self.version == v:
+                    for i, val in built.items(): self._data[(ns, i)] = (v, val)
+            out.update(built)
+        return out
+
+
+catalog = CatalogCache(SharedVersion() if MULTI_WORKER else None)
@@ -1,6 +1,78 @@
+import os
+from contextlib import contextmanager
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine
 
-engine = create_engine("sqlite:///database.db", echo=False)
+try:
+    import fcntl
+except ImportError:   # Windows: ไม่มี flock -> ใช้ worker เดียว
+    fcntl = None
+
+# หลาย uvicorn/gunicorn worker ใช้ database.db เดียวกัน: cache ของ catalog เช็ก version กลางใน DB (catalog.SharedVersion)
+MULTI_WORKER = os.getenv("MULTI_WORKER", "0") == "1"
+DB_LOCK_FILE = os.getenv("DB_LOCK_FILE", "database.db.lock")
+
+# ---------- SQLite tuning ----------
+# WAL: ผู้อ่านไม่ต้องรอผู้เขียน (และกลับกัน), synchronous=NORMAL ปลอดภัยพอใน WAL และ fsync น้อยลงมาก
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))   # writer ชนกัน -> รอแทน "database is locked"
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))            # ติดลบ = KiB ต่อ connection
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "8"))
+READ_MAX_OVERFLOW = int(os.getenv("READ_MAX_OVERFLOW", "8"))
+# SQLite เขียนได้ทีละ connection อยู่แล้ว: pool ของ writer เล็ก ๆ (overflow เผื่อ session ซ้อนกันใน thread เดียว)
+WRITE_POOL_SIZE = int(os.getenv("WRITE_POOL_SIZE", "1"))
+WRITE_MAX_OVERFLOW = int(os.getenv("WRITE_MAX_OVERFLOW", "4"))
+
+def _pragmas(read_only: bool):
+    def on_connect(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cur.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        if read_only:
+            cur.execute("PRAGMA query_only=1")
+        else:
+            cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")   # เก็บในไฟล์ DB: ตั้งครั้งเดียวก็พอ
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cur.close()
+    return on_connect
+
+def _tune(eng, read_only: bool):
+    event.listen(eng.sync_engine if hasattr(eng, "sync_engine") else eng, "connect", _pragmas(read_only))
+    return eng
+
+# engine = writer (POST /tickets, POST /services, seed, background writers), read_engine = GET endpoints
+engine = _tune(create_engine("sqlite:///database.db", echo=False,
+                             pool_size=WRITE_POOL_SIZE, max_overflow=WRITE_MAX_OVERFLOW), read_only=False)
+read_engine = _tune(create_engine("sqlite:///database.db", echo=False,
+                                  pool_size=READ_POOL_SIZE, max_overflow=READ_MAX_OVERFLOW), read_only=True)
+
+# ASYNC_DB=1: endpoint อ่าน + POST /tickets ใช้ async engine (ต้องติดตั้ง aiosqlite) แทนการกิน slot ของ threadpool
+ASYNC_DB = os.getenv("ASYNC_DB", "0") == "1"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+async_engine = async_read_engine = None
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    async_engine = _tune(create_async_engine("sqlite+aiosqlite:///database.db", echo=False,
+                                             pool_size=WRITE_POOL_SIZE, max_overflow=WRITE_MAX_OVERFLOW), read_only=False)
+    async_read_engine = _tune(create_async_engine("sqlite+aiosqlite:///database.db", echo=False,
+                                                  pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW), read_only=True)
+
+@contextmanager
+def db_file_lock(path: str = DB_LOCK_FILE):
+    """ล็อกข้าม process สำหรับงานตอน start ที่ต้องทำครั้งเดียว (create_all / เพิ่มคอลัมน์ / seed)
+    worker อื่นรอจนเสร็จแล้วค่อยเช็กเองว่าทำไปแล้ว; ห้ามซ้อนกันใน process เดียว (flock คนละ fd จะรอกันเอง)"""
+    with open(path, "a") as f:
+        if fcntl: fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl: fcntl.flock(f, fcntl.LOCK_UN)
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
+    with db_file_lock():
+        SQLModel.metadata.create_all(engine)
@@ -0,0 +1,179 @@
+# holds.py  (กันที่นั่งชั่วคราวระหว่างชำระเงิน: hold -> confirm เป็นตั๋ว หรือหมดเวลาแล้วคืนที่นั่ง)
+from __future__ import annotations
+import heapq, threading
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Optional
+
+from sqlmodel import Session, select
+from sqlalchemy import delete
+
+from database import engine
+from model import Service, ServiceCar, ServiceStop, Ticket, SeatHold, HoldRequest
+from inventory import load_tree
+from reservation import reservations, SoldOut, BOOKING_MODE
+from booking_queue import reserve_batch, write_cars, insert_rows, Conflict
+from live import availability_hub
+import metrics
+
+RETRY_DELAY = timedelta(seconds=1)  # คืนที่นั่งไม่สำเร็จ (เช่น DB ถูกล็อก) -> ลองใหม่หลังจากนี้
+
+
+class HoldManager:
+    """hold กันที่นั่งใน segment_load เหมือนตั๋ว (availability ใน /services/{id} จึงนับรวมอยู่แล้ว) และเก็บแถวใน seathold
+    - confirm: ลบ hold + สร้าง Ticket ในทรานแซกชันเดียว ที่นั่งไม่เปลี่ยน
+    - หมดเวลา/ยกเลิก: ลบ hold + คืนที่นั่ง; ใครลบแถวได้ก่อน (rowcount) คนนั้นชนะ
+    sweeper เก็บ (expires_at, hold_id) ใน min-heap: push/pop O(log n) แล้วหลับจนถึง hold ที่หมดเวลาก่อนสุด ไม่ต้องสแกนตาราง
+    hold ที่ confirm/ยกเลิกไปแล้วยังค้างใน heap ได้ (ลบแบบ lazy) ตอน pop จะลบแถวไม่เจอแล้วข้ามไป
+    ตอน start โหลด heap จากตาราง -> hold อยู่รอดหลัง restart และที่หมดเวลาระหว่างปิดจะถูกคืนทันที"""
+
+    def __init__(self):
+        self._heap: list[tuple[datetime, int]] = []
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _schedule(self, expires_at: datetime, hold_id: int):
+        with self._cond:
+            heapq.heappush(self._heap, (expires_at, hold_id))
+            if self._heap[0][1] == hold_id: self._cond.notify()
+
+    # ---------- API ----------
+    def create(self, req: HoldRequest) -> SeatHold:
+        """LookupError = ไม่มีขบวน/ตู้, ValueError = ช่วงสถานีไม่ถูกต้อง, SoldOut = ที่นั่งไม่พอ"""
+        expires_at = datetime.now() + timedelta(seconds=req.ttl_seconds)
+        h = self._create_in_memory(req, expires_at) if BOOKING_MODE == "memory" else self._create_db(req, expires_at)
+        self._schedule(h.expires_at, h.id)
+        availability_hub.publish(h.service_id)
+        return h
+
+    def _create_db(self, req: HoldRequest, expires_at: datetime) -> SeatHold:
+        # db / queue: CAS ด้วย version เหมือนการจองตั๋ว จึงทำงานร่วมกับ writer ของคิวได้
+        for _ in range(3):
+            with Session(engine) as session:
+                (h,), trees = reserve_batch(session, [req], row=partial(SeatHold, expires_at=expires_at))
+                if isinstance(h, Exception): raise h
+                try:
+                    write_cars(session, trees)
+                except Conflict:
+                    metrics.booking_retries.inc("hold")
+                    continue
+                insert_rows(session, [h])
+                session.commit()
+                return h
+        raise SoldOut("concurrency conflict")
+
+    def _create_in_memory(self, req: HoldRequest, expires_at: datetime) -> SeatHold:
+        with Session(engine) as session:
+            if not session.get(Service, req.service_id): raise LookupError("Service not found")
+            a, b = reservations.hold(req.service_id, req.car_type, req.quantity, req.from_station_id, req.to_station_id)
+            try:
+                h = SeatHold(service_id=req.service_id, car_type=req.car_type, quantity=req.quantity,
+                             from_order=a, to_order=b, expires_at=expires_at)
+                session.add(h); session.commit(); session.refresh(h)
+                return h
+            except Exception:
+                reservations.release(req.service_id, req.car_type, req.quantity, a, b)
+                raise
+
+    def confirm(self, hold_id: int) -> Ticket:
+        """hold ที่ยังไม่หมดเวลา -> Ticket (LookupError ถ้าไม่มี/หมดเวลาแล้ว)"""
+        now = datetime.now()
+        with Session(engine) as session:
+            h = session.get(SeatHold, hold_id)
+            if h is None or h.expires_at <= now: raise LookupError("Hold not found or expired")
+            res = session.exec(delete(SeatHold).where(SeatHold.id == hold_id, SeatHold.expires_at > now))
+            if not res.rowcount:
+                session.rollback(); raise LookupError("Hold not found or expired")
+            # memory mode: id มาจาก engine กันชนกับตั๋วที่ยังรอ flush
+            t = Ticket(id=reservations.new_ticket_id() if BOOKING_MODE == "memory" else None,
+                       service_id=h.service_id, car_type=h.car_type, quantity=h.quantity,
+                       from_order=h.from_order, to_order=h.to_order)
+            session.add(t); session.commit(); session.refresh(t)
+            return t
+
+    def release(self, hold_id: int) -> bool:
+        """ยกเลิก hold แล้วคืนที่นั่ง; False = ไม่มี hold นี้แล้ว (confirm/คืนไปก่อนหน้า)"""
+        return self._release_in_memory(hold_id) if BOOKING_MODE == "memory" else self._release_db(hold_id)
+
+    def _release_db(self, hold_id: int) -> bool:
+        for _ in range(3):
+            with Session(engine) as session:
+                h = session.get(SeatHold, hold_id)
+                if h is None: return False
+                car = session.exec(select(ServiceCar).where(ServiceCar.service_id == h.service_id, ServiceCar.car_type == h.car_type)).one()
+                orders = session.exec(select(ServiceStop.stop_order).where(ServiceStop.service_id == h.service_id)
+                                      .order_by(ServiceStop.stop_order)).all()
+                tree = load_tree(car.segment_load, car.reserved_seats, len(orders) - 1)
+                tree.add(h.from_order - orders[0], h.to_order - orders[0], -h.quantity)
+                if not session.exec(delete(SeatHold).where(SeatHold.id == hold_id)).rowcount:
+                    session.rollback(); return False
+                sid = h.service_id
+                try:
+                    write_cars(session, {car.id: (car, tree)})
+                except Conflict:
+                    metrics.booking_retries.inc("hold_release")
+                    continue
+                session.commit()
+                availability_hub.publish(sid)
+                return True
+        raise SoldOut("concurrency conflict")
+
+    def _release_in_memory(self, hold_id: int) -> bool:
+        with Session(engine) as session:
+            h = session.get(SeatHold, hold_id)
+            if h is None: return False
+            # โหลดตู้เข้า engine ก่อนลบแถว (ถ้าโหลดหลังลบ tree จะไม่มี hold นี้ แล้วจะคืนซ้ำ)
+            leg = (h.service_id, h.car_type, h.quantity, h.from_order, h.to_order)
+            reservations.state(h.service_id, h.car_type)
+            if not session.exec(delete(SeatHold).where(SeatHold.id == hold_id)).rowcount:
+                session.rollback(); return False
+            session.commit()
+        reservations.release(*leg)
+        availability_hub.publish(leg[0])
+        return True
+
+    # ---------- sweeper ----------
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """คืนที่นั่งของ hold ที่หมดเวลาแล้ว; คืนจำนวน hold ที่คืนสำเร็จ"""
+        now = now or datetime.now()
+        with self._cond:
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+        released = 0
+        for expires_at, hold_id in due:
+            try:
+                released += self.release(hold_id)
+            except Exception:
+                self._schedule(now + RETRY_DELAY, hold_id)  # no log; รอบหน้าจะลองใหม่
+        return released
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping: return
+                wait = (self._heap[0][0] - datetime.now()).total_seconds() if self._heap else None
+                if wait is None or wait > 0:
+                    self._cond.wait(wait); continue
+            self.sweep()
+
+    def start(self):
+        if self._thread is None:
+            with Session(engine) as session:
+                rows = session.exec(select(SeatHold.expires_at, SeatHold.id)).all()
+            with self._cond:
+                self._heap = [tuple(r) for r in rows]
+                heapq.heapify(self._heap)
+                self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="hold-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            with self._cond:
+                self._stopping = True; self._cond.notify()
+            self._thread.join(); self._thread = None
+
+
+holds = HoldManager()
@@ -0,0 +1,84 @@
+# inventory.py  (ที่นั่งรายช่วงสถานี: segment tree แบบ range-add / range-max ต่อ ServiceCar)
+from __future__ import annotations
+from array import array
+from typing import Optional
+
+
+class SegmentTree:
+    """จำนวนที่นั่งที่ถูกจองในแต่ละช่วง (segment i = ระหว่างป้ายลำดับ i+1 กับ i+2)
+    add(l, r, q) จองช่วง [l, r) เพิ่ม q ที่, max(l, r) = ที่นั่งที่ถูกใช้มากสุดในช่วงนั้น — ทั้งคู่ O(log n)
+    (segment tree แบบ bottom-up: t = ค่าสูงสุดของ subtree, d = ค่าที่บวกค้างไว้ของ node ภายใน)"""
+    __slots__ = ("n", "h", "t", "d")
+
+    def __init__(self, leaves):
+        self.n = n = max(len(leaves), 1)
+        self.h = n.bit_length()
+        self.t = array("i", [0] * (2 * n))
+        self.d = array("i", [0] * n)
+        for i, v in enumerate(leaves): self.t[n + i] = v
+        for i in range(n - 1, 0, -1): self.t[i] = max(self.t[2 * i], self.t[2 * i + 1])
+
+    def _apply(self, p: int, v: int):
+        self.t[p] += v
+        if p < self.n: self.d[p] += v
+
+    def _pull(self, p: int):
+        while p > 1:
+            p >>= 1
+            self.t[p] = max(self.t[2 * p], self.t[2 * p + 1]) + self.d[p]
+
+    def _push(self, p: int):
+        for s in range(self.h, 0, -1):
+            i = p >> s
+            if 0 < i < self.n and self.d[i]:
+                self._apply(2 * i, self.d[i]); self._apply(2 * i + 1, self.d[i]); self.d[i] = 0
+
+    def add(self, l: int, r: int, v: int):
+        l += self.n; r += self.n
+        l0, r0 = l, r
+        while l < r:
+            if l & 1: self._apply(l, v); l += 1
+            if r & 1: r -= 1; self._apply(r, v)
+            l >>= 1; r >>= 1
+        self._pull(l0); self._pull(r0 - 1)
+
+    def max(self, l: int, r: int) -> int:
+        l += self.n; r += self.n
+        self._push(l); self._push(r - 1)
+        res = 0
+        while l < r:
+            if l & 1: res = max(res, self.t[l]); l += 1
+            if r & 1: r -= 1; res = max(res, self.t[r])
+            l >>= 1; r >>= 1
+        return res
+
+    def leaves(self) -> array:
+        for i in range(1, self.n):
+            if self.d[i]:
+                self._apply(2 * i, self.d[i]); self._apply(2 * i + 1, self.d[i]); self.d[i] = 0
+        return self.t[self.n:]
+
+
+def leg_orders(stops: list[tuple[int, int]], from_station_id: Optional[int], to_station_id: Optional[int]) -> tuple[int, int]:
+    """(from_order, to_order) จาก [(station_id, stop_order), ...] ที่เรียงแล้ว; ไม่ระบุ = ต้นทาง/ปลายทาง
+    ช่วงไม่ถูกต้อง -> ValueError"""
+    if len(stops) < 2: raise ValueError("Service has no route")
+    a, b = stops[0][1], stops[-1][1]
+    if from_station_id is not None:
+        a = next((o for st, o in stops if st == from_station_id), None)
+        if a is None: raise ValueError(f"Station {from_station_id} is not on this service")
+    if to_station_id is not None:
+        b = next((o for st, o in stops if st == to_station_id and o > a), None)
+        if b is None: raise ValueError(f"Station {to_station_id} is not after the boarding station")
+    if b <= a: raise ValueError("to_station ต้องอยู่หลัง from_station")
+    return a, b
+
+def load_tree(blob: Optional[bytes], reserved_seats: int, n_segments: int) -> SegmentTree:
+    """segment_load ที่เก็บใน DB (array('i') เป็น bytes) -> tree
+    ไม่มี blob = ฐานข้อมูลเก่า ที่ทุกตั๋วเป็นแบบตลอดสาย: ทุกช่วงถูกใช้ reserved_seats ที่"""
+    if blob is None: return SegmentTree([reserved_seats] * n_segments)
+    leaves = array("i"); leaves.frombytes(blob)
+    return SegmentTree(leaves)
+
+def pack(tree: SegmentTree) -> bytes:
+    return tree.leaves().tobytes()
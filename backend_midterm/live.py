@@ -0,0 +1,87 @@
+# live.py  (push ที่นั่งว่างแบบ real-time: หนึ่ง query ต่อการเปลี่ยนแปลง แล้วกระจายให้ทุกคนที่ subscribe ขบวนนั้น)
+from __future__ import annotations
+import asyncio, os
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional
+
+from database import MULTI_WORKER
+
+LIVE_MAX_RATE = float(os.getenv("LIVE_MAX_RATE", "4"))          # update ต่อวินาทีต่อขบวน (สูงสุด)
+LIVE_KEEPALIVE = float(os.getenv("LIVE_KEEPALIVE", "15"))       # วินาที: ส่ง comment กัน proxy ตัดการเชื่อมต่อ
+LIVE_POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "1"))  # MULTI_WORKER: เช็กการจองจาก worker อื่น
+
+
+class AvailabilityHub:
+    """publish(service_id) หลังจองสำเร็จ (เรียกจาก thread ไหนก็ได้) -> รวบ (coalesce) ให้ส่งไม่เกิน max_rate ครั้ง/วินาที/ขบวน
+    ตอนส่ง: load(service_id) ครั้งเดียว ถ้าค่าไม่เปลี่ยนจากครั้งก่อนก็ไม่ส่ง ไม่งั้นใส่ queue ของทุก subscriber
+    queue ขนาด 1 เก็บเฉพาะค่าล่าสุด — client ที่ช้าไม่ทำให้ค้างและไม่สะสมข้อความ
+    MULTI_WORKER: การจองใน worker อื่นไม่ผ่าน publish ของเรา จึงเช็กขบวนที่มีคนดูอยู่ทุก LIVE_POLL_INTERVAL วินาที"""
+
+    def __init__(self, max_rate: float = LIVE_MAX_RATE):
+        self.interval = 1 / max_rate
+        self.load: Optional[Callable[[int], Awaitable[Optional[dict]]]] = None   # main.py ตั้งให้
+        self._subs: dict[int, set[asyncio.Queue]] = {}
+        self._scheduled: set[int] = set()
+        self._last_at: dict[int, float] = {}
+        self._last: dict[int, dict] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poller: Optional[asyncio.Task] = None
+
+    def publish(self, service_id: int):
+        """thread-safe; ไม่มีคน subscribe ขบวนนี้ = ไม่ทำอะไร"""
+        loop = self._loop
+        if loop is None or service_id not in self._subs: return
+        try:
+            loop.call_soon_threadsafe(self._schedule, service_id)
+        except RuntimeError:
+            pass   # loop ปิดไปแล้ว
+
+    def _schedule(self, service_id: int):
+        if service_id in self._scheduled: return   # มีรอบส่งรออยู่แล้ว -> รวมเข้ารอบนั้น
+        self._scheduled.add(service_id)
+        delay = max(self._last_at.get(service_id, 0.0) + self.interval - self._loop.time(), 0.0)
+        self._loop.call_later(delay, lambda: asyncio.ensure_future(self._emit(service_id)))
+
+    async def _emit(self, service_id: int):
+        self._scheduled.discard(service_id)
+        self._last_at[service_id] = self._loop.time()
+        subs = self._subs.get(service_id)
+        if not subs or self.load is None: return
+        try:
+            data = await self.load(service_id)
+        except Exception:
+            return   # no log; การจองครั้งถัดไปจะ publish ใหม่
+        if data is None or data == self._last.get(service_id): return
+        self._last[service_id] = data
+        for q in list(subs):
+            if q.full(): q.get_nowait()
+            q.put_nowait(data)
+
+    async def _poll(self):
+        while self._subs:
+            await asyncio.sleep(LIVE_POLL_INTERVAL)
+            for sid in list(self._subs): self._schedule(sid)
+        self._poller = None
+
+    @contextmanager
+    def subscribe(self, service_id: int, initial: Optional[dict] = None):
+        """queue ที่ได้รับ snapshot ใหม่ของขบวน; เรียกใน event loop เท่านั้น (_subs แก้เฉพาะบน loop)
+        initial = snapshot ที่ client ได้ไปแล้ว; เช็กซ้ำอีกรอบหลังลงทะเบียน กันพลาดการจองที่เกิดระหว่างนั้น"""
+        self._loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subs.setdefault(service_id, set()).add(q)
+        if initial is not None: self._last.setdefault(service_id, initial)
+        self._schedule(service_id)
+        if MULTI_WORKER and self._poller is None: self._poller = asyncio.ensure_future(self._poll())
+        try:
+            yield q
+        finally:
+            subs = self._subs.get(service_id)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    del self._subs[service_id]
+                    self._last.pop(service_id, None); self._last_at.pop(service_id, None)
+
+
+availability_hub = AvailabilityHub()
@@ -1,278 +1,76 @@
 # main.py  (no logging, no backup)
 from __future__ import annotations
-import sqlite3, random
-from datetime import datetime, date, time as dtime, timedelta
-from typing import List, Tuple, Iterable
-
-from fastapi import FastAPI, HTTPException, Request
+import os, sqlite3, json, hashlib, hmac, base64, asyncio
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from typing import List, Tuple, Optional
+
+from fastapi import FastAPI, HTTPException, Request, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-from sqlalchemy import update, and_
+from sqlmodel.ext.asyncio.session import AsyncSession
+import anyio
+from sqlalchemy import update, and_, or_, func
 
-from database import engine, init_db
+from database import engine, read_engine, async_engine, async_read_engine, init_db, db_file_lock, MULTI_WORKER
 from model import (
     Line, Station, Service, ServiceStop, ServiceCar, Ticket,
     ServiceCreate, ServiceBasicOut, ServiceDetailOut, ServiceStopOut, StationOut,
-    ServiceCarOut, TicketRequest, TicketOut,
-    DirectionEnum, CarTypeEnum,
+    ServiceCarOut, PatternOut, ServicePattern, TicketRequest, TicketOut, TicketBatchRequest, HoldRequest, HoldOut, TripOut, JourneyOut, LegAvailabilityOut, ServiceAvailabilityOut,
+    CarTypeEnum,
 )
+from catalog import catalog
+from inventory import load_tree, pack, leg_orders
+from reservation import reservations, SoldOut, BOOKING_MODE
+from booking_queue import booking_queue, book_all_or_nothing
+from holds import holds
+from live import availability_hub, LIVE_KEEPALIVE
+from patterns import expander
+from timetable import Timetable, to_min, from_min, from_sec
+from seed import _create_service_with_stops_and_cars, insert_all_lines
+import metrics
+from querybudget import query_budget, allow, QueryBudgetMiddleware, QUERY_BUDGET
+from profiler import sampler, collapsed, Busy, ProfilerMiddleware
 
 # ---------- DB init ----------
 init_db()
 app = FastAPI(title="Railway API – time-aware booking (no log / no backup)")
-
-# ---------- Helpers ----------
-DEFAULT_CARS: List[Tuple[str,int,int]] = [
-    (CarTypeEnum.First.value,        1, 40),
-    (CarTypeEnum.Reserved.value,     2, 64),
-    (CarTypeEnum.NonReserved.value,  2, 72),
-    (CarTypeEnum.Quiet.value,        1, 36),
-    (CarTypeEnum.Catering.value,     1, 0),
-]
-
-def _get_or_create_line(session: Session, th: str, en: str) -> Line:
-    line = session.exec(select(Line).where(Line.name_en == en)).first()
-    if not line:
-        line = Line(name_th=th, name_en=en)
-        session.add(line); session.commit(); session.refresh(line)
-    return line
-
-def _get_or_create_station(session: Session, th: str, en: str) -> Station:
-    st = session.exec(select(Station).where(Station.name_en == en)).first()
-    if not st:
-        st = Station(name_th=th, name_en=en)
-        session.add(st); session.commit(); session.refresh(st)
-    return st
-
-def _ensure_stations(session: Session, pairs: Iterable[Tuple[str,str]]) -> List[int]:
-    return [_get_or_create_station(session, th, en).id for th, en in pairs]
-
-def _guess_dep_arr(code: str, base_day: date | None = None) -> tuple[datetime, datetime]:
-    """สุ่ม/กำหนดเวลาออก-ถึงแบบ deterministic จากรหัสขบวน เพื่อให้ค้นตามเวลาได้จริง"""
-    if base_day is None:
-        base_day = date.today()
-    # กระจายช่วง 05:30–23:00
-    rnd = (abs(hash(code)) % (17*60)) + (5*60 + 30)
-    dep = datetime.combine(base_day, dtime(hour=rnd//60, minute=rnd%60))
-    uc = code.upper()
-    hours = 5
-    if "SPECIAL" in uc or "EXPRESS" in uc: hours = 3
-    elif "RAPID" in uc: hours = 4
-    elif "LOCAL" in uc or "COMMUTER" in uc or "ORDINARY" in uc: hours = 5 + (abs(hash(code)) % 2)
-    arr = dep + timedelta(hours=hours, minutes=random.randint(0,50))
-    return dep, arr
-
-def _create_service_with_stops_and_cars(
-    session: Session, line_id: int, code: str, origin_en: str, direction: str,
-    stop_ids_in_order: List[int], departure_time: datetime | None = None, arrival_time: datetime | None = None,
-    cars: Iterable[Tuple[str,int,int]] = DEFAULT_CARS
-) -> Service:
-    dep, arr = (departure_time, arrival_time) if departure_time and arrival_time else _guess_dep_arr(code)
-    svc = Service(
-        line_id=line_id, code=code, origin=origin_en,
-        direction=DirectionEnum(direction), departure_time=dep, arrival_time=arr
-    )
-    session.add(svc); session.commit(); session.refresh(svc)
-    for i, st_id in enumerate(stop_ids_in_order, start=1):
-        session.add(ServiceStop(service_id=svc.id, station_id=st_id, stop_order=i))
-    for car_type, car_count, seats in cars:
-        session.add(ServiceCar(service_id=svc.id, car_type=CarTypeEnum(car_type),
-                               car_count=car_count, seats_per_car=seats))
-    session.commit()
-    return svc
-
-# ---------- SEED DATA (ทุกสาย/สถานีตามที่ให้) ----------
-# Northern
-NORTHERN_STATIONS = [
-    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
-    ("กรุงเทพอภิวัฒน์","KRUNG THEP APHIWAT CENTRAL TERMINAL"),("ดอนเมือง","DON MUANG"),("รังสิต","RANGSIT"),
-    ("เชียงราก","Chiang Rak"),("บางปะอิน","Bang Pa-in"),("อยุธยา","AYUTTHAYA"),
-    ("ชุมทางบ้านภาชี","BAN PHACHI JUNCTION"),("หนองวิวัฒน์","Nong Wiwat"),("ท่าเรือ","Tha Ruea"),
-    ("บ้านหมอ","Ban Mo"),("หนองโดน","Nong Don"),("บ้านกลับ","Ban Klap"),("บ้านป่าหวาย","Ban Pa Wai"),
-    ("ลพบุรี","LOP BURI"),("โคกกะเทียม","Khok Kathiam"),("บ้านหมี่","Ban Mi"),("จันเสน","Chan Sen"),
-    ("ช่องแค","Chong Khae"),("บ้านตาคลี","Ban Takhli"),("หัวหวาย","Hua Wai"),("หนองโพ","Nong Pho"),
-    ("เนินมะกอก","Noen Makok"),("เขาทอง","Khao Thong"),("นครสวรรค์","NAKHON SAWAN"),("ปากน้ำโพ","Pak Nam Pho"),
-    ("ทับกฤช","Thap Krit"),("ชุมแสง","Chum Saeng"),("บางมูลนาก","Bang Mun Nak"),("ตะพานหิน","TAPHAN HIN"),
-    ("วังกรด","Wang Krot"),("พิจิตร","PHICHIT"),("ท่าฬ่อ","Tha Lo"),("บางกระทุ่ม","Bang Krathum"),
-    ("บ้านใหม่","Ban Mai"),("พิษณุโลก","PHITSANULOK"),("พรหมพิราม","Phrom Phiram"),("หนองตม","Nong Tom"),
-    ("พิชัย","Phichai"),("ชุมทางบ้านดารา","Ban Dara Junction"),("สวรรคโลก","Sawankhalok"),
-    ("ท่าสัก","Tha Sak"),("ตรอน","Tron"),("อุตรดิตถ์","UTTARADIT"),("ศิลาอาสน์","Sila At"),
-    ("เด่นชัย","DEN CHAI"),("บ้านปิน","Ban Pin"),("แม่เมาะ","Mae Mo"),("นครลำปาง","NAKHON LAMPANG"),
-    ("ขุนตาน","Khun Tan"),("ลำพูน","Lamphun"),("เชียงใหม่","CHIANG MAI"),
-]
-NORTHERN_FROM_BKK = ["COMMUTER 303","LOCAL 401","ORDINARY 201","ORDINARY 209","ORDINARY 211","ORDINARY 207","ORDINARY 301","COMMUTER 317","COMMUTER 313"]
-NORTHERN_FROM_KTA = ["RAPID 111","SPECIAL EXPRESS (DIESEL RAILCAR) 7**","RAPID 109","SPECIAL EXPRESS (UTTARAWITHI) 9","SPECIAL EXPRESS 13","RAPID 107","EXPRESS 51"]
-NORTHERN_TO_BKK   = ["COMMUTER 302","LOCAL 410","ORDINARY 208","COMMUTER 304","ORDINARY 212","ORDINARY 202","LOCAL 402","LOCAL 408"]
-NORTHERN_TO_KTA   = ["RAPID 108","EXPRESS 52","SPECIAL EXPRESS 14","SPECIAL EXPRESS (UTTARAWITHI) 10","RAPID 112","SPECIAL EXPRESS (DIESEL RAILCAR) 8**","RAPID 102"]
-
-# Northeastern (อีสาน)
-NORTHEAST_STATIONS = [
-    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
-    ("กรุงเทพอภิวัฒน์","KRUNG THEP APHIWAT CENTRAL TERMINAL"),("ดอนเมือง","DON MUANG"),("รังสิต","RANGSIT"),
-    ("อยุธยา","AYUTTHAYA"),("ชุมทางบ้านภาชี","BAN PHACHI JUNCTION"),("สระบุรี","SARABURI"),
-    ("ชุมทางแก่งคอย","Kaeng Khoi Junction"),("มวกเหล็ก","Muak Lek"),("ปากช่อง","Pak Chong"),
-    ("สีคิ้ว","Sikhio"),("สูงเนิน","Sung Noen"),("กุดจิก","Kut Chik"),("โคกกรวด","Khok Kruat"),
-    ("นครราชสีมา","NAKHON RATCHASIMA"),("ชุมทางถนนจิระ","Thanon Chira Junction"),
-    ("แก่งเสือเต้น","Kaeng Suea Ten"),("เขื่อนป่าสักชลสิทธิ์","Pa Sak Jolasid Dam"),("ลำนารายณ์","Lam Narai"),
-    ("บำเหน็จณรงค์","Bamnet Narong"),("จัตุรัส","Chatturat"),("บ้านเหลื่อม","Ban Luam"),
-    ("เมืองคง","Mueang Khong"),("ชุมทางบัวใหญ่","Bua Yai Junction"),("เมืองพล","Mueang Phon"),
-    ("บ้านไผ่","Ban Phai"),("ขอนแก่น","KHON KAEN"),("น้ำพอง","Nam Phong"),
-    ("กุมภวาปี","Kumphawapi"),("อุดรธานี","UDON THANI"),("หนองคาย","NONG KHAI"),("ท่านาแล้ง","THANALENG"),
-    ("จักราช","Chakkarat"),("ห้วยแถลง","Huai Thalaeng"),("ลำปลายมาศ","Lam Plai Mat"),("บุรีรัมย์","Buri Ram"),
-    ("กระสัง","Krasang"),("ลำชี","Lam Chi"),("สุรินทร์","SURIN"),("ศีขรภูมิ","Sikhoraphum"),
-    ("สำโรงทาบ","Samrong Thap"),("อุทุมพรพิสัย","Uthumphon Phisai"),("ศรีสะเกษ","SI SA KET"),
-    ("กันทรารมย์","Kanthararom"),("อุบลราชธานี","UBON RATCHATHANI"),
-]
-NE_FROM_BKK = ["COMMUTER 339","ORDINARY 233","COMMUTER 341","LOCAL 421","LOCAL 415","LOCAL 419","LOCAL 427","LOCAL 431","LOCAL 433","LOCAL 435","LOCAL 437","LOCAL 417","LOCAL 429"]
-NE_FROM_KTA = ["SPECIAL EXPRESS (DIESEL RAILCAR) 21**","EXPRESS (DIESEL RAILCAR) 75*","EXPRESS (DIESEL RAILCAR) 71**","RAPID 139","SPECIAL EXPRESS 25","RAPID 141"]
-NE_TO_BKK   = ["COMMUTER 342","LOCAL 424","ORDINARY 234","LOCAL 420","LOCAL 422","LOCAL 426","LOCAL 428","LOCAL 416","LOCAL 432","MIXED 482","MIXED 484"]
-NE_TO_KTA   = ["RAPID 142","EXPRESS 24","RAPID 140","SPECIAL EXPRESS 72*","RAPID 136","SPECIAL EXPRESS 22*","RAPID 134","SPECIAL EXPRESS 26","RAPID 132"]
-
-# Eastern
-EASTERN_STATIONS = [
-    ("กรุงเทพ (หัวลำโพง)","Bangkok"),("ยมราช","Yommarat"),("อุรุพงษ์","Urupong"),("พญาไท","Phaya Thai"),
-    ("มักกะสัน","Makkasan"),("อโศก","Asok"),("คลองตัน","Khlong Tan"),("สุขุมวิท 71","Sukhumvit 71"),
-    ("หัวหมาก","Hua Mak"),("บ้านทับช้าง","Ban Thap Chang"),("ซอยวัดลานบุญ","Soi Wat Lan Bun"),
-    ("ลาดกระบัง","Lat Krabang"),("พระจอมเกล้า","Phra Chom Klao"),("หัวตะเข้","Hua Takhe"),
-    ("คลองหลวงแพ่ง","Khlong Luang Phaeng"),("คลองอุดมชลจร","Khlong Udom Chonlachon"),("เปรง","Preng"),
-    ("คลองแขวงกลั่น","Khlong Khwaeng Klan"),("คลองบางพระ","Khlong Bang Phra"),("บางเตย","Bang Toei"),
-    ("ชุมทางฉะเชิงเทรา","Chachoengsao Junction"),("บางน้ำเปรี้ยว","Bang Nam Priao"),
-    ("ชุมทางคลองสิบเก้า","Khlong Sip Kao Junction"),("โยทะกา","Yothaka"),("บ้านสร้าง","Ban Sang"),
-    ("บ้านปากพลี","Ban Pak Phli"),("ปราจีนบุรี","Prachinburi"),("โคกมะกอก","Khok Makok"),
-    ("ประจันตคาม","Prachantakham"),("บ้านดงบัง","Ban Dong Bang"),("บ้านพรหมแสง","Ban Phrom Saeng"),
-    ("กบินทร์บุรี","Kabin Buri"),("หนองสัง","Nong Sang"),("พระปรง","Phra Prong"),("ศาลาลำดวน","Sala Lamduan"),
-    ("สระแก้ว","Sa Kaeo"),("ท่าเกษม","Tha Kasem"),("ห้วยโจด","Huai Chot"),("วัฒนานคร","Watthana Nakhon"),
-    ("ห้วยเดื่อ","Huai Duea"),("อรัญประเทศ","Aranyaprathet"),("ด่านพรมแดนบ้านคลองลึก","Ban Khlong Luk Border"),
-    ("แปดริ้ว","Paet Rio"),("ดอนสีนนท์","Don Si Non"),("พานทอง","Phan Thong"),("ชลบุรี","Chon Buri"),
-    ("บางพระ","Bang Phra"),("เขาพระบาท","Khao Phra Bat"),("ชุมทางศรีราชา","Si Racha Junction"),
-    ("บางละมุง","Bang Lamung"),("พัทยา","Pattaya"),("พัทยาใต้","Pattaya Tai"),("ตลาดน้ำ 4 ภาค","Talat Nam 4 Pak"),
-    ("บ้านห้วยขวาง","Ban Huai Khwang"),("ญาณสังวราราม","Yanasangwararam"),("สวนนงนุช","Suan Nongnut"),
-    ("ชุมทางเขาชีจรรย์","Khao Chi Chan Junction"),("บ้านพลูตาหลวง","Ban Phlu Ta Luang"),
-]
-EAST_FROM_BKK = ["ORDINARY 275","DIESEL 997","ORDINARY 283","DIESEL 281","COMMUTER 367","COMMUTER 389","DIESEL 279","DIESEL 277","COMMUTER 379","COMMUTER 391","COMMUTER 371","COMMUTER 383"]
-EAST_TO_BKK   = ["ORDINARY 276","DIESEL 998","ORDINARY 284","DIESEL 282","COMMUTER 368","COMMUTER 390","DIESEL 280","DIESEL 278","COMMUTER 380","COMMUTER 392","COMMUTER 372","COMMUTER 384"]
-
-# Wongwian Yai – Maha Chai
-WYM_STATIONS = [
-    ("วงเวียนใหญ่","Wongwian Yai"),("ตลาดพลู","Talat Phlu"),("วุฒากาศ","Wutthakat"),("คลองต้นไทร","Khlong Ton Sai"),
-    ("จอมทอง","Chom Thong"),("วัดไทร","Wat Sai"),("วัดสิงห์","Wat Sing"),("บางบอน","Bang Bon"),
-    ("การเคหะ","Kan Kheha"),("รางโพธิ์","Rang Pho"),("สามแยก","Sam Yaek"),("พรหมแดน","Phrom Daen"),
-    ("ทุ่งสีทอง","Thung Si Thong"),("บางน้ำจืด","Bang Nam Chuet"),("คอกควาย","Khok Khwai"),
-    ("บ้านขอม","Ban Khom"),("คลองจาก","Khlong Chak"),("นิคมรถไฟมหาชัย","Nikhom Rotfai Maha Chai"),
-    ("มหาชัย","Maha Chai"),
-]
-WYM_OUT = ["4303","4311","4321","4341","4305","4313","4323","4343","4315","4325","4317","4307","4327","4345","4309","4329","4347"]
-WYM_IN  = ["4302","4312","4322","4342","4304","4314","4324","4344","4316","4326","4318","4308","4328","4346","4310","4330","4348"]
-
-# Ban Laem – Mae Klong
-BL_STATIONS = [
-    ("บ้านแหลม","Ban Laem"),("ท่าฉลอม","Tha Chalom"),("บ้านชีผ้าขาว","Ban Chi Pha Khao"),
-    ("บางสีคต","Bang Si Khot"),("บางกระเจ้า","Bang Krachao"),("บ้านบ่อ","Ban Bo"),
-    ("บางโทรัด","Bang Thorat"),("บ้านกาหลง","Ban Kalong"),("บ้านนาขวาง","Ban Na Khwang"),
-    ("บ้านนาโคก","Ban Na Khok"),("เขตเมือง","Khet Mueang"),("ลาดใหญ่","Lat Yai"),("แม่กลอง","Mae Klong"),
-]
-BL_OUT = ["4381","4383","4385","4387"]
-BL_IN  = ["4380","4382","4384","4386"]
-
-# Commuter
-COMMUTER_STATIONS = [
-    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
-    ("กรุงเทพอภิวัฒน์","KRUNG THEP APHIWAT CENTRAL TERMINAL"),
-    ("ดอนเมือง","DON MUANG"),("รังสิต","RANGSIT"),("เชียงราก","Chiang Rak"),("บางปะอิน","Bang Pa-in"),
-    ("อยุธยา","AYUTTHAYA"),("ชุมทางบ้านภาชี","BAN PHACHI JUNCTION"),
-]
-COMMUTER_OUT = ["COMMUTER 303","COMMUTER 339*","ORDINARY 201","ORDINARY 209","ORDINARY 233","ORDINARY 207","ORDINARY 301","COMMUTER 341","COMMUTER 317*","COMMUTER 313*"]
-COMMUTER_IN  = ["COMMUTER 304","COMMUTER 342*","ORDINARY 202","ORDINARY 212","ORDINARY 234","ORDINARY 208","ORDINARY 302","COMMUTER 340","COMMUTER 318","COMMUTER 314"]
-
-# Southern
-SOUTHERN_STATIONS = [
-    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
-    ("KRUNG THEP APHIWAT CENTRAL TERMINAL","KRUNG THEP APHIWAT CENTRAL TERMINAL"),
-    ("บางบำหรุ","Bang Bamru"),("ธนบุรี","THON BURI"),("ชุมทางตลิ่งชัน","Taling Chan Junction"),
-    ("ศาลายา","Sala Ya"),("นครปฐม","Nakhon Pathom"),("ชุมทางหนองปลาดุก","Nong Pla Duk Junction"),
-    ("สุพรรณบุรี","Suphan Buri"),("กาญจนบุรี","Kanchanaburi"),("สะพานแควใหญ่","Khwae Yai Bridge"),
-    ("ท่ากิเลน","Tha Kilen"),("สะพานถ้ำกระแซ","Tham Krasae Bridge"),("วังโพ","Wang Pho"),
-    ("เกาะมหามงคล","Ko Maha Mongkhon"),("น้ำตก","Nam Tok"),
-    ("บ้านโป่ง","Ban Pong"),("โพธาราม","Photharam"),("ราชบุรี","Ratchaburi"),("ปากท่อ","Pak Tho"),
-    ("เพชรบุรี","Phetchaburi"),("บ้านชะอำ","Ban Cha-am"),("หัวหิน","Hua Hin"),("วังก์พง","Wang Phong"),
-    ("ปราณบุรี","Pran Buri"),("ประจวบคีรีขันธ์","Prachuap Khiri Khan"),("ห้วยยาง","Huai Yang"),
-    ("ทับสะแก","Thap Sakae"),("บ้านกรูด","Ban Krut"),("บางสะพานใหญ่","Bang Saphan Yai"),
-    ("บางสะพานน้อย","Bang Saphan Noi"),("มาบอำมฤต","Map Ammarit"),("ปะทิว","Pathio"),
-    ("ชุมพร","Chumphon"),("สวี","Sawi"),("หลังสวน","Lang Suan"),("ละแม","Lamae"),
-    ("ท่าชนะ","Tha Chana"),("ไชยา","Chaiya"),("สุราษฎร์ธานี","Surat Thani"),("คีรีรัฐนิคม","Khiri Ratthanikhom"),
-    ("นาสาร","Na San"),("บ้านส้อง","Ban Song"),("ฉวาง","Chawang"),("คลองจันดี","Khlong Chan Di"),
-    ("นาบอน","Na Bon"),("ชุมทางทุ่งสง","Thung Song Junction"),("ตรัง","Trang"),("กันตัง","Kantang"),
-    ("ชุมทางเขาชุมทอง","Khao Chum Thong Junction"),("นครศรีธรรมราช","Nakhon Si Thammarat"),
-    ("ชะอวด","Cha-uat"),("พัทลุง","Phatthalung"),("ชุมทางหาดใหญ่","Hat Yai Junction"),
-    ("จะนะ","Chana"),("ปัตตานี","Pattani"),("ยะลา","Yala"),("ตันหยงมัส","Tanyong Mat"),
-    ("สุไหงโก-ลก","SU-NGAI KOLOK"),("คลองแงะ","Khlong Ngae"),("ปาดังเบซาร์","Padang Besar"),
-]
-SOUTH_OUT = ["ORDINARY 261","COMMUTER 355","RAPID 171","RAPID 169","RAPID 83","EXPRESS 85","SPECIAL EXPRESS 39**","LOCAL 485","LOCAL 351"]
-SOUTH_IN_PADANG = ["RAPID 168","EXPRESS 86","RAPID 170","EXPRESS 84"]
-SOUTH_IN_KOLOK  = ["RAPID 172","SPECIAL EXPRESS 44**","LOCAL 486","LOCAL 352"]
-
-# ---------- Insert per line ----------
-def insert_northern(session: Session):
-    line = _get_or_create_line(session,"สายเหนือ","Northern Line")
-    ids_out = _ensure_stations(session,NORTHERN_STATIONS); ids_in = list(reversed(ids_out))
-    for c in NORTHERN_FROM_BKK: _create_service_with_stops_and_cars(session,line.id,c,"BANGKOK","outbound",ids_out)
-    for c in NORTHERN_FROM_KTA: _create_service_with_stops_and_cars(session,line.id,c,"KRUNG THEP APHIWAT CENTRAL TERMINAL","outbound",ids_out)
-    for c in NORTHERN_TO_BKK:   _create_service_with_stops_and_cars(session,line.id,c,"CHIANG MAI","inbound",ids_in)
-    for c in NORTHERN_TO_KTA:   _create_service_with_stops_and_cars(session,line.id,c,"CHIANG MAI","inbound",ids_in)
-
-def insert_northeastern(session: Session):
-    line = _get_or_create_line(session,"สายตะวันออกเฉียงเหนือ","Northeastern Line")
-    ids_out = _ensure_stations(session,NORTHEAST_STATIONS); ids_in = list(reversed(ids_out))
-    for c in NE_FROM_BKK: _create_service_with_stops_and_cars(session,line.id,c,"BANGKOK","outbound",ids_out)
-    for c in NE_FROM_KTA: _create_service_with_stops_and_cars(session,line.id,c,"KRUNG THEP APHIWAT CENTRAL TERMINAL","outbound",ids_out)
-    for c in NE_TO_BKK:   _create_service_with_stops_and_cars(session,line.id,c,"UBON RATCHATHANI","inbound",ids_in)
-    for c in NE_TO_KTA:   _create_service_with_stops_and_cars(session,line.id,c,"NONG KHAI","inbound",ids_in)
-
-def insert_eastern(session: Session):
-    line = _get_or_create_line(session,"สายตะวันออก","Eastern Line")
-    ids_out = _ensure_stations(session,EASTERN_STATIONS); ids_in = list(reversed(ids_out))
-    for c in EAST_FROM_BKK: _create_service_with_stops_and_cars(session,line.id,c,"Bangkok","outbound",ids_out)
-    for c in EAST_TO_BKK:   _create_service_with_stops_and_cars(session,line.id,c,"Ban Phlu Ta Luang","inbound",ids_in)
-
-def insert_wym(session: Session):
-    line = _get_or_create_line(session,"วงเวียนใหญ่–มหาชัย","Wongwian Yai–Maha Chai Line")
-    ids_out = _ensure_stations(session,WYM_STATIONS); ids_in = list(reversed(ids_out))
-    for c in WYM_OUT: _create_service_with_stops_and_cars(session,line.id,f"LOCAL {c}","Wongwian Yai","outbound",ids_out)
-    for c in WYM_IN:  _create_service_with_stops_and_cars(session,line.id,f"LOCAL {c}","Maha Chai","inbound",ids_in)
-
-def insert_bl(session: Session):
-    line = _get_or_create_line(session,"บ้านแหลม–แม่กลอง","Ban Laem–Mae Klong Line")
-    ids_out = _ensure_stations(session,BL_STATIONS); ids_in = list(reversed(ids_out))
-    for c in BL_OUT: _create_service_with_stops_and_cars(session,line.id,f"LOCAL {c}","Ban Laem","outbound",ids_out)
-    for c in BL_IN:  _create_service_with_stops_and_cars(session,line.id,f"LOCAL {c}","Mae Klong","inbound",ids_in)
-
-def insert_commuter(session: Session):
-    line = _get_or_create_line(session,"สายชานเมือง","Commuter Line")
-    ids_out = _ensure_stations(session,COMMUTER_STATIONS); ids_in = list(reversed(ids_out))
-    for c in COMMUTER_OUT: _create_service_with_stops_and_cars(session,line.id,c,"BANGKOK","outbound",ids_out)
-    for c in COMMUTER_IN:  _create_service_with_stops_and_cars(session,line.id,c,"BAN PHACHI JUNCTION","inbound",ids_in)
-
-def insert_southern(session: Session):
-    line = _get_or_create_line(session,"สายใต้","Southern Line")
-    ids_out = _ensure_stations(session,SOUTHERN_STATIONS); ids_in = list(reversed(ids_out))
-    for c in SOUTH_OUT: _create_service_with_stops_and_cars(session,line.id,c,"BANGKOK","outbound",ids_out)
-    for c in SOUTH_IN_PADANG: _create_service_with_stops_and_cars(session,line.id,c,"Padang Besar","inbound",ids_in)
-    for c in SOUTH_IN_KOLOK:  _create_service_with_stops_and_cars(session,line.id,c,"SU-NGAI KOLOK","inbound",ids_in)
-
-def insert_all_lines():
-    with Session(engine) as session:
-        if session.exec(select(Service)).first(): return
-        insert_northern(session); insert_northeastern(session); insert_eastern(session)
-        insert_wym(session); insert_bl(session); insert_commuter(session); insert_southern(session)
+MAX_DETAIL_BATCH = 200
+PAGE_MAX = 1000
+STREAM_YIELD_PER = 500
+MAX_TRANSFERS = 5
+BOOKING_TIMEOUT = 30  # วินาทีที่รอผลจาก booking queue
+# งบ SQL ของ /tickets/batch ต่อรายการ ตาม BOOKING_MODE
+# db/queue: โหลดทุกรายการด้วย IN (...) แล้วเขียนด้วย executemany -> 4-6 ต่อรอบ CAS ไม่ขึ้นกับจำนวนรายการ (0 ต่อรายการ)
+# memory: ตู้ที่ยังไม่อยู่ใน memory โหลดตู้/ป้าย/ตั๋ว/hold อย่างละ 1 query
+BATCH_SQL_PER_ITEM = {"memory": 4}
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))  # endpoint แบบ def และ _run_db ตอนไม่ได้เปิด ASYNC_DB
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # ไม่ตั้ง = ปิด endpoint /admin/* (404)
+app.add_middleware(metrics.MetricsMiddleware)
+if QUERY_BUDGET != "off": app.add_middleware(QueryBudgetMiddleware)
+if ADMIN_TOKEN: app.add_middleware(ProfilerMiddleware, sampler=sampler)
 
 # ---------- (optional) ensure columns for old DB ----------
 def _ensure_columns():
     try:
-        with sqlite3.connect("database.db") as conn:
+        with db_file_lock(), sqlite3.connect("database.db") as conn:
             cur = conn.cursor()
             cur.execute("PRAGMA table_info(service);")
             cols = [r[1] for r in cur.fetchall()]
             if "departure_time" not in cols: cur.execute("ALTER TABLE service ADD COLUMN departure_time TEXT;")
             if "arrival_time" not in cols: cur.execute("ALTER TABLE service ADD COLUMN arrival_time TEXT;")
+            if "pattern_id" not in cols: cur.execute("ALTER TABLE service ADD COLUMN pattern_id INTEGER REFERENCES servicepattern(id);")
+            if "service_date" not in cols: cur.execute("ALTER TABLE service ADD COLUMN service_date DATE;")
+            cur.execute("CREATE INDEX IF NOT EXISTS ix_service_departure_time_id ON service (departure_time, id);")
+            cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_service_pattern_date ON service (pattern_id, service_date);")
+            cur.execute("PRAGMA table_info(servicecar);")
+            if "segment_load" not in [r[1] for r in cur.fetchall()]: cur.execute("ALTER TABLE servicecar ADD COLUMN segment_load BLOB;")
+            cur.execute("PRAGMA table_info(ticket);")
+            cols = [r[1] for r in cur.fetchall()]
+            if "from_order" not in cols: cur.execute("ALTER TABLE ticket ADD COLUMN from_order INTEGER;")
+            if "to_order" not in cols: cur.execute("ALTER TABLE ticket ADD COLUMN to_order INTEGER;")
             conn.commit()
     except Exception:
         # เงียบไว้ตามที่ต้องการ (no log)
@@ -280,8 +78,33 @@ def _ensure_columns():
 
 @app.on_event("startup")
 def on_startup():
+    if MULTI_WORKER and BOOKING_MODE == "memory":
+        raise RuntimeError("BOOKING_MODE=memory นับที่นั่งใน process เดียว ใช้กับ MULTI_WORKER=1 ไม่ได้ (ใช้ db หรือ queue)")
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     _ensure_columns()
-    insert_all_lines()
+    app.state.seed_report = insert_all_lines()
+    catalog.bump()
+    if BOOKING_MODE == "memory": reservations.start()
+    if BOOKING_MODE == "queue": booking_queue.start()
+    holds.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    holds.stop()
+    if BOOKING_MODE == "memory": reservations.stop()
+    if BOOKING_MODE == "queue": booking_queue.stop()
+
+# ---------- Sync / async DB ----------
+async def _run_db(fn, write: bool = False):
+    """เรียก fn(session) ซึ่งเขียนแบบ sync: ASYNC_DB=1 -> run_sync บน AsyncSession (I/O ผ่าน aiosqlite, ไม่กิน threadpool)
+    ไม่งั้น -> Session ปกติใน threadpool (เหมือน endpoint แบบ def); write=False ใช้ pool อ่านอย่างเดียว"""
+    if async_engine is None:
+        def run():
+            with Session(engine if write else read_engine) as session:
+                return fn(session)
+        return await run_in_threadpool(run)
+    async with AsyncSession(async_engine if write else async_read_engine) as session:
+        return await session.run_sync(fn)
 
 # ---------- Mappers ----------
 def _svc_to_basic(s: Service) -> ServiceBasicOut:
@@ -290,101 +113,514 @@ def _svc_to_basic(s: Service) -> ServiceBasicOut:
         direction=s.direction, departure_time=s.departure_time, arrival_time=s.arrival_time
     )
 
+# ส่วน static ของรายละเอียดขบวน (cache ได้): ข้อมูลขบวน, ป้ายหยุด, ผังตู้ (car id, type, count, seats/car)
+StaticDetail = Tuple[dict, List[ServiceStopOut], List[Tuple[int, CarTypeEnum, int, int]]]
+
+def _load_static(session: Session, ids: List[int]) -> dict[int, StaticDetail]:
+    """ส่วน static ของหลายขบวนด้วย query คงที่ 3 ครั้ง (service, stops JOIN station, cars) ไม่ว่าจะมีกี่ป้าย"""
+    svcs = session.exec(select(Service).where(Service.id.in_(ids))).all()
+    if not svcs: return {}
+    stops: dict[int, list[ServiceStopOut]] = {s.id: [] for s in svcs}
+    q = (select(ServiceStop.service_id, ServiceStop.stop_order, Station)
+         .join(Station, Station.id == ServiceStop.station_id)
+         .where(ServiceStop.service_id.in_(ids))
+         .order_by(ServiceStop.service_id, ServiceStop.stop_order))
+    for sid, order, st in session.exec(q):
+        stops[sid].append(ServiceStopOut(order=order, station=StationOut(id=st.id, name_th=st.name_th, name_en=st.name_en)))
+    cars: dict[int, list] = {s.id: [] for s in svcs}
+    q = (select(ServiceCar.service_id, ServiceCar.id, ServiceCar.car_type, ServiceCar.car_count, ServiceCar.seats_per_car)
+         .where(ServiceCar.service_id.in_(ids)).order_by(ServiceCar.id))
+    for sid, car_id, car_type, count, seats in session.exec(q):
+        cars[sid].append((car_id, car_type, count, seats))
+    return {s.id: (_svc_to_basic(s).model_dump(), stops[s.id], cars[s.id]) for s in svcs}
+
+def _live_reserved(session: Session, ids: List[int]) -> dict[int, int]:
+    """reserved_seats ล่าสุดต่อ car id — query เล็ก ๆ ผ่าน index service_id"""
+    q = select(ServiceCar.id, ServiceCar.service_id, ServiceCar.car_type, ServiceCar.reserved_seats).where(ServiceCar.service_id.in_(ids))
+    out = {}
+    for car_id, sid, car_type, r in session.exec(q):
+        # memory mode: ค่าใน DB อาจตามหลัง engine อยู่ไม่เกินหนึ่งรอบ flush
+        mem = reservations.reserved(sid, car_type) if BOOKING_MODE == "memory" else None
+        out[car_id] = r if mem is None else mem
+    return out
+
+def _merge_detail(static: StaticDetail, reserved: dict[int, int]) -> ServiceDetailOut:
+    basic, stops, layout = static
+    cars = []
+    for car_id, car_type, count, seats in layout:
+        total, r = count * seats, reserved.get(car_id, 0)
+        cars.append(ServiceCarOut(car_type=car_type, car_count=count, seats_per_car=seats,
+                                  total_seats=total, reserved_seats=r, available_seats=total - r))
+    return ServiceDetailOut(**basic, stops=stops, cars=cars)
+
+def _load_details(session: Session, ids: List[int]) -> List[ServiceDetailOut]:
+    """รายละเอียดหลายขบวนตามลำดับ ids (ข้าม id ที่ไม่มี): ส่วน static มาจาก catalog cache, ที่นั่งจาก DB"""
+    statics = catalog.get_many("svc", list(dict.fromkeys(ids)), lambda miss: _load_static(session, miss))
+    found = [i for i in dict.fromkeys(ids) if i in statics]
+    if not found: return []
+    reserved = _live_reserved(session, found)
+    return [_merge_detail(statics[i], reserved) for i in found]
+
 def _svc_to_detail(session: Session, s: Service) -> ServiceDetailOut:
-    stops = session.exec(select(ServiceStop).where(ServiceStop.service_id == s.id).order_by(ServiceStop.stop_order)).all()
-    out_stops = []
-    for stp in stops:
-        st = session.get(Station, stp.station_id)
-        out_stops.append(ServiceStopOut(order=stp.stop_order, station=StationOut(id=st.id, name_th=st.name_th, name_en=st.name_en)))
-    cars = session.exec(select(ServiceCar).where(ServiceCar.service_id == s.id)).all()
-    out_cars = [ServiceCarOut(
-        car_type=c.car_type, car_count=c.car_count, seats_per_car=c.seats_per_car,
-        total_seats=c.total_seats, reserved_seats=c.reserved_seats, available_seats=c.available_seats
-    ) for c in cars]
-    return ServiceDetailOut(
-        id=s.id, line_id=s.line_id, code=s.code, origin=s.origin, direction=s.direction,
-        departure_time=s.departure_time, arrival_time=s.arrival_time, stops=out_stops, cars=out_cars
-    )
+    # reserved_seats รวมที่นั่งที่ถูก hold ไว้ด้วย (hold อยู่ใน segment_load เหมือนตั๋ว)
+    return _load_details(session, [s.id])[0]
+
+# ---------- Pre-serialized responses (ETag / 304) ----------
+def _encode(data) -> tuple[bytes, str]:
+    # separators/ensure_ascii ตรงกับ JSONResponse ของ FastAPI — bytes เหมือนเดิมทุกอย่าง
+    body = json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+    return body, '"%s"' % hashlib.blake2b(body, digest_size=12).hexdigest()
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    inm = request.headers.get("if-none-match")
+    if not inm: return False
+    tags = [t.strip().removeprefix("W/") for t in inm.split(",")]
+    return "*" in tags or etag in tags
+
+def _json_cached(request: Request, key: str, build) -> Response:
+    """JSON bytes + ETag เก็บใน catalog cache (หมดอายุเมื่อ catalog version เปลี่ยน); ตอบ 304 ถ้า If-None-Match ตรง"""
+    body, etag = catalog.get(("json", key), lambda: _encode(build()))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag): return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ---------- In-memory timetable (สร้างใหม่เมื่อ catalog version เปลี่ยน) ----------
+def _timetable() -> Timetable:
+    def build():
+        with Session(read_engine) as session:
+            return Timetable.build(session)
+    return catalog.get("timetable", build)
+
+def _resolve_od(tt: Timetable, origin: str, destination: str) -> tuple[list[int], list[int]]:
+    from_ids, to_ids = tt.resolve(origin), tt.resolve(destination)
+    if not from_ids: raise HTTPException(status_code=404, detail=f"Station {origin} not found")
+    if not to_ids: raise HTTPException(status_code=404, detail=f"Station {destination} not found")
+    return from_ids, to_ids
+
+def _station_out(tt: Timetable, station_id: int) -> StationOut:
+    th, en = tt.stations[station_id]
+    return StationOut(id=station_id, name_th=th, name_en=en)
+
+def _naive_local(dt: datetime) -> datetime:
+    """timetable/DB เก็บเวลาท้องถิ่นแบบ naive: เวลาที่มี offset (เช่น +07:00) แปลงเป็นเวลาท้องถิ่นของ server ก่อน"""
+    return dt.astimezone().replace(tzinfo=None) if dt.tzinfo else dt
+
+def _expand(start: datetime, end: datetime):
+    """สร้าง instance ของ pattern สำหรับวันในช่วงที่ค้น (ครั้งแรกของแต่ละวันเท่านั้น) แล้วให้ timetable/cache สร้างใหม่"""
+    if expander.ensure(start.date(), end.date()): catalog.bump()
+
+# ---------- Seat inventory รายช่วงสถานี ----------
+def _resolve_leg(session: Session, service_id: int, from_station_id: Optional[int], to_station_id: Optional[int]) -> tuple[int, int, int]:
+    """(from_order, to_order, จำนวนช่วง) ของขบวน; ไม่ระบุสถานี = ต้นทาง/ปลายทางของขบวน"""
+    stops = session.exec(select(ServiceStop.station_id, ServiceStop.stop_order)
+                         .where(ServiceStop.service_id == service_id).order_by(ServiceStop.stop_order)).all()
+    try:
+        a, b = leg_orders(stops, from_station_id, to_station_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return a, b, len(stops) - 1
+
+def _ticket_out(t: Ticket) -> TicketOut:
+    return TicketOut(id=t.id, service_id=t.service_id, car_type=t.car_type, quantity=t.quantity,
+                     from_order=t.from_order, to_order=t.to_order)
+
+# ---------- Keyset pagination / NDJSON streaming ----------
+def _encode_cursor(*vals) -> str:
+    return base64.urlsafe_b64encode(json.dumps(vals).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, *types) -> list:
+    """cursor ทึบ (base64 ของ JSON list) -> ค่าตาม types; รูปแบบผิด = 400"""
+    try:
+        vals = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(vals) != len(types): raise ValueError
+        return [t(v) for t, v in zip(types, vals)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _page(session: Session, q, limit: Optional[int], response: Response, key) -> list:
+    """ดึง limit+1 แถวเพื่อรู้ว่ามีหน้าถัดไปไหม แล้วใส่ X-Next-Cursor จาก key ของแถวสุดท้าย"""
+    limit = limit or PAGE_MAX
+    rows = session.exec(q.limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(*key(rows[-1]))
+    return rows
+
+def _stream_ndjson(q, limit: Optional[int], to_dict) -> StreamingResponse:
+    """stream ทีละแถวจาก cursor ฝั่ง DB (yield_per) — หน่วยความจำคงที่ไม่ว่าตารางจะใหญ่แค่ไหน"""
+    if limit: q = q.limit(limit)
+    def gen():
+        with Session(read_engine) as session:
+            for row in session.exec(q.execution_options(yield_per=STREAM_YIELD_PER)):
+                yield json.dumps(to_dict(row), ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
 
 # ---------- Endpoints ----------
+# @query_budget(n) = จำนวน SQL สูงสุดต่อ request (รวมกรณี cache miss / สร้าง instance ของวันใหม่) — ตรวจเมื่อ QUERY_BUDGET=warn|strict
 @app.get("/lines")
-def list_lines():
-    with Session(engine) as session:
-        lines = session.exec(select(Line)).all()
-        return [{"id":l.id, "name_th":l.name_th, "name_en":l.name_en} for l in lines]
+@query_budget(2)
+def list_lines(request: Request):
+    def build():
+        with Session(read_engine) as session:
+            lines = session.exec(select(Line)).all()
+            return [{"id":l.id, "name_th":l.name_th, "name_en":l.name_en} for l in lines]
+    return _json_cached(request, "lines", build)
 
 @app.get("/stations", response_model=List[StationOut])
-def list_stations():
-    with Session(engine) as session:
-        sts = session.exec(select(Station).order_by(Station.name_en)).all()
-        return [StationOut(id=s.id, name_th=s.name_th, name_en=s.name_en) for s in sts]
+@query_budget(2)
+def list_stations(request: Request):
+    def build():
+        with Session(read_engine) as session:
+            sts = session.exec(select(Station).order_by(Station.name_en)).all()
+            return [StationOut(id=s.id, name_th=s.name_th, name_en=s.name_en) for s in sts]
+    return _json_cached(request, "stations", build)
 
 @app.get("/services", response_model=List[ServiceBasicOut])
-def list_services():
-    with Session(engine) as session:
-        svcs = session.exec(select(Service).order_by(Service.departure_time)).all()
-        return [_svc_to_basic(s) for s in svcs]
+@query_budget(None)
+async def list_services(
+    request: Request, response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX), cursor: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+):
+    """ไม่ส่ง limit/cursor = ทั้งตาราง (cache + ETag); ส่ง limit = ทีละหน้า ต่อด้วย X-Next-Cursor; format=ndjson = stream"""
+    q = select(Service).order_by(Service.departure_time, Service.id)
+    if cursor:
+        dep, sid = _decode_cursor(cursor, datetime.fromisoformat, int)
+        q = q.where(or_(Service.departure_time > dep, and_(Service.departure_time == dep, Service.id > sid)))
+    if fmt == "ndjson":
+        return _stream_ndjson(q, limit, lambda s: _svc_to_basic(s).model_dump(mode="json"))
+    if limit is None and cursor is None:
+        def build():
+            with Session(read_engine) as session:
+                return [_svc_to_basic(s) for s in session.exec(q).all()]
+        return await run_in_threadpool(_json_cached, request, "services", build)
+    svcs = await _run_db(lambda session: _page(session, q, limit, response, lambda s: (s.departure_time.isoformat(), s.id)))
+    return [_svc_to_basic(s) for s in svcs]
+
+@app.get("/services/search", response_model=List[ServiceBasicOut])
+@query_budget(10)
+def search_services(start: datetime, end: datetime):
+    """ขบวนที่ออกในช่วง start–end — binary search บน timetable ในหน่วยความจำ ไม่แตะ DB"""
+    start, end = _naive_local(start), _naive_local(end)
+    if end <= start: raise HTTPException(status_code=400, detail="end ต้องมากกว่า start")
+    _expand(start, end)
+    tt = _timetable()
+    return [ServiceBasicOut(**tt.basic(i)) for i in tt.window(start, end)]
+
+@app.get("/services/details", response_model=List[ServiceDetailOut])
+@query_budget(4)
+async def get_service_details(ids: List[int] = Query(..., max_length=MAX_DETAIL_BATCH)):
+    """รายละเอียดหลายขบวนในครั้งเดียว: /services/details?ids=1&ids=2 (ข้าม id ที่ไม่มี)"""
+    return await _run_db(lambda session: _load_details(session, ids))
 
 @app.get("/services/{service_id}", response_model=ServiceDetailOut)
-def get_service(service_id: int):
-    with Session(engine) as session:
-        s = session.get(Service, service_id)
-        if not s: raise HTTPException(status_code=404, detail="Service not found")
-        return _svc_to_detail(session, s)
+@query_budget(4)
+async def get_service(service_id: int):
+    d = await _run_db(lambda session: _load_details(session, [service_id]))
+    if not d: raise HTTPException(status_code=404, detail="Service not found")
+    return d[0]
 
 @app.post("/services", response_model=ServiceBasicOut)
+@query_budget(8)
 def create_service(req: ServiceCreate):
     with Session(engine) as session:
         line = session.get(Line, req.line_id)
         if not line: raise HTTPException(status_code=404, detail="Line not found")
         if len(req.stop_station_ids) < 2: raise HTTPException(status_code=400, detail="Require >=2 stops")
-        for sid in req.stop_station_ids:
-            if not session.get(Station, sid): raise HTTPException(status_code=404, detail=f"Station {sid} not found")
+        found = set(session.exec(select(Station.id).where(Station.id.in_(req.stop_station_ids))).all())
+        missing = next((sid for sid in req.stop_station_ids if sid not in found), None)
+        if missing is not None: raise HTTPException(status_code=404, detail=f"Station {missing} not found")
         svc = _create_service_with_stops_and_cars(
             session, req.line_id, req.code, req.origin, req.direction, req.stop_station_ids,
             departure_time=req.departure_time, arrival_time=req.arrival_time
         )
+        catalog.bump()
         return _svc_to_basic(svc)
 
-@app.get("/services/search", response_model=List[ServiceBasicOut])
-def search_services(start: datetime, end: datetime):
+@app.get("/patterns", response_model=List[PatternOut])
+@query_budget(2)
+def list_patterns(request: Request):
+    """ขบวนประจำ: เวลาออกเป็นนาทีหลังเที่ยงคืน, days_mask bit 0 = จันทร์ ... bit 6 = อาทิตย์"""
+    def build():
+        with Session(read_engine) as session:
+            return [PatternOut(**p.model_dump()) for p in session.exec(select(ServicePattern).order_by(ServicePattern.id))]
+    return _json_cached(request, "patterns", build)
+
+@app.get("/patterns/{pattern_id}/instances/{service_date}", response_model=ServiceDetailOut)
+@query_budget(12)
+def get_pattern_instance(pattern_id: int, service_date: date):
+    """ขบวนของ pattern ในวันที่ระบุ (สร้างเมื่อขอครั้งแรก) — ใช้ id ที่ได้จองตั๋วได้ตามปกติ"""
+    try:
+        sid, created = expander.instance(pattern_id, service_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if created: catalog.bump()
+    if sid is None: raise HTTPException(status_code=404, detail="Pattern not found or not running on this date")
+    with Session(read_engine) as session:
+        return _load_details(session, [sid])[0]
+
+@app.get("/trips/search", response_model=List[TripOut])
+@query_budget(10)
+def search_trips(origin: str, destination: str, start: datetime, end: datetime):
+    """ขบวนที่จอด origin ก่อน destination และออกจาก origin ในช่วง start–end (เวลาแต่ละป้ายเป็นค่าประมาณ)
+    origin/destination เป็น station id หรือ name_en ก็ได้"""
+    start, end = _naive_local(start), _naive_local(end)
     if end <= start: raise HTTPException(status_code=400, detail="end ต้องมากกว่า start")
-    with Session(engine) as session:
-        q = select(Service).where(Service.departure_time >= start, Service.departure_time <= end).order_by(Service.departure_time)
-        svcs = session.exec(q).all()
-        return [_svc_to_basic(s) for s in svcs]
+    _expand(start, end)
+    tt = _timetable()
+    from_ids, to_ids = _resolve_od(tt, origin, destination)
+    return [TripOut(
+        **tt.basic(i), from_station=_station_out(tt, o), to_station=_station_out(tt, d),
+        from_order=fp + 1, to_order=tp + 1, depart_at=from_sec(dep), arrive_at=from_sec(arr)
+    ) for i, o, fp, d, tp, dep, arr in tt.trips(from_ids, to_ids, start, end)]
+
+@app.get("/journeys/search", response_model=List[JourneyOut])
+@query_budget(10)
+def search_journeys(
+    origin: str, destination: str, depart_after: datetime,
+    max_transfers: int = Query(2, ge=0, le=MAX_TRANSFERS), min_transfer: int = Query(10, ge=0, le=180),
+):
+    """วางแผนเดินทางข้ามสายผ่านสถานีชุมทาง (RAPTOR): ได้ทางที่ถึงเร็วสุดต่อจำนวนการต่อรถ
+    min_transfer = นาทีขั้นต่ำสำหรับเปลี่ยนขบวนที่สถานีเดียวกัน"""
+    depart_after = _naive_local(depart_after)
+    _expand(depart_after, depart_after + timedelta(days=1))   # ต่อรถข้ามคืนได้
+    tt = _timetable()
+    from_ids, to_ids = _resolve_od(tt, origin, destination)
+    if set(from_ids) & set(to_ids): raise HTTPException(status_code=400, detail="origin และ destination ต้องต่างกัน")
+    out = []
+    for legs in tt.plan(from_ids, to_ids, to_min(depart_after), max_transfers, min_transfer):
+        trips = [TripOut(
+            **tt.basic(tt.index_of[sid]), from_station=_station_out(tt, o), to_station=_station_out(tt, d),
+            from_order=fp + 1, to_order=tp + 1, depart_at=from_min(dep), arrive_at=from_min(arr)
+        ) for sid, o, fp, d, tp, dep, arr in legs]
+        out.append(JourneyOut(depart_at=trips[0].depart_at, arrive_at=trips[-1].arrive_at, transfers=len(trips) - 1, legs=trips))
+    return out
+
+@app.get("/services/{service_id}/availability", response_model=List[LegAvailabilityOut])
+@query_budget(4)
+async def leg_availability(service_id: int, from_station_id: Optional[int] = None, to_station_id: Optional[int] = None):
+    """ที่นั่งว่างต่อประเภทตู้สำหรับช่วง from–to (ที่นั่งที่ขายช่วงอื่นที่ไม่ทับกันไม่นับ)"""
+    def read(session: Session):
+        if not session.get(Service, service_id): raise HTTPException(status_code=404, detail="Service not found")
+        a, b, n_seg = _resolve_leg(session, service_id, from_station_id, to_station_id)
+        cars = session.exec(select(ServiceCar).where(ServiceCar.service_id == service_id).order_by(ServiceCar.id)).all()
+        out = []
+        for c in cars:
+            used = reservations.reserved(service_id, c.car_type, a, b) if BOOKING_MODE == "memory" else None
+            if used is None: used = load_tree(c.segment_load, c.reserved_seats, n_seg).max(a - 1, b - 1)
+            out.append(LegAvailabilityOut(car_type=c.car_type, total_seats=c.total_seats, available_seats=c.total_seats - used))
+        return out
+    return await _run_db(read)
+
+async def _availability_snapshot(service_id: int) -> Optional[dict]:
+    """ที่นั่งของทุกตู้ในขบวน (ข้อมูลที่ push ให้ subscriber) — static จาก catalog + query เดียว"""
+    d = await _run_db(lambda session: _load_details(session, [service_id]))
+    if not d: return None
+    return {"service_id": service_id, "cars": [c.model_dump(mode="json", include={"car_type", "total_seats", "reserved_seats", "available_seats"})
+                                               for c in d[0].cars]}
+
+availability_hub.load = _availability_snapshot
+
+def _sse(data: dict) -> bytes:
+    return b"event: availability\ndata: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode() + b"\n\n"
+
+@app.get("/services/{service_id}/availability/stream")
+@query_budget(None)
+async def stream_availability(service_id: int, request: Request):
+    """Server-Sent Events: ส่ง snapshot ที่นั่งทันที แล้วส่งใหม่ทุกครั้งที่เปลี่ยน (ไม่เกิน LIVE_MAX_RATE ครั้ง/วินาที)
+    แทนการ poll /services/{id} ระหว่างเปิดขาย"""
+    first = await _availability_snapshot(service_id)
+    if first is None: raise HTTPException(status_code=404, detail="Service not found")
+    async def gen():
+        with availability_hub.subscribe(service_id, first) as q:
+            yield _sse(first)
+            while not await request.is_disconnected():
+                try:
+                    yield _sse(await asyncio.wait_for(q.get(), LIVE_KEEPALIVE))
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+    return StreamingResponse(gen(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/availability", response_model=List[ServiceAvailabilityOut])
+@query_budget(8)
+async def window_availability(start: datetime, end: datetime, car_type: Optional[CarTypeEnum] = None):
+    """ที่นั่งว่าง (ตลอดสาย) ต่อขบวนและประเภทตู้ ของทุกขบวนที่ออกในช่วง start–end
+    query เดียว: service JOIN servicecar แล้ว GROUP BY (ขบวน, ประเภทตู้) — ใช้แทนการเรียก /services/{id} ทีละขบวน"""
+    start, end = _naive_local(start), _naive_local(end)
+    if end <= start: raise HTTPException(status_code=400, detail="end ต้องมากกว่า start")
+    await run_in_threadpool(_expand, start, end)
+    q = (select(Service.id, Service.code, Service.departure_time, Service.arrival_time, ServiceCar.car_type,
+                func.sum(ServiceCar.car_count * ServiceCar.seats_per_car), func.sum(ServiceCar.reserved_seats))
+         .join(ServiceCar, ServiceCar.service_id == Service.id)
+         .where(Service.departure_time >= start, Service.departure_time <= end)
+         .group_by(Service.id, ServiceCar.car_type)
+         .order_by(Service.departure_time, Service.id, func.min(ServiceCar.id)))
+    if car_type is not None: q = q.where(ServiceCar.car_type == car_type)
+    rows = await _run_db(lambda session: session.exec(q).all())
+    out: list[ServiceAvailabilityOut] = []
+    for sid, code, dep, arr, ct, total, reserved in rows:
+        if not out or out[-1].service_id != sid:
+            out.append(ServiceAvailabilityOut(service_id=sid, code=code, departure_time=dep, arrival_time=arr, cars=[]))
+        # memory mode: ตู้ที่โหลดอยู่ใน engine ใช้ค่าล่าสุด (ไม่ต้อง query เพิ่ม)
+        mem = reservations.reserved(sid, ct) if BOOKING_MODE == "memory" else None
+        out[-1].cars.append(LegAvailabilityOut(car_type=ct, total_seats=total, available_seats=total - (reserved if mem is None else mem)))
+    return out
 
 @app.post("/tickets", response_model=TicketOut)
-def book_ticket(req: TicketRequest, request: Request):
-    with Session(engine) as session:
-        svc = session.get(Service, req.service_id)
-        if not svc: raise HTTPException(status_code=404, detail="Service not found")
-        car = session.exec(select(ServiceCar).where(ServiceCar.service_id==req.service_id, ServiceCar.car_type==req.car_type)).first()
-        if not car: raise HTTPException(status_code=404, detail="Car type not found for this service")
-
-        # optimistic locking กัน overbooking
-        retries = 3
-        for _ in range(retries):
-            stmt = (
-                update(ServiceCar)
-                .where(and_(
-                    ServiceCar.id == car.id,
-                    ServiceCar.version == car.version,
-                    (ServiceCar.reserved_seats + req.quantity) <= (ServiceCar.car_count * ServiceCar.seats_per_car),
-                ))
-                .values(reserved_seats=ServiceCar.reserved_seats + req.quantity, version=ServiceCar.version + 1)
-            )
-            result = session.exec(stmt)
-            if result.rowcount and result.rowcount > 0:
-                t = Ticket(service_id=req.service_id, car_type=req.car_type, quantity=req.quantity)
-                session.add(t); session.commit(); session.refresh(t)
-                return TicketOut(id=t.id, service_id=t.service_id, car_type=t.car_type, quantity=t.quantity)
-            session.rollback()
-            car = session.exec(select(ServiceCar).where(ServiceCar.id==car.id)).one_or_none()
-        raise HTTPException(status_code=409, detail="Not enough seats or concurrency conflict")
+@query_budget(10)
+async def book_ticket(req: TicketRequest, request: Request):
+    if BOOKING_MODE == "memory": t = await run_in_threadpool(_book_in_memory, req)
+    elif BOOKING_MODE == "queue": t = await _book_via_queue(req)
+    else: t = await _run_db(lambda session: _book_db(session, req), write=True)
+    availability_hub.publish(req.service_id)
+    return t
+
+def _book_db(session: Session, req: TicketRequest) -> TicketOut:
+    svc = session.get(Service, req.service_id)
+    if not svc: raise HTTPException(status_code=404, detail="Service not found")
+    car = session.exec(select(ServiceCar).where(ServiceCar.service_id==req.service_id, ServiceCar.car_type==req.car_type)).first()
+    if not car: raise HTTPException(status_code=404, detail="Car type not found for this service")
+    a, b, n_seg = _resolve_leg(session, req.service_id, req.from_station_id, req.to_station_id)
+
+    # optimistic locking กัน overbooking: ตรวจที่นั่งรายช่วงใน tree แล้ว CAS ด้วย version
+    retries = 3
+    for attempt in range(retries):
+        if attempt: metrics.booking_retries.inc("tickets")
+        tree = load_tree(car.segment_load, car.reserved_seats, n_seg)
+        if tree.max(a - 1, b - 1) + req.quantity > car.total_seats:
+            metrics.booking_rejections.inc("sold_out")
+            raise HTTPException(status_code=409, detail="Not enough seats or concurrency conflict")
+        tree.add(a - 1, b - 1, req.quantity)
+        stmt = (
+            update(ServiceCar)
+            .where(and_(ServiceCar.id == car.id, ServiceCar.version == car.version))
+            .values(segment_load=pack(tree), reserved_seats=tree.max(0, n_seg), version=ServiceCar.version + 1)
+        )
+        result = session.exec(stmt)
+        if result.rowcount and result.rowcount > 0:
+            t = Ticket(service_id=req.service_id, car_type=req.car_type, quantity=req.quantity, from_order=a, to_order=b)
+            session.add(t); session.commit(); session.refresh(t)
+            return _ticket_out(t)
+        session.rollback()
+        car = session.exec(select(ServiceCar).where(ServiceCar.id==car.id)).one_or_none()
+    metrics.booking_rejections.inc("conflict")
+    raise HTTPException(status_code=409, detail="Not enough seats or concurrency conflict")
+
+@contextmanager
+def _booking_errors():
+    """แปลง error ของ reservation engine / booking queue เป็น HTTP"""
+    try:
+        yield
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SoldOut as e:
+        metrics.rejected(e)
+        raise HTTPException(status_code=409, detail=str(e) or "Not enough seats")
+    except (TimeoutError, asyncio.TimeoutError):
+        # รอผลจาก writer เกิน BOOKING_TIMEOUT (Future ถูก cancel: ถ้า writer ยังไม่หยิบไปก็จะไม่จอง)
+        raise HTTPException(status_code=504, detail="Booking timed out")
+
+def _book_in_memory(req: TicketRequest) -> TicketOut:
+    with Session(read_engine) as session:
+        if not session.get(Service, req.service_id): raise HTTPException(status_code=404, detail="Service not found")
+    with _booking_errors():
+        return _ticket_out(reservations.book(req.service_id, req.car_type, req.quantity, req.from_station_id, req.to_station_id))
+
+async def _book_via_queue(req: TicketRequest) -> TicketOut:
+    # รอ Future ของ writer บน event loop — ไม่กิน slot ของ threadpool ระหว่างรอ group commit
+    with _booking_errors():
+        return await asyncio.wait_for(asyncio.wrap_future(booking_queue.submit(req)), BOOKING_TIMEOUT)
+
+@app.post("/tickets/batch", response_model=List[TicketOut])
+@query_budget(16)   # ส่วนคงที่: 3 รอบ CAS; ส่วนตามจำนวนรายการเพิ่มด้วย allow() ใน handler
+def book_tickets_batch(req: TicketBatchRequest):
+    """จองหลายรายการ (เช่น ไป-กลับ หรือหลายประเภทตู้) แบบ all-or-nothing ในทรานแซกชันเดียว
+    ถ้ารายการใดจองไม่ได้จะไม่มีรายการใดถูกจอง และ error บอกว่าเป็นรายการที่เท่าไร"""
+    allow(BATCH_SQL_PER_ITEM.get(BOOKING_MODE, 0) * len(req.tickets))
+    with _booking_errors():
+        if BOOKING_MODE == "memory":
+            with Session(read_engine) as session:
+                sids = {t.service_id for t in req.tickets}
+                found = set(session.exec(select(Service.id).where(Service.id.in_(sids))).all())
+            missing = next((i for i, t in enumerate(req.tickets) if t.service_id not in found), None)
+            if missing is not None: raise LookupError(f"Item {missing}: Service not found")
+            items = [(t.service_id, t.car_type, t.quantity, t.from_station_id, t.to_station_id) for t in req.tickets]
+            out = [_ticket_out(t) for t in reservations.book_many(items)]
+        else:
+            # db / queue: CAS ด้วย version เหมือนกัน จึงทำงานร่วมกับ writer ของคิวได้
+            out = book_all_or_nothing(req.tickets)
+    for sid in {t.service_id for t in req.tickets}: availability_hub.publish(sid)
+    return out
+
+@app.post("/holds", response_model=HoldOut)
+@query_budget(10)
+def create_hold(req: HoldRequest):
+    """กันที่นั่งไว้ ttl_seconds วินาที (เช่น ระหว่างชำระเงิน) แล้ว confirm เป็นตั๋ว; ไม่ confirm = คืนที่นั่งอัตโนมัติ"""
+    with _booking_errors():
+        h = holds.create(req)
+    return HoldOut(id=h.id, service_id=h.service_id, car_type=h.car_type, quantity=h.quantity,
+                   from_order=h.from_order, to_order=h.to_order, expires_at=h.expires_at)
+
+@app.post("/holds/{hold_id}/confirm", response_model=TicketOut)
+@query_budget(5)
+def confirm_hold(hold_id: int):
+    with _booking_errors():
+        return _ticket_out(holds.confirm(hold_id))
+
+@app.delete("/holds/{hold_id}", status_code=204)
+@query_budget(8)
+def cancel_hold(hold_id: int):
+    with _booking_errors():
+        if not holds.release(hold_id): raise HTTPException(status_code=404, detail="Hold not found")
+    return Response(status_code=204)
 
 @app.get("/tickets", response_model=List[TicketOut])
-def list_tickets():
-    with Session(engine) as session:
-        ts = session.exec(select(Ticket)).all()
-        return [TicketOut(id=t.id, service_id=t.service_id, car_type=t.car_type, quantity=t.quantity) for t in ts]
+@query_budget(None)
+async def list_tickets(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_MAX), cursor: Optional[str] = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+):
+    """เหมือน /services: keyset ตาม id, ต่อหน้าด้วย X-Next-Cursor หรือ format=ndjson เพื่อ stream ทั้งตาราง"""
+    q = select(Ticket).order_by(Ticket.id)
+    if cursor:
+        (after,) = _decode_cursor(cursor, int)
+        q = q.where(Ticket.id > after)
+    if fmt == "ndjson":
+        return _stream_ndjson(q, limit, lambda t: _ticket_out(t).model_dump(mode="json"))
+    if limit is None and cursor is None:
+        return [_ticket_out(t) for t in await _run_db(lambda session: session.exec(q).all())]
+    return [_ticket_out(t) for t in await _run_db(lambda session: _page(session, q, limit, response, lambda t: (t.id,)))]
+
+# ---------- Metrics ----------
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def get_metrics():
+    """Prometheus text format (ค่าของ worker นี้)"""
+    return PlainTextResponse(metrics.render(getattr(app.state, "seed_report", None)),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ---------- Admin: profiler ----------
+def _require_admin(request: Request):
+    if not ADMIN_TOKEN: raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@app.post("/admin/profile", response_class=PlainTextResponse, include_in_schema=False)
+@query_budget(None)
+async def admin_profile(
+    request: Request,
+    seconds: Optional[float] = Query(None, gt=0), requests: Optional[int] = Query(None, ge=1, le=10000),
+    path: str = "/*", method: Optional[str] = None, timeout: float = Query(30, gt=0), idle: bool = False,
+):
+    """sample worker นี้ seconds วินาที หรือ requests request ถัดไปที่ path ตรง (fnmatch) — ตอบเป็น collapsed stacks
+    เช่น  curl -X POST -H "X-Admin-Token: ..." ":8000/admin/profile?requests=50&path=/tickets&method=POST" > out.folded"""
+    _require_admin(request)
+    if (seconds is None) == (requests is None): raise HTTPException(status_code=400, detail="ระบุ seconds หรือ requests อย่างใดอย่างหนึ่ง")
+    try:
+        fut = sampler.run(seconds, idle) if seconds else sampler.arm(path, requests, timeout, method.upper() if method else None, idle)
+    except Busy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    stacks, info = await asyncio.wrap_future(fut)
+    return PlainTextResponse(collapsed(stacks), headers={"X-Profile-Info": json.dumps(info)})
@@ -0,0 +1,148 @@
+# metrics.py  (Prometheus text format ที่ /metrics: latency ต่อ route, SQL ต่อ request, retry/409 ของการจอง)
+# ไม่พึ่ง prometheus_client: counter/histogram เล็ก ๆ ใต้ lock เดียว — observe = bisect + บวกเลข, เปิดทิ้งไว้ใน production ได้
+# ค่าเป็นของ process นี้ (MULTI_WORKER: scrape ทีละ worker หรือรวมฝั่ง Prometheus)
+from __future__ import annotations
+import threading, time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from database import engine, read_engine, async_engine, async_read_engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+_lock = threading.Lock()
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names: return ""
+    esc = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(names, esc)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.label_names = name, help, labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1):
+        with _lock: self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with _lock: items = list(self._values.items())
+        out += [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in sorted(items)]
+        return out
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names, self.buckets = name, help, labels, buckets
+        self._values: dict[tuple, list] = {}   # labels -> [count ต่อ bucket (ไม่สะสม) ..., +Inf, sum]
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with _lock:
+            v = self._values.get(labels)
+            if v is None: v = self._values[labels] = [0] * (len(self.buckets) + 2)
+            v[i] += 1; v[-1] += value
+
+    def render(self) -> list[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock: items = [(k, list(v)) for k, v in self._values.items()]
+        names = self.label_names + ("le",)
+        for k, v in sorted(items):
+            acc = 0
+            for le, n in zip(self.buckets + ("+Inf",), v):
+                acc += n
+                out.append(f"{self.name}_bucket{_labels(names, k + (le,))} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, k)} {v[-1]}")
+            out.append(f"{self.name}_count{_labels(self.label_names, k)} {acc}")
+        return out
+
+
+# ---------- Metrics ----------
+http_requests = Counter("http_requests_total", "HTTP requests", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Request latency (รวมเวลาส่ง body ของ streaming)", ("method", "route"))
+http_db_statements = Histogram("http_request_db_statements", "SQL statements per request", ("method", "route"), COUNT_BUCKETS)
+http_db_seconds = Histogram("http_request_db_seconds", "Time in SQL per request", ("method", "route"))
+db_statements = Counter("db_statements_total", "SQL statements (รวม background writer)", ("engine",))
+db_seconds = Counter("db_seconds_total", "Time in SQL", ("engine",))
+booking_retries = Counter("booking_retries_total", "Optimistic-lock (version CAS) retries", ("path",))
+booking_rejections = Counter("booking_rejections_total", "Bookings answered 409", ("reason",))
+query_budget_exceeded = Counter("query_budget_exceeded_total", "Requests over their SQL budget (QUERY_BUDGET)", ("method", "route"))
+
+ALL = [http_requests, http_latency, http_db_statements, http_db_seconds, db_statements, db_seconds,
+       booking_retries, booking_rejections, query_budget_exceeded]
+
+
+def rejected(e: Exception):
+    """SoldOut -> 409: แยก 'ที่นั่งหมดจริง' กับ 'CAS ชนจน retry หมด'"""
+    booking_rejections.inc("conflict" if "conflict" in str(e) else "sold_out")
+
+
+# ---------- SQL per request ----------
+# middleware ตั้ง [statements, seconds] ต่อ request; threadpool/run_sync ได้ context เดียวกันจึงบวกลง list เดียวกัน
+_request_db: ContextVar[Optional[list]] = ContextVar("request_db", default=None)
+
+def _instrument(eng, name: str):
+    eng = eng.sync_engine if hasattr(eng, "sync_engine") else eng
+
+    @event.listens_for(eng, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_t0", []).append(time.perf_counter())
+
+    @event.listens_for(eng, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        dt = time.perf_counter() - conn.info["metrics_t0"].pop()
+        db_statements.inc(name); db_seconds.inc(name, value=dt)
+        stats = _request_db.get()
+        if stats is not None: stats[0] += 1; stats[1] += dt
+
+for _eng, _name in ((engine, "write"), (read_engine, "read"), (async_engine, "write"), (async_read_engine, "read")):
+    if _eng is not None: _instrument(_eng, _name)
+
+
+class MetricsMiddleware:
+    """ASGI middleware ตรง ๆ (ไม่ใช่ BaseHTTPMiddleware ที่สร้าง task ต่อ request)
+    route = path template ของ FastAPI (/services/{service_id}) -> label ไม่บวมตาม id"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = [0, 0.0]
+        token = _request_db.set(stats)
+        status = [500]
+        async def send_wrapper(msg):
+            if msg["type"] == "http.response.start": status[0] = msg["status"]
+            await send(msg)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            dt = time.perf_counter() - t0
+            _request_db.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method, route, str(status[0]))
+            http_latency.observe(dt, method, route)
+            http_db_statements.observe(stats[0], method, route)
+            http_db_seconds.observe(stats[1], method, route)
+
+
+def render(seed_report: Optional[dict] = None) -> str:
+    out = []
+    for m in ALL: out += m.render()
+    if seed_report:
+        out += ["# HELP seed_duration_seconds Startup seed duration", "# TYPE seed_duration_seconds gauge",
+                f'seed_duration_seconds{_labels(("mode", "skipped"), (seed_report["mode"], str(seed_report["skipped"]).lower()))} '
+                f'{seed_report["seconds"]}',
+                "# HELP seed_services Services created by the startup seed", "# TYPE seed_services gauge",
+                f'seed_services {seed_report["services"]}']
+    return "\n".join(out) + "\n"
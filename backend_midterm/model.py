@@ -1,9 +1,10 @@
 from __future__ import annotations
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, date
 from enum import Enum
 
 from pydantic import BaseModel, Field
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field as SQLField
 
 
@@ -31,7 +32,37 @@ class Station(SQLModel, table=True):
     name_th: str
     name_en: str
 
+class ServicePattern(SQLModel, table=True):
+    # ขบวนที่วิ่งซ้ำตามปฏิทิน: เวลาเป็น offset จากเที่ยงคืนของวันเดินรถ, Service ของแต่ละวันสร้างเมื่อถูกค้น/ขอ (patterns.py)
+    id: Optional[int] = SQLField(default=None, primary_key=True)
+    line_id: int = SQLField(foreign_key="line.id", index=True)
+    code: str
+    origin: str
+    direction: DirectionEnum
+    dep_minute: int          # นาทีหลังเที่ยงคืน
+    duration_minutes: int
+    days_mask: int = 127     # bit 0 = จันทร์ ... bit 6 = อาทิตย์
+    valid_from: Optional[date] = None
+    valid_to: Optional[date] = None
+
+class PatternStop(SQLModel, table=True):
+    id: Optional[int] = SQLField(default=None, primary_key=True)
+    pattern_id: int = SQLField(foreign_key="servicepattern.id", index=True)
+    station_id: int = SQLField(foreign_key="station.id")
+    stop_order: int
+
+class PatternCar(SQLModel, table=True):
+    id: Optional[int] = SQLField(default=None, primary_key=True)
+    pattern_id: int = SQLField(foreign_key="servicepattern.id", index=True)
+    car_type: CarTypeEnum
+    car_count: int
+    seats_per_car: int
+
 class Service(SQLModel, table=True):
+    # keyset pagination: ORDER BY departure_time, id
+    # (pattern_id, service_date) = instance ของ pattern ในวันนั้น — มีได้วันละหนึ่ง; ขบวนที่สร้างเองไม่มี pattern
+    __table_args__ = (Index("ix_service_departure_time_id", "departure_time", "id"),
+                      Index("ux_service_pattern_date", "pattern_id", "service_date", unique=True))
     id: Optional[int] = SQLField(default=None, primary_key=True)
     line_id: int = SQLField(foreign_key="line.id", index=True)
     code: str
@@ -39,6 +70,8 @@ class Service(SQLModel, table=True):
     direction: DirectionEnum
     departure_time: datetime
     arrival_time: datetime
+    pattern_id: Optional[int] = SQLField(default=None, foreign_key="servicepattern.id")
+    service_date: Optional[date] = None
 
 class ServiceStop(SQLModel, table=True):
     id: Optional[int] = SQLField(default=None, primary_key=True)
@@ -52,7 +85,8 @@ class ServiceCar(SQLModel, table=True):
     car_type: CarTypeEnum
     car_count: int
     seats_per_car: int
-    reserved_seats: int = 0
+    reserved_seats: int = 0  # ที่นั่งที่ถูกใช้มากสุดในช่วงใดช่วงหนึ่ง (= ที่นั่งที่ขายแบบตลอดสายไม่ได้)
+    segment_load: Optional[bytes] = None  # array('i') ของที่นั่งที่ถูกจองต่อช่วงสถานี, None = ทุกช่วงเท่ากับ reserved_seats
     version: int = 0  # optimistic locking
 
     @property
@@ -68,6 +102,23 @@ class Ticket(SQLModel, table=True):
     service_id: int = SQLField(foreign_key="service.id", index=True)
     car_type: CarTypeEnum
     quantity: int
+    from_order: Optional[int] = None  # None = ตลอดสาย (ตั๋วเก่า)
+    to_order: Optional[int] = None
+
+class SeatHold(SQLModel, table=True):
+    # ที่นั่งที่กันไว้ระหว่างชำระเงิน: นับรวมใน segment_load/reserved_seats เหมือนตั๋ว จน confirm หรือหมดเวลา
+    id: Optional[int] = SQLField(default=None, primary_key=True)
+    service_id: int = SQLField(foreign_key="service.id", index=True)
+    car_type: CarTypeEnum
+    quantity: int
+    from_order: int
+    to_order: int
+    expires_at: datetime = SQLField(index=True)
+
+class CatalogVersion(SQLModel, table=True):
+    # แถวเดียว (id=1): เพิ่มทุกครั้งที่สาย/สถานี/ขบวนเปลี่ยน -> ทุก worker รู้ว่าต้องทิ้ง cache (catalog.SharedVersion)
+    id: int = SQLField(default=1, primary_key=True)
+    version: int = 0
 
 
 # ---------- API Schemas ----------
@@ -101,6 +152,20 @@ class ServiceDetailOut(ServiceBasicOut):
     stops: list[ServiceStopOut]
     cars: list[ServiceCarOut]
 
+class TripOut(ServiceBasicOut):
+    from_station: StationOut
+    to_station: StationOut
+    from_order: int
+    to_order: int
+    depart_at: datetime
+    arrive_at: datetime
+
+class JourneyOut(BaseModel):
+    depart_at: datetime
+    arrive_at: datetime
+    transfers: int
+    legs: list[TripOut]
+
 class ServiceCreate(BaseModel):
     line_id: int
     code: str
@@ -114,9 +179,52 @@ class TicketRequest(BaseModel):
     service_id: int = Field(gt=0)
     car_type: CarTypeEnum
     quantity: int = Field(ge=1, le=50)
+    from_station_id: Optional[int] = None  # ไม่ระบุ = ต้นทางของขบวน
+    to_station_id: Optional[int] = None    # ไม่ระบุ = ปลายทางของขบวน
 
 class TicketOut(BaseModel):
     id: int
     service_id: int
     car_type: CarTypeEnum
     quantity: int
+    from_order: Optional[int] = None
+    to_order: Optional[int] = None
+
+class HoldRequest(TicketRequest):
+    ttl_seconds: int = Field(600, ge=10, le=3600)
+
+class HoldOut(BaseModel):
+    id: int
+    service_id: int
+    car_type: CarTypeEnum
+    quantity: int
+    from_order: int
+    to_order: int
+    expires_at: datetime
+
+class PatternOut(BaseModel):
+    id: int
+    line_id: int
+    code: str
+    origin: str
+    direction: DirectionEnum
+    dep_minute: int
+    duration_minutes: int
+    days_mask: int
+    valid_from: Optional[date] = None
+    valid_to: Optional[date] = None
+
+class TicketBatchRequest(BaseModel):
+    tickets: list[TicketRequest] = Field(min_items=1, max_items=100)
+
+class LegAvailabilityOut(BaseModel):
+    car_type: CarTypeEnum
+    total_seats: int
+    available_seats: int
+
+class ServiceAvailabilityOut(BaseModel):
+    service_id: int
+    code: str
+    departure_time: datetime
+    arrival_time: datetime
+    cars: list[LegAvailabilityOut]
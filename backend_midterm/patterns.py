@@ -0,0 +1,104 @@
+# patterns.py  (ขบวนประจำตามปฏิทิน: เก็บเป็น pattern แล้วสร้าง Service ของวันนั้นเฉพาะวันที่ถูกค้น/ขอ)
+from __future__ import annotations
+import os, threading
+from datetime import date, datetime, time as dtime, timedelta
+from typing import Iterable, Optional
+
+from sqlmodel import Session, select
+from sqlalchemy import insert, func, literal
+from sqlalchemy.exc import IntegrityError
+
+from database import engine
+from model import Service, ServiceStop, ServiceCar, ServicePattern, PatternStop, PatternCar
+
+PATTERN_HORIZON_DAYS = int(os.getenv("PATTERN_HORIZON_DAYS", "90"))  # ขายล่วงหน้าได้กี่วัน
+
+
+def operates_on(p, day: date) -> bool:
+    """p = ServicePattern หรือแถวของตาราง servicepattern"""
+    if p.valid_from and day < p.valid_from: return False
+    if p.valid_to and day > p.valid_to: return False
+    return bool(p.days_mask >> day.weekday() & 1)
+
+def days_mask(weekdays: Iterable[int]) -> int:
+    """[0, 4] (จันทร์, ศุกร์) -> bitmask"""
+    return sum(1 << d for d in set(weekdays))
+
+def materialize(conn, start: date, end: date) -> int:
+    """สร้าง Service + ป้าย + ตู้ (ที่นั่งเริ่มที่ 0) ของทุก pattern ที่วิ่งในวัน [start, end] ซึ่งยังไม่มี
+    ทำในทรานแซกชันของ conn (ใช้ร่วมกับ seed แบบ bulk ได้); คืนจำนวนขบวนที่สร้าง"""
+    patterns = conn.execute(select(ServicePattern)).all()
+    if not patterns: return 0
+    have = set(conn.execute(select(Service.pattern_id, Service.service_date)
+                            .where(Service.pattern_id.is_not(None), Service.service_date >= start, Service.service_date <= end)).all())
+    todo = [(p, start + timedelta(days=k)) for k in range((end - start).days + 1) for p in patterns]
+    todo = [(p, d) for p, d in todo if (p.id, d) not in have and operates_on(p, d)]
+    if not todo: return 0
+    first_id = next_id = (conn.execute(select(func.max(Service.id))).scalar() or 0) + 1
+    svc_rows = []
+    for p, d in todo:
+        dep = datetime.combine(d, dtime()) + timedelta(minutes=p.dep_minute)
+        svc_rows.append({"id": next_id, "line_id": p.line_id, "code": p.code, "origin": p.origin, "direction": p.direction,
+                         "departure_time": dep, "arrival_time": dep + timedelta(minutes=p.duration_minutes),
+                         "pattern_id": p.id, "service_date": d})
+        next_id += 1
+    conn.execute(insert(Service), svc_rows)
+    # ป้าย/ตู้คัดลอกจาก pattern ฝั่ง SQLite (INSERT ... SELECT) ไม่ต้องสร้าง parameter ทีละแถวใน Python
+    new = select(Service.id, Service.pattern_id).where(Service.id >= first_id).subquery()
+    conn.execute(insert(ServiceStop).from_select(
+        ["service_id", "station_id", "stop_order"],
+        select(new.c.id, PatternStop.station_id, PatternStop.stop_order).join(PatternStop, PatternStop.pattern_id == new.c.pattern_id)
+        .order_by(new.c.id, PatternStop.stop_order)))
+    conn.execute(insert(ServiceCar).from_select(
+        ["service_id", "car_type", "car_count", "seats_per_car", "reserved_seats", "version"],
+        select(new.c.id, PatternCar.car_type, PatternCar.car_count, PatternCar.seats_per_car, literal(0), literal(0))
+        .join(PatternCar, PatternCar.pattern_id == new.c.pattern_id).order_by(new.c.id, PatternCar.id)))
+    return len(svc_rows)
+
+
+class PatternExpander:
+    """จำว่าวันไหนสร้าง instance ครบแล้ว (ใน process) — ค้นวันเดิมซ้ำไม่แตะ DB
+    หลาย worker สร้างวันเดียวกันพร้อมกัน -> unique (pattern_id, service_date) กันซ้ำ แล้วอีกฝ่ายลองใหม่ซึ่งจะเจอว่ามีแล้ว"""
+
+    def __init__(self):
+        self._done: set[date] = set()
+        self._lock = threading.Lock()
+
+    def clamp(self, start: date, end: date) -> list[date]:
+        """วันในช่วง [start, end] ที่อยู่ใน horizon (วันนี้ .. +PATTERN_HORIZON_DAYS) — วันนอก horizon ยังไม่เปิดขาย จึงไม่มีขบวนจาก pattern"""
+        today = date.today()
+        start, end = max(start, today), min(end, today + timedelta(days=PATTERN_HORIZON_DAYS))
+        return [start + timedelta(days=k) for k in range((end - start).days + 1)]
+
+    def ensure(self, start: date, end: date) -> int:
+        """สร้าง instance ของวันในช่วงที่ยังไม่ได้สร้าง; คืนจำนวนขบวนที่สร้าง (> 0 = catalog ต้อง bump)"""
+        days = [d for d in self.clamp(start, end) if d not in self._done]
+        if not days: return 0
+        with self._lock:
+            days = [d for d in days if d not in self._done]
+            if not days: return 0
+            for attempt in range(3):
+                try:
+                    with engine.begin() as conn:
+                        n = materialize(conn, days[0], days[-1])
+                    break
+                except IntegrityError:
+                    if attempt == 2: raise
+            self._done.update(days)
+            return n
+
+    def instance(self, pattern_id: int, day: date) -> tuple[Optional[int], int]:
+        """(service_id ของ pattern ในวันนั้น หรือ None ถ้าไม่วิ่ง, จำนวนขบวนที่เพิ่งสร้าง)
+        ValueError = วันอยู่นอก horizon"""
+        if day not in self.clamp(day, day): raise ValueError(f"service_date ต้องอยู่ในช่วงวันนี้ถึง {PATTERN_HORIZON_DAYS} วันข้างหน้า")
+        n = self.ensure(day, day)
+        with Session(engine) as session:
+            sid = session.exec(select(Service.id).where(Service.pattern_id == pattern_id, Service.service_date == day)).first()
+        return sid, n
+
+    def reset(self):
+        """มี pattern ใหม่/แก้ pattern -> ต้องเช็กทุกวันใหม่"""
+        with self._lock: self._done.clear()
+
+
+expander = PatternExpander()
@@ -0,0 +1,144 @@
+# profiler.py  (sampling profiler ตามสั่งของ worker ที่รันอยู่: N วินาที หรือ K request ถัดไปที่ตรง path)
+# ผลเป็น collapsed stacks ("thread;file:func;file:func count" ต่อบรรทัด) -> flamegraph.pl / speedscope / inferno ได้เลย
+# ไม่ได้สั่ง = ไม่มี thread และ middleware เช็กแค่ attribute เดียว เปิดทิ้งไว้ใน production ได้
+from __future__ import annotations
+import os, sys, threading, time
+from collections import Counter
+from concurrent.futures import Future
+from fnmatch import fnmatchcase
+from typing import Optional
+
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "128"))
+# ระหว่าง profile ลด GIL switch interval (ค่าเดิม 5ms): ไม่งั้น sampler ได้ GIL เฉพาะตอน request สั้น ๆ จบแล้ว -> ไม่เห็นอะไรเลย
+PROFILE_SWITCH_INTERVAL = float(os.getenv("PROFILE_SWITCH_INTERVAL", "0.0005"))
+
+# frame บนสุดแบบนี้ = thread ว่าง (worker รองาน, event loop รอ I/O) — ไม่นับ เว้นแต่ขอ idle=True
+_IDLE = {("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"), ("threading.py", "_wait_for_tstate_lock"),
+         ("thread.py", "_worker")}
+
+
+class Busy(Exception):
+    """มี profile อื่นกำลังทำงานอยู่ (ทีละครั้งต่อ worker)"""
+
+
+def _stack(frame, idle: bool) -> Optional[str]:
+    if not idle and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE: return None
+    out = []
+    while frame is not None and len(out) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        out.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(out))
+
+
+class Sampler:
+    """thread เดียวอ่าน sys._current_frames() ทุก interval แล้วนับ stack ของทุก thread (ยกเว้นตัวเอง)
+    เห็นทั้ง event loop และ threadpool (cProfile เห็นเฉพาะ thread ที่เปิด)
+    - run(seconds): sample ต่อเนื่อง
+    - arm(pattern, k): sample เฉพาะช่วงที่มี request ที่ path ตรง pattern กำลังทำงาน จนครบ k request"""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+        self._busy = False
+        self.armed: Optional[dict] = None   # middleware เช็กแค่ค่านี้; None = ไม่ต้องทำอะไร
+
+    def _start(self) -> tuple[Counter, Future]:
+        with self._lock:
+            if self._busy: raise Busy("profiler is already running")
+            self._busy = True
+            self._switch = sys.getswitchinterval()
+            sys.setswitchinterval(min(self._switch, PROFILE_SWITCH_INTERVAL))
+        return Counter(), Future()
+
+    def _finish(self):
+        with self._lock:
+            self.armed = None; self._busy = False
+            sys.setswitchinterval(self._switch)
+
+    def _sample_once(self, stacks: Counter, me: int, idle: bool, names: dict):
+        for tid, frame in sys._current_frames().items():
+            if tid == me: continue
+            s = _stack(frame, idle)
+            if s: stacks[f"{str(names.get(tid, tid)).replace(' ', '_')};{s}"] += 1
+
+    def run(self, seconds: float, idle: bool = False) -> Future:
+        """Future -> (stacks, ข้อมูลสรุป)"""
+        stacks, fut = self._start()
+        seconds = min(seconds, PROFILE_MAX_SECONDS)
+        def loop():
+            me, t0, n = threading.get_ident(), time.perf_counter(), 0
+            try:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                while time.perf_counter() - t0 < seconds:
+                    self._sample_once(stacks, me, idle, names); n += 1
+                    time.sleep(self.interval)
+                fut.set_result((stacks, {"mode": "seconds", "samples": n, "seconds": round(time.perf_counter() - t0, 3)}))
+            except Exception as e:
+                fut.set_exception(e)   # ไม่งั้น request ของ admin ที่รอ Future ค้างจนหมดเวลา
+            finally:
+                self._finish()
+        threading.Thread(target=loop, name="profiler", daemon=True).start()
+        return fut
+
+    def arm(self, pattern: str, k: int, timeout: float, method: Optional[str] = None, idle: bool = False) -> Future:
+        """K request ถัดไปที่ path ตรง pattern (fnmatch เช่น /tickets หรือ /services/*) — หมด timeout ก่อนครบก็คืนเท่าที่ได้"""
+        stacks, fut = self._start()
+        timeout = min(timeout, PROFILE_MAX_SECONDS)
+        state = self.armed = {"pattern": pattern, "method": method, "left": k, "active": 0, "done": 0}
+        def loop():
+            me, t0, n = threading.get_ident(), time.perf_counter(), 0
+            try:
+                # poll ทุก interval ระหว่าง arm (ไม่รอ notify: ตื่นช้ากว่า request สั้น ๆ แล้วจะพลาดทุกครั้ง)
+                while (state["left"] > 0 or state["active"]) and time.perf_counter() - t0 < timeout:
+                    if state["active"]:
+                        self._sample_once(stacks, me, idle, {t.ident: t.name for t in threading.enumerate()}); n += 1
+                    time.sleep(self.interval)
+                fut.set_result((stacks, {"mode": "requests", "pattern": pattern, "requests": state["done"],
+                                         "samples": n, "seconds": round(time.perf_counter() - t0, 3)}))
+            except Exception as e:
+                fut.set_exception(e)
+            finally:
+                self._finish()
+        threading.Thread(target=loop, name="profiler", daemon=True).start()
+        return fut
+
+    # ---------- เรียกจาก middleware ----------
+    def enter(self, method: str, path: str) -> Optional[dict]:
+        """state ของรอบที่ request นี้ถูกนับเป็นหนึ่งใน K (ส่งคืนให้ leave ตอนจบ) หรือ None"""
+        with self._lock:
+            st = self.armed
+            if st is None or st["left"] <= 0: return None
+            if st["method"] and st["method"] != method or not fnmatchcase(path, st["pattern"]): return None
+            st["left"] -= 1; st["active"] += 1
+            return st
+
+    def leave(self, st: dict):
+        with self._lock:
+            st["active"] -= 1; st["done"] += 1
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{s} {n}\n" for s, n in stacks.most_common())
+
+
+class ProfilerMiddleware:
+    """ASGI: ไม่ได้ arm = ผ่านตรง (เช็ก sampler.armed ค่าเดียว)"""
+
+    def __init__(self, app, sampler: "Sampler"):
+        self.app, self.sampler = app, sampler
+
+    async def __call__(self, scope, receive, send):
+        st = None
+        if self.sampler.armed is not None and scope["type"] == "http": st = self.sampler.enter(scope["method"], scope["path"])
+        if st is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.sampler.leave(st)
+
+
+sampler = Sampler()
@@ -0,0 +1,134 @@
+# querybudget.py  (งบจำนวน SQL ต่อ request: จับ N+1 ก่อนขึ้น production)
+#   QUERY_BUDGET=warn   -> route ที่เกินงบ log warning พร้อม statement ที่ซ้ำ
+#   QUERY_BUDGET=strict -> raise QueryBudgetExceeded หลังส่ง response (TestClient re-raise -> test ล้ม)
+#   QUERY_BUDGET=off    -> ไม่ติดตั้ง listener/middleware เลย (ค่าเริ่มต้น)
+# ประกาศงบใต้ decorator ของ route:  @app.get(...)  @query_budget(4)  def ...
+# route ที่งานโตตามขนาด input (เช่น batch): ประกาศส่วนคงที่ แล้วเรียก allow(n) ใน handler เพิ่มงบของ request นั้น
+# ใน test ที่เรียกฟังก์ชันตรง ๆ:  with track(3) as t: _load_details(session, ids)
+from __future__ import annotations
+import logging, os, re, threading
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from database import engine, read_engine, async_engine, async_read_engine
+import metrics
+
+QUERY_BUDGET = os.getenv("QUERY_BUDGET", "off")
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", "20"))   # route ที่ไม่ได้ประกาศงบ
+
+log = logging.getLogger("railway.querybudget")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """AssertionError: pytest แสดงเป็น test fail ไม่ใช่ error"""
+    def __init__(self, report: dict):
+        self.report = report
+        rep = "; ".join(f"{n}x {s}" for s, n in report["repeated"])
+        super().__init__(f"{report['route']}: {report['statements']} SQL statements > budget {report['budget']}"
+                         + (f" — repeated: {rep}" if rep else ""))
+
+
+def query_budget(n: Optional[int]):
+    """ประกาศงบของ route (None = ไม่ตรวจ เช่น endpoint แบบ stream) — คืนฟังก์ชันเดิม FastAPI จึงเห็น signature เหมือนเดิม"""
+    def mark(fn):
+        fn.__query_budget__ = n
+        return fn
+    return mark
+
+
+# ---------- Statement shapes ----------
+_WS = re.compile(r"\s+")
+_LIT = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAMS = re.compile(r"\(\?(?:, \?)+\)")
+_ROWS = re.compile(r"(\(\?, \.\.\.\)|\(\?\))(?:, (?:\(\?, \.\.\.\)|\(\?\)))+")
+
+def shape(statement: str) -> str:
+    """SQL -> รูปแบบที่ไม่ขึ้นกับค่า: literal -> ?, IN (?, ?, ?) -> (?, ...), VALUES หลายแถว -> แถวเดียว"""
+    s = _LIT.sub("?", _WS.sub(" ", statement.strip()))
+    s = _PARAMS.sub("(?, ...)", s)
+    return _ROWS.sub(r"\1, ...", s)
+
+
+class QueryTracker:
+    def __init__(self):
+        self.statements: list[str] = []
+        self.extra = 0   # งบที่ handler ขอเพิ่มด้วย allow()
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def repeated(self, min_count: int = 2) -> list[tuple[str, int]]:
+        """รูปแบบที่ถูกเรียกซ้ำ (สัญญาณของ N+1) เรียงจากมากไปน้อย"""
+        return [(s, n) for s, n in _Tally(shape(x) for x in self.statements).most_common() if n >= min_count]
+
+    def report(self, route: str, budget: Optional[int]) -> dict:
+        return {"route": route, "statements": self.count, "budget": budget, "repeated": self.repeated()}
+
+
+_current: ContextVar[Optional[QueryTracker]] = ContextVar("query_tracker", default=None)
+_installed = False
+_install_lock = threading.Lock()
+
+def _after(conn, cursor, statement, parameters, context, executemany):
+    t = _current.get()
+    if t is not None: t.statements.append(statement)
+
+def install():
+    """ติดตั้ง listener ครั้งแรกที่ใช้ — QUERY_BUDGET=off และไม่มีใครเรียก track() = ไม่มีค่าใช้จ่าย"""
+    global _installed
+    with _install_lock:
+        if _installed: return
+        for eng in (engine, read_engine, async_engine, async_read_engine):
+            if eng is not None:
+                event.listen(eng.sync_engine if hasattr(eng, "sync_engine") else eng, "after_cursor_execute", _after)
+        _installed = True
+
+def allow(n: int):
+    """เพิ่มงบของ request/block ปัจจุบันอีก n statement (ไม่ได้นับอยู่ = ไม่ทำอะไร)"""
+    t = _current.get()
+    if t is not None: t.extra += n
+
+@contextmanager
+def track(budget: Optional[int] = None, label: str = "block"):
+    """นับ SQL ใน block นี้ (รวม threadpool / AsyncSession.run_sync ที่ได้ context ต่อ); เกิน budget -> QueryBudgetExceeded"""
+    install()
+    t = QueryTracker()
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+    if budget is not None and t.count > budget + t.extra:
+        raise QueryBudgetExceeded(t.report(label, budget + t.extra))
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware: นับ SQL ต่อ request แล้วเทียบกับงบของ route (หรือ QUERY_BUDGET_DEFAULT)"""
+
+    def __init__(self, app, mode: str = QUERY_BUDGET):
+        self.app, self.mode = app, mode
+        install()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t = QueryTracker()
+        token = _current.set(t)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+        route = scope.get("route")
+        budget = getattr(getattr(route, "endpoint", None), "__query_budget__", QUERY_BUDGET_DEFAULT)
+        if budget is None or t.count <= budget + t.extra: return
+        budget += t.extra
+        path = getattr(route, "path", "unmatched")
+        report = t.report(f"{scope['method']} {path}", budget)
+        metrics.query_budget_exceeded.inc(scope["method"], path)
+        if self.mode == "strict": raise QueryBudgetExceeded(report)
+        log.warning("query budget exceeded: %s", report)
@@ -0,0 +1,271 @@
+# reservation.py  (ตัวนับที่นั่งในหน่วยความจำ ล็อกแยกตาม shard + เขียนลง SQLite เป็นชุดก่อนตอบ (group commit))
+from __future__ import annotations
+import os, threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlmodel import Session, select
+from sqlalchemy import insert, update, func, bindparam
+
+from database import engine
+from model import ServiceCar, ServiceStop, Ticket, SeatHold, CarTypeEnum
+from inventory import SegmentTree, leg_orders, pack
+
+# "db" = optimistic locking บน SQLite (ค่าเดิม, ใช้ได้หลาย process), "memory" = ReservationEngine (process เดียว),
+# "queue" = booking_queue.BookingQueue (writer เดียว + group commit)
+BOOKING_MODE = os.getenv("BOOKING_MODE", "db")
+RESERVATION_SHARDS = int(os.getenv("RESERVATION_SHARDS", "64"))
+FLUSH_INTERVAL = float(os.getenv("RESERVATION_FLUSH_INTERVAL", "0.05"))  # วินาที
+
+
+class SoldOut(Exception):
+    pass
+
+
+@dataclass
+class CarState:
+    key: tuple             # (service_id, car_type) -> ใช้หา shard
+    car_id: int
+    total: int
+    stops: list            # [(station_id, stop_order), ...]
+    tree: SegmentTree
+    dirty: bool = False
+
+
+@dataclass
+class _Batch:
+    """ตั๋วที่รอ flush รอบเดียวกัน: Future เดียวต่อรอบ -> request ทั้งหมดในรอบรู้ผล commit พร้อมกัน"""
+    rows: list = field(default_factory=list)   # ticket rows
+    legs: list = field(default_factory=list)   # (CarState, a, b, quantity) ไว้คืนที่นั่งถ้าเขียนไม่สำเร็จ
+    fut: Future = field(default_factory=Future)
+
+
+@dataclass
+class _Shard:
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    cars: dict = field(default_factory=dict)   # (service_id, car_type) -> CarState | None (ไม่มีตู้ประเภทนี้)
+
+
+class ReservationEngine:
+    """ตัวนับที่นั่งของแต่ละ ServiceCar อยู่ในหน่วยความจำเป็นหลัก (authoritative)
+    - แต่ละ (service_id, car_type) อยู่ใน shard เดียว ล็อกเฉพาะ shard นั้น -> จองพร้อมกันคนละขบวนไม่รอกัน
+    - ไม่มี optimistic retry: ตอบ 409 เฉพาะเมื่อที่นั่งหมดจริง
+    - โหลดตู้ครั้งแรกจากตาราง ticket + seathold (กู้สถานะหลัง restart)
+    - ตั๋วใหม่ได้ id ทันที แต่ book() คืนค่าหลัง flush รอบที่มีตั๋วนั้น commit แล้วเท่านั้น (write-through เป็นชุด);
+      flush ล้มเหลว -> คืนที่นั่งแล้ว raise ให้ทุก request ในรอบนั้น
+    ใช้ได้กับ worker เดียวเท่านั้น (หลาย process จะมีตัวนับคนละชุด)"""
+
+    def __init__(self, n_shards: int = RESERVATION_SHARDS, flush_interval: float = FLUSH_INTERVAL):
+        self._shards = [_Shard() for _ in range(n_shards)]
+        self._flush_interval = flush_interval
+        self._batch = _Batch()                # ตั๋วที่ยังไม่ได้เขียน
+        self._dirty: list[CarState] = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._next_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()        # มีตั๋วรอ -> flush ทันที ไม่ต้องรอครบ interval
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- state ----------
+    def _shard_index(self, key) -> int:
+        return hash(key) % len(self._shards)
+
+    def _shard(self, key) -> _Shard:
+        return self._shards[self._shard_index(key)]
+
+    def _load(self, service_id: int, car_type: CarTypeEnum) -> Optional[CarState]:
+        """สร้าง tree ของตู้จากตั๋วและ hold ทั้งหมดใน DB (ตั๋วเก่าที่ไม่มี from/to = ตลอดสาย)"""
+        with Session(engine) as session:
+            car = session.exec(select(ServiceCar).where(ServiceCar.service_id == service_id, ServiceCar.car_type == car_type)).first()
+            if not car: return None
+            stops = session.exec(select(ServiceStop.station_id, ServiceStop.stop_order)
+                                 .where(ServiceStop.service_id == service_id).order_by(ServiceStop.stop_order)).all()
+            n_seg = max(len(stops) - 1, 1)
+            tree = SegmentTree([0] * n_seg)
+            first = stops[0][1] if stops else 1
+            tickets = session.exec(select(Ticket.quantity, Ticket.from_order, Ticket.to_order)
+                                   .where(Ticket.service_id == service_id, Ticket.car_type == car_type))
+            holds = session.exec(select(SeatHold.quantity, SeatHold.from_order, SeatHold.to_order)
+                                 .where(SeatHold.service_id == service_id, SeatHold.car_type == car_type))
+            for q, a, b in [*tickets, *holds]:
+                a = first if a is None else a
+                b = first + n_seg if b is None else b
+                tree.add(a - first, b - first, q)
+            return CarState((service_id, car_type), car.id, car.total_seats, list(stops), tree)
+
+    def state(self, service_id: int, car_type: CarTypeEnum) -> tuple[_Shard, Optional[CarState]]:
+        key = (service_id, CarTypeEnum(car_type))
+        shard = self._shard(key)
+        with shard.lock:
+            if key not in shard.cars: shard.cars[key] = self._load(*key)
+            return shard, shard.cars[key]
+
+    def new_ticket_id(self) -> int:
+        with self._pending_lock:
+            return self._next_ticket_id()
+
+    def _next_ticket_id(self) -> int:
+        """ต้องถือ _pending_lock อยู่"""
+        if self._next_id is None:
+            with Session(engine) as session:
+                self._next_id = (session.exec(select(func.max(Ticket.id))).one() or 0) + 1
+        tid, self._next_id = self._next_id, self._next_id + 1
+        return tid
+
+    def _take(self, shard: _Shard, st: CarState, a: int, b: int, quantity: int):
+        """บวก quantity ที่นั่งช่วง [a, b) (ติดลบ = คืนที่นั่ง) แล้วให้ flush เขียนตู้นี้รอบหน้า"""
+        first = st.stops[0][1]
+        with shard.lock:
+            if quantity > 0 and st.tree.max(a - first, b - first) + quantity > st.total: raise SoldOut()
+            st.tree.add(a - first, b - first, quantity)
+            newly_dirty, st.dirty = not st.dirty, True
+        if newly_dirty:
+            with self._pending_lock: self._dirty.append(st)
+
+    # ---------- API ----------
+    def hold(self, service_id: int, car_type: CarTypeEnum, quantity: int,
+             from_station_id: Optional[int] = None, to_station_id: Optional[int] = None) -> tuple[int, int]:
+        """กันที่นั่งโดยยังไม่ออกตั๋ว คืน (from_order, to_order)
+        LookupError = ไม่มีตู้ประเภทนี้, ValueError = ช่วงสถานีไม่ถูกต้อง, SoldOut = ที่นั่งไม่พอ"""
+        shard, st = self.state(service_id, car_type)
+        if st is None: raise LookupError("Car type not found for this service")
+        a, b = leg_orders(st.stops, from_station_id, to_station_id)
+        self._take(shard, st, a, b, quantity)
+        return a, b
+
+    def release(self, service_id: int, car_type: CarTypeEnum, quantity: int, a: int, b: int):
+        """คืนที่นั่งที่ได้จาก hold()"""
+        shard, st = self.state(service_id, car_type)
+        if st is not None: self._take(shard, st, a, b, -quantity)
+
+    def book(self, service_id: int, car_type: CarTypeEnum, quantity: int,
+             from_station_id: Optional[int] = None, to_station_id: Optional[int] = None) -> Ticket:
+        """กันที่นั่งแล้วออกตั๋ว คืนค่าหลังตั๋วถูก commit ลง DB แล้ว (รอ flush รอบถัดไป)"""
+        shard, st = self.state(service_id, car_type)
+        if st is None: raise LookupError("Car type not found for this service")
+        a, b = leg_orders(st.stops, from_station_id, to_station_id)
+        self._take(shard, st, a, b, quantity)
+        with self._pending_lock:
+            t = self._add_ticket(st, a, b, quantity)
+            fut = self._batch.fut
+        self._wait(fut)
+        return t
+
+    def book_many(self, items: list[tuple]) -> list[Ticket]:
+        """items = [(service_id, car_type, quantity, from_station_id, to_station_id), ...] แบบ all-or-nothing:
+        ล็อกทุก shard ที่เกี่ยวข้อง (เรียงตาม index กัน deadlock) จองทีละรายการ ถ้ารายการใดไม่พอ -> คืนที่นั่งทั้งหมด
+        error ขึ้นต้นด้วย "Item i:" เหมือน booking_queue.book_all_or_nothing"""
+        legs = []
+        for i, (sid, ct, q, fr, to) in enumerate(items):
+            shard, st = self.state(sid, ct)
+            if st is None: raise LookupError(f"Item {i}: Car type not found for this service")
+            try:
+                a, b = leg_orders(st.stops, fr, to)
+            except ValueError as e:
+                raise ValueError(f"Item {i}: {e}")
+            legs.append((st, a, b, q))
+        shards = sorted({self._shard_index(st.key) for st, *_ in legs})
+        for s in shards: self._shards[s].lock.acquire()
+        try:
+            done = []
+            for i, (st, a, b, q) in enumerate(legs):
+                first = st.stops[0][1]
+                if st.tree.max(a - first, b - first) + q > st.total:
+                    for st2, a2, b2, q2 in done: st2.tree.add(a2 - st2.stops[0][1], b2 - st2.stops[0][1], -q2)
+                    raise SoldOut(f"Item {i}: Not enough seats")
+                st.tree.add(a - first, b - first, q)
+                done.append((st, a, b, q))
+            newly_dirty = []
+            for st, *_ in legs:
+                if not st.dirty: st.dirty = True; newly_dirty.append(st)
+        finally:
+            for s in shards: self._shards[s].lock.release()
+        with self._pending_lock:
+            out = [self._add_ticket(st, a, b, q) for st, a, b, q in legs]
+            self._dirty.extend(newly_dirty)
+            fut = self._batch.fut
+        self._wait(fut)
+        return out
+
+    def _add_ticket(self, st: CarState, a: int, b: int, quantity: int) -> Ticket:
+        """ต้องถือ _pending_lock อยู่: ตั๋วเข้า batch ปัจจุบัน"""
+        sid, ct = st.key
+        t = Ticket(id=self._next_ticket_id(), service_id=sid, car_type=ct, quantity=quantity, from_order=a, to_order=b)
+        self._batch.rows.append({"id": t.id, "service_id": sid, "car_type": ct, "quantity": quantity, "from_order": a, "to_order": b})
+        self._batch.legs.append((st, a, b, quantity))
+        return t
+
+    def _wait(self, fut: Future):
+        """รอ batch ของตั๋วนี้ commit (ไม่มี flush thread เช่น script/test -> flush เองเลย); error ของ flush ถูก raise ต่อ"""
+        if self._thread is None: self.flush()
+        else: self._wake.set()
+        fut.result()
+
+    def reserved(self, service_id: int, car_type: CarTypeEnum, a: Optional[int] = None, b: Optional[int] = None) -> Optional[int]:
+        """ที่นั่งที่ถูกใช้มากสุดในช่วง [a, b) ของตู้ที่โหลดแล้ว (None = ยังไม่ได้โหลด ให้ไปอ่าน DB)"""
+        key = (service_id, CarTypeEnum(car_type))
+        shard = self._shard(key)
+        st = shard.cars.get(key)
+        if st is None: return None
+        first, last = st.stops[0][1], st.stops[-1][1]
+        with shard.lock:
+            return st.tree.max((a or first) - first, (b or last) - first)
+
+    # ---------- group commit ----------
+    def flush(self) -> int:
+        """เขียนตั๋วที่ค้างและ segment_load ของตู้ที่เปลี่ยน ในทรานแซกชันเดียว แล้วแจ้งผลให้ request ที่รอ; คืนจำนวนตั๋วที่เขียน"""
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, dirty = self._batch, self._dirty
+                self._batch, self._dirty = _Batch(), []
+            rows = batch.rows
+            if not rows and not dirty:
+                batch.fut.set_result(0); return 0
+            cars = []
+            for st in dirty:
+                with self._shard(st.key).lock:
+                    st.dirty = False
+                    cars.append({"b_id": st.car_id, "b_load": pack(st.tree), "b_reserved": st.tree.max(0, st.tree.n)})
+            try:
+                with engine.begin() as conn:
+                    if rows: conn.execute(insert(Ticket), rows)
+                    if cars:
+                        conn.execute(update(ServiceCar).where(ServiceCar.id == bindparam("b_id")).values(
+                            segment_load=bindparam("b_load"), reserved_seats=bindparam("b_reserved"),
+                            version=ServiceCar.version + 1), cars)
+            except Exception as e:
+                # เขียนไม่สำเร็จ (เช่น DB ถูกล็อก): ตั๋วในรอบนี้ไม่ถูกออก -> คืนที่นั่ง แจ้ง error ให้ request ที่รอ
+                # segment_load ของตู้ยังไม่ได้เขียน -> ให้รอบหน้าเขียนใหม่
+                for st, a, b, q in batch.legs:
+                    first = st.stops[0][1]
+                    with self._shard(st.key).lock: st.tree.add(a - first, b - first, -q)
+                with self._pending_lock:
+                    for st in {id(st): st for st in [*dirty, *(leg[0] for leg in batch.legs)]}.values():
+                        if not st.dirty: st.dirty = True; self._dirty.append(st)
+                batch.fut.set_exception(e)
+                raise
+            batch.fut.set_result(len(rows))
+            return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            try: self.flush()
+            except Exception: pass  # ส่งต่อให้ request ที่รอผ่าน Future แล้ว; ตู้ที่ค้างจะเขียนรอบหน้า
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="reservation-flush", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set(); self._wake.set(); self._thread.join(); self._thread = None
+        self.flush()
+
+
+reservations = ReservationEngine()
@@ -0,0 +1,404 @@
+# seed.py  (seed data + ORM / bulk loaders)
+from __future__ import annotations
+import os, sys, json, time, hashlib, sqlite3
+from datetime import datetime, date, time as dtime, timedelta
+from typing import List, Tuple, Iterable
+
+from sqlmodel import SQLModel, Session, select, create_engine
+from sqlalchemy import insert, func
+
+from database import engine, init_db, db_file_lock
+from model import Line, Station, Service, ServiceStop, ServiceCar, ServicePattern, PatternStop, PatternCar, DirectionEnum, CarTypeEnum
+from patterns import materialize
+
+# "bulk" = executemany ในทรานแซกชันเดียว, "orm" = ทีละแถว (แบบเดิม), "snapshot" = คัดลอกจากไฟล์ที่ build ไว้
+SEED_MODE = os.getenv("SEED_MODE", "bulk")
+SEED_SNAPSHOT = os.getenv("SEED_SNAPSHOT", "seed_snapshot.db")
+
+# ---------- Helpers ----------
+DEFAULT_CARS: List[Tuple[str,int,int]] = [
+    (CarTypeEnum.First.value,        1, 40),
+    (CarTypeEnum.Reserved.value,     2, 64),
+    (CarTypeEnum.NonReserved.value,  2, 72),
+    (CarTypeEnum.Quiet.value,        1, 36),
+    (CarTypeEnum.Catering.value,     1, 0),
+]
+
+def _get_or_create_line(session: Session, th: str, en: str) -> Line:
+    line = session.exec(select(Line).where(Line.name_en == en)).first()
+    if not line:
+        line = Line(name_th=th, name_en=en)
+        session.add(line); session.commit(); session.refresh(line)
+    return line
+
+def _get_or_create_station(session: Session, th: str, en: str) -> Station:
+    st = session.exec(select(Station).where(Station.name_en == en)).first()
+    if not st:
+        st = Station(name_th=th, name_en=en)
+        session.add(st); session.commit(); session.refresh(st)
+    return st
+
+def _ensure_stations(session: Session, pairs: Iterable[Tuple[str,str]]) -> List[int]:
+    return [_get_or_create_station(session, th, en).id for th, en in pairs]
+
+def _guess_dep_arr(code: str, base_day: date | None = None) -> tuple[datetime, datetime]:
+    """กำหนดเวลาออก-ถึงแบบ deterministic จากรหัสขบวน เพื่อให้ค้นตามเวลาได้จริง
+    ใช้ blake2b แทน hash()/random ซึ่งสุ่ม seed ใหม่ทุก process — ทุก worker/ทุกครั้งที่ seed ได้เวลาเดียวกัน"""
+    if base_day is None:
+        base_day = date.today()
+    h = int.from_bytes(hashlib.blake2b(code.encode(), digest_size=8).digest(), "big")
+    # กระจายช่วง 05:30–23:00
+    rnd = (h % (17*60)) + (5*60 + 30)
+    dep = datetime.combine(base_day, dtime(hour=rnd//60, minute=rnd%60))
+    uc = code.upper()
+    hours = 5
+    if "SPECIAL" in uc or "EXPRESS" in uc: hours = 3
+    elif "RAPID" in uc: hours = 4
+    elif "LOCAL" in uc or "COMMUTER" in uc or "ORDINARY" in uc: hours = 5 + ((h >> 20) % 2)
+    arr = dep + timedelta(hours=hours, minutes=(h >> 32) % 51)
+    return dep, arr
+
+def _create_service_with_stops_and_cars(
+    session: Session, line_id: int, code: str, origin_en: str, direction: str,
+    stop_ids_in_order: List[int], departure_time: datetime | None = None, arrival_time: datetime | None = None,
+    cars: Iterable[Tuple[str,int,int]] = DEFAULT_CARS
+) -> Service:
+    dep, arr = (departure_time, arrival_time) if departure_time and arrival_time else _guess_dep_arr(code)
+    svc = Service(
+        line_id=line_id, code=code, origin=origin_en,
+        direction=DirectionEnum(direction), departure_time=dep, arrival_time=arr
+    )
+    session.add(svc); session.commit(); session.refresh(svc)
+    # executemany ครั้งเดียวต่อตาราง (session.add ทีละแถว = INSERT ... RETURNING ทีละป้าย)
+    session.execute(insert(ServiceStop), [{"service_id": svc.id, "station_id": st_id, "stop_order": i}
+                                          for i, st_id in enumerate(stop_ids_in_order, start=1)])
+    session.execute(insert(ServiceCar), [{"service_id": svc.id, "car_type": CarTypeEnum(car_type),
+                                          "car_count": car_count, "seats_per_car": seats}
+                                         for car_type, car_count, seats in cars])
+    session.commit()
+    return svc
+
+# ---------- SEED DATA (ทุกสาย/สถานีตามที่ให้) ----------
+# Northern
+NORTHERN_STATIONS = [
+    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
+    ("กรุงเทพอภิวัฒน์","KRUNG THEP APHIWAT CENTRAL TERMINAL"),("ดอนเมือง","DON MUANG"),("รังสิต","RANGSIT"),
+    ("เชียงราก","Chiang Rak"),("บางปะอิน","Bang Pa-in"),("อยุธยา","AYUTTHAYA"),
+    ("ชุมทางบ้านภาชี","BAN PHACHI JUNCTION"),("หนองวิวัฒน์","Nong Wiwat"),("ท่าเรือ","Tha Ruea"),
+    ("บ้านหมอ","Ban Mo"),("หนองโดน","Nong Don"),("บ้านกลับ","Ban Klap"),("บ้านป่าหวาย","Ban Pa Wai"),
+    ("ลพบุรี","LOP BURI"),("โคกกะเทียม","Khok Kathiam"),("บ้านหมี่","Ban Mi"),("จันเสน","Chan Sen"),
+    ("ช่องแค","Chong Khae"),("บ้านตาคลี","Ban Takhli"),("หัวหวาย","Hua Wai"),("หนองโพ","Nong Pho"),
+    ("เนินมะกอก","Noen Makok"),("เขาทอง","Khao Thong"),("นครสวรรค์","NAKHON SAWAN"),("ปากน้ำโพ","Pak Nam Pho"),
+    ("ทับกฤช","Thap Krit"),("ชุมแสง","Chum Saeng"),("บางมูลนาก","Bang Mun Nak"),("ตะพานหิน","TAPHAN HIN"),
+    ("วังกรด","Wang Krot"),("พิจิตร","PHICHIT"),("ท่าฬ่อ","Tha Lo"),("บางกระทุ่ม","Bang Krathum"),
+    ("บ้านใหม่","Ban Mai"),("พิษณุโลก","PHITSANULOK"),("พรหมพิราม","Phrom Phiram"),("หนองตม","Nong Tom"),
+    ("พิชัย","Phichai"),("ชุมทางบ้านดารา","Ban Dara Junction"),("สวรรคโลก","Sawankhalok"),
+    ("ท่าสัก","Tha Sak"),("ตรอน","Tron"),("อุตรดิตถ์","UTTARADIT"),("ศิลาอาสน์","Sila At"),
+    ("เด่นชัย","DEN CHAI"),("บ้านปิน","Ban Pin"),("แม่เมาะ","Mae Mo"),("นครลำปาง","NAKHON LAMPANG"),
+    ("ขุนตาน","Khun Tan"),("ลำพูน","Lamphun"),("เชียงใหม่","CHIANG MAI"),
+]
+NORTHERN_FROM_BKK = ["COMMUTER 303","LOCAL 401","ORDINARY 201","ORDINARY 209","ORDINARY 211","ORDINARY 207","ORDINARY 301","COMMUTER 317","COMMUTER 313"]
+NORTHERN_FROM_KTA = ["RAPID 111","SPECIAL EXPRESS (DIESEL RAILCAR) 7**","RAPID 109","SPECIAL EXPRESS (UTTARAWITHI) 9","SPECIAL EXPRESS 13","RAPID 107","EXPRESS 51"]
+NORTHERN_TO_BKK   = ["COMMUTER 302","LOCAL 410","ORDINARY 208","COMMUTER 304","ORDINARY 212","ORDINARY 202","LOCAL 402","LOCAL 408"]
+NORTHERN_TO_KTA   = ["RAPID 108","EXPRESS 52","SPECIAL EXPRESS 14","SPECIAL EXPRESS (UTTARAWITHI) 10","RAPID 112","SPECIAL EXPRESS (DIESEL RAILCAR) 8**","RAPID 102"]
+
+# Northeastern (อีสาน)
+NORTHEAST_STATIONS = [
+    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
+    ("กรุงเทพอภิวัฒน์","KRUNG THEP APHIWAT CENTRAL TERMINAL"),("ดอนเมือง","DON MUANG"),("รังสิต","RANGSIT"),
+    ("อยุธยา","AYUTTHAYA"),("ชุมทางบ้านภาชี","BAN PHACHI JUNCTION"),("สระบุรี","SARABURI"),
+    ("ชุมทางแก่งคอย","Kaeng Khoi Junction"),("มวกเหล็ก","Muak Lek"),("ปากช่อง","Pak Chong"),
+    ("สีคิ้ว","Sikhio"),("สูงเนิน","Sung Noen"),("กุดจิก","Kut Chik"),("โคกกรวด","Khok Kruat"),
+    ("นครราชสีมา","NAKHON RATCHASIMA"),("ชุมทางถนนจิระ","Thanon Chira Junction"),
+    ("แก่งเสือเต้น","Kaeng Suea Ten"),("เขื่อนป่าสักชลสิทธิ์","Pa Sak Jolasid Dam"),("ลำนารายณ์","Lam Narai"),
+    ("บำเหน็จณรงค์","Bamnet Narong"),("จัตุรัส","Chatturat"),("บ้านเหลื่อม","Ban Luam"),
+    ("เมืองคง","Mueang Khong"),("ชุมทางบัวใหญ่","Bua Yai Junction"),("เมืองพล","Mueang Phon"),
+    ("บ้านไผ่","Ban Phai"),("ขอนแก่น","KHON KAEN"),("น้ำพอง","Nam Phong"),
+    ("กุมภวาปี","Kumphawapi"),("อุดรธานี","UDON THANI"),("หนองคาย","NONG KHAI"),("ท่านาแล้ง","THANALENG"),
+    ("จักราช","Chakkarat"),("ห้วยแถลง","Huai Thalaeng"),("ลำปลายมาศ","Lam Plai Mat"),("บุรีรัมย์","Buri Ram"),
+    ("กระสัง","Krasang"),("ลำชี","Lam Chi"),("สุรินทร์","SURIN"),("ศีขรภูมิ","Sikhoraphum"),
+    ("สำโรงทาบ","Samrong Thap"),("อุทุมพรพิสัย","Uthumphon Phisai"),("ศรีสะเกษ","SI SA KET"),
+    ("กันทรารมย์","Kanthararom"),("อุบลราชธานี","UBON RATCHATHANI"),
+]
+NE_FROM_BKK = ["COMMUTER 339","ORDINARY 233","COMMUTER 341","LOCAL 421","LOCAL 415","LOCAL 419","LOCAL 427","LOCAL 431","LOCAL 433","LOCAL 435","LOCAL 437","LOCAL 417","LOCAL 429"]
+NE_FROM_KTA = ["SPECIAL EXPRESS (DIESEL RAILCAR) 21**","EXPRESS (DIESEL RAILCAR) 75*","EXPRESS (DIESEL RAILCAR) 71**","RAPID 139","SPECIAL EXPRESS 25","RAPID 141"]
+NE_TO_BKK   = ["COMMUTER 342","LOCAL 424","ORDINARY 234","LOCAL 420","LOCAL 422","LOCAL 426","LOCAL 428","LOCAL 416","LOCAL 432","MIXED 482","MIXED 484"]
+NE_TO_KTA   = ["RAPID 142","EXPRESS 24","RAPID 140","SPECIAL EXPRESS 72*","RAPID 136","SPECIAL EXPRESS 22*","RAPID 134","SPECIAL EXPRESS 26","RAPID 132"]
+
+# Eastern
+EASTERN_STATIONS = [
+    ("กรุงเทพ (หัวลำโพง)","Bangkok"),("ยมราช","Yommarat"),("อุรุพงษ์","Urupong"),("พญาไท","Phaya Thai"),
+    ("มักกะสัน","Makkasan"),("อโศก","Asok"),("คลองตัน","Khlong Tan"),("สุขุมวิท 71","Sukhumvit 71"),
+    ("หัวหมาก","Hua Mak"),("บ้านทับช้าง","Ban Thap Chang"),("ซอยวัดลานบุญ","Soi Wat Lan Bun"),
+    ("ลาดกระบัง","Lat Krabang"),("พระจอมเกล้า","Phra Chom Klao"),("หัวตะเข้","Hua Takhe"),
+    ("คลองหลวงแพ่ง","Khlong Luang Phaeng"),("คลองอุดมชลจร","Khlong Udom Chonlachon"),("เปรง","Preng"),
+    ("คลองแขวงกลั่น","Khlong Khwaeng Klan"),("คลองบางพระ","Khlong Bang Phra"),("บางเตย","Bang Toei"),
+    ("ชุมทางฉะเชิงเทรา","Chachoengsao Junction"),("บางน้ำเปรี้ยว","Bang Nam Priao"),
+    ("ชุมทางคลองสิบเก้า","Khlong Sip Kao Junction"),("โยทะกา","Yothaka"),("บ้านสร้าง","Ban Sang"),
+    ("บ้านปากพลี","Ban Pak Phli"),("ปราจีนบุรี","Prachinburi"),("โคกมะกอก","Khok Makok"),
+    ("ประจันตคาม","Prachantakham"),("บ้านดงบัง","Ban Dong Bang"),("บ้านพรหมแสง","Ban Phrom Saeng"),
+    ("กบินทร์บุรี","Kabin Buri"),("หนองสัง","Nong Sang"),("พระปรง","Phra Prong"),("ศาลาลำดวน","Sala Lamduan"),
+    ("สระแก้ว","Sa Kaeo"),("ท่าเกษม","Tha Kasem"),("ห้วยโจด","Huai Chot"),("วัฒนานคร","Watthana Nakhon"),
+    ("ห้วยเดื่อ","Huai Duea"),("อรัญประเทศ","Aranyaprathet"),("ด่านพรมแดนบ้านคลองลึก","Ban Khlong Luk Border"),
+    ("แปดริ้ว","Paet Rio"),("ดอนสีนนท์","Don Si Non"),("พานทอง","Phan Thong"),("ชลบุรี","Chon Buri"),
+    ("บางพระ","Bang Phra"),("เขาพระบาท","Khao Phra Bat"),("ชุมทางศรีราชา","Si Racha Junction"),
+    ("บางละมุง","Bang Lamung"),("พัทยา","Pattaya"),("พัทยาใต้","Pattaya Tai"),("ตลาดน้ำ 4 ภาค","Talat Nam 4 Pak"),
+    ("บ้านห้วยขวาง","Ban Huai Khwang"),("ญาณสังวราราม","Yanasangwararam"),("สวนนงนุช","Suan Nongnut"),
+    ("ชุมทางเขาชีจรรย์","Khao Chi Chan Junction"),("บ้านพลูตาหลวง","Ban Phlu Ta Luang"),
+]
+EAST_FROM_BKK = ["ORDINARY 275","DIESEL 997","ORDINARY 283","DIESEL 281","COMMUTER 367","COMMUTER 389","DIESEL 279","DIESEL 277","COMMUTER 379","COMMUTER 391","COMMUTER 371","COMMUTER 383"]
+EAST_TO_BKK   = ["ORDINARY 276","DIESEL 998","ORDINARY 284","DIESEL 282","COMMUTER 368","COMMUTER 390","DIESEL 280","DIESEL 278","COMMUTER 380","COMMUTER 392","COMMUTER 372","COMMUTER 384"]
+
+# Wongwian Yai – Maha Chai
+WYM_STATIONS = [
+    ("วงเวียนใหญ่","Wongwian Yai"),("ตลาดพลู","Talat Phlu"),("วุฒากาศ","Wutthakat"),("คลองต้นไทร","Khlong Ton Sai"),
+    ("จอมทอง","Chom Thong"),("วัดไทร","Wat Sai"),("วัดสิงห์","Wat Sing"),("บางบอน","Bang Bon"),
+    ("การเคหะ","Kan Kheha"),("รางโพธิ์","Rang Pho"),("สามแยก","Sam Yaek"),("พรหมแดน","Phrom Daen"),
+    ("ทุ่งสีทอง","Thung Si Thong"),("บางน้ำจืด","Bang Nam Chuet"),("คอกควาย","Khok Khwai"),
+    ("บ้านขอม","Ban Khom"),("คลองจาก","Khlong Chak"),("นิคมรถไฟมหาชัย","Nikhom Rotfai Maha Chai"),
+    ("มหาชัย","Maha Chai"),
+]
+WYM_OUT = ["4303","4311","4321","4341","4305","4313","4323","4343","4315","4325","4317","4307","4327","4345","4309","4329","4347"]
+WYM_IN  = ["4302","4312","4322","4342","4304","4314","4324","4344","4316","4326","4318","4308","4328","4346","4310","4330","4348"]
+
+# Ban Laem – Mae Klong
+BL_STATIONS = [
+    ("บ้านแหลม","Ban Laem"),("ท่าฉลอม","Tha Chalom"),("บ้านชีผ้าขาว","Ban Chi Pha Khao"),
+    ("บางสีคต","Bang Si Khot"),("บางกระเจ้า","Bang Krachao"),("บ้านบ่อ","Ban Bo"),
+    ("บางโทรัด","Bang Thorat"),("บ้านกาหลง","Ban Kalong"),("บ้านนาขวาง","Ban Na Khwang"),
+    ("บ้านนาโคก","Ban Na Khok"),("เขตเมือง","Khet Mueang"),("ลาดใหญ่","Lat Yai"),("แม่กลอง","Mae Klong"),
+]
+BL_OUT = ["4381","4383","4385","4387"]
+BL_IN  = ["4380","4382","4384","4386"]
+
+# Commuter
+COMMUTER_STATIONS = [
+    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
+    ("กรุงเทพอภิวัฒน์","KRUNG THEP APHIWAT CENTRAL TERMINAL"),
+    ("ดอนเมือง","DON MUANG"),("รังสิต","RANGSIT"),("เชียงราก","Chiang Rak"),("บางปะอิน","Bang Pa-in"),
+    ("อยุธยา","AYUTTHAYA"),("ชุมทางบ้านภาชี","BAN PHACHI JUNCTION"),
+]
+COMMUTER_OUT = ["COMMUTER 303","COMMUTER 339*","ORDINARY 201","ORDINARY 209","ORDINARY 233","ORDINARY 207","ORDINARY 301","COMMUTER 341","COMMUTER 317*","COMMUTER 313*"]
+COMMUTER_IN  = ["COMMUTER 304","COMMUTER 342*","ORDINARY 202","ORDINARY 212","ORDINARY 234","ORDINARY 208","ORDINARY 302","COMMUTER 340","COMMUTER 318","COMMUTER 314"]
+
+# Southern
+SOUTHERN_STATIONS = [
+    ("กรุงเทพ (หัวลำโพง)","BANGKOK"),("สามเสน","Sam Sen"),("ชุมทางบางซื่อ","BANG SUE JUNCTION"),
+    ("KRUNG THEP APHIWAT CENTRAL TERMINAL","KRUNG THEP APHIWAT CENTRAL TERMINAL"),
+    ("บางบำหรุ","Bang Bamru"),("ธนบุรี","THON BURI"),("ชุมทางตลิ่งชัน","Taling Chan Junction"),
+    ("ศาลายา","Sala Ya"),("นครปฐม","Nakhon Pathom"),("ชุมทางหนองปลาดุก","Nong Pla Duk Junction"),
+    ("สุพรรณบุรี","Suphan Buri"),("กาญจนบุรี","Kanchanaburi"),("สะพานแควใหญ่","Khwae Yai Bridge"),
+    ("ท่ากิเลน","Tha Kilen"),("สะพานถ้ำกระแซ","Tham Krasae Bridge"),("วังโพ","Wang Pho"),
+    ("เกาะมหามงคล","Ko Maha Mongkhon"),("น้ำตก","Nam Tok"),
+    ("บ้านโป่ง","Ban Pong"),("โพธาราม","Photharam"),("ราชบุรี","Ratchaburi"),("ปากท่อ","Pak Tho"),
+    ("เพชรบุรี","Phetchaburi"),("บ้านชะอำ","Ban Cha-am"),("หัวหิน","Hua Hin"),("วังก์พง","Wang Phong"),
+    ("ปราณบุรี","Pran Buri"),("ประจวบคีรีขันธ์","Prachuap Khiri Khan"),("ห้วยยาง","Huai Yang"),
+    ("ทับสะแก","Thap Sakae"),("บ้านกรูด","Ban Krut"),("บางสะพานใหญ่","Bang Saphan Yai"),
+    ("บางสะพานน้อย","Bang Saphan Noi"),("มาบอำมฤต","Map Ammarit"),("ปะทิว","Pathio"),
+    ("ชุมพร","Chumphon"),("สวี","Sawi"),("หลังสวน","Lang Suan"),("ละแม","Lamae"),
+    ("ท่าชนะ","Tha Chana"),("ไชยา","Chaiya"),("สุราษฎร์ธานี","Surat Thani"),("คีรีรัฐนิคม","Khiri Ratthanikhom"),
+    ("นาสาร","Na San"),("บ้านส้อง","Ban Song"),("ฉวาง","Chawang"),("คลองจันดี","Khlong Chan Di"),
+    ("นาบอน","Na Bon"),("ชุมทางทุ่งสง","Thung Song Junction"),("ตรัง","Trang"),("กันตัง","Kantang"),
+    ("ชุมทางเขาชุมทอง","Khao Chum Thong Junction"),("นครศรีธรรมราช","Nakhon Si Thammarat"),
+    ("ชะอวด","Cha-uat"),("พัทลุง","Phatthalung"),("ชุมทางหาดใหญ่","Hat Yai Junction"),
+    ("จะนะ","Chana"),("ปัตตานี","Pattani"),("ยะลา","Yala"),("ตันหยงมัส","Tanyong Mat"),
+    ("สุไหงโก-ลก","SU-NGAI KOLOK"),("คลองแงะ","Khlong Ngae"),("ปาดังเบซาร์","Padang Besar"),
+]
+SOUTH_OUT = ["ORDINARY 261","COMMUTER 355","RAPID 171","RAPID 169","RAPID 83","EXPRESS 85","SPECIAL EXPRESS 39**","LOCAL 485","LOCAL 351"]
+SOUTH_IN_PADANG = ["RAPID 168","EXPRESS 86","RAPID 170","EXPRESS 84"]
+SOUTH_IN_KOLOK  = ["RAPID 172","SPECIAL EXPRESS 44**","LOCAL 486","LOCAL 352"]
+
+
+# (name_th, name_en, stations, [(codes, origin, direction), ...]) — inbound ใช้ลำดับสถานีกลับด้าน
+SEED_LINES = [
+    ("สายเหนือ","Northern Line",NORTHERN_STATIONS,[
+        (NORTHERN_FROM_BKK,"BANGKOK","outbound"),
+        (NORTHERN_FROM_KTA,"KRUNG THEP APHIWAT CENTRAL TERMINAL","outbound"),
+        (NORTHERN_TO_BKK,"CHIANG MAI","inbound"),
+        (NORTHERN_TO_KTA,"CHIANG MAI","inbound"),
+    ]),
+    ("สายตะวันออกเฉียงเหนือ","Northeastern Line",NORTHEAST_STATIONS,[
+        (NE_FROM_BKK,"BANGKOK","outbound"),
+        (NE_FROM_KTA,"KRUNG THEP APHIWAT CENTRAL TERMINAL","outbound"),
+        (NE_TO_BKK,"UBON RATCHATHANI","inbound"),
+        (NE_TO_KTA,"NONG KHAI","inbound"),
+    ]),
+    ("สายตะวันออก","Eastern Line",EASTERN_STATIONS,[
+        (EAST_FROM_BKK,"Bangkok","outbound"),
+        (EAST_TO_BKK,"Ban Phlu Ta Luang","inbound"),
+    ]),
+    ("วงเวียนใหญ่–มหาชัย","Wongwian Yai–Maha Chai Line",WYM_STATIONS,[
+        ([f"LOCAL {c}" for c in WYM_OUT],"Wongwian Yai","outbound"),
+        ([f"LOCAL {c}" for c in WYM_IN],"Maha Chai","inbound"),
+    ]),
+    ("บ้านแหลม–แม่กลอง","Ban Laem–Mae Klong Line",BL_STATIONS,[
+        ([f"LOCAL {c}" for c in BL_OUT],"Ban Laem","outbound"),
+        ([f"LOCAL {c}" for c in BL_IN],"Mae Klong","inbound"),
+    ]),
+    ("สายชานเมือง","Commuter Line",COMMUTER_STATIONS,[
+        (COMMUTER_OUT,"BANGKOK","outbound"),
+        (COMMUTER_IN,"BAN PHACHI JUNCTION","inbound"),
+    ]),
+    ("สายใต้","Southern Line",SOUTHERN_STATIONS,[
+        (SOUTH_OUT,"BANGKOK","outbound"),
+        (SOUTH_IN_PADANG,"Padang Besar","inbound"),
+        (SOUTH_IN_KOLOK,"SU-NGAI KOLOK","inbound"),
+    ]),
+]
+
+def _pattern_times(code: str) -> tuple[int, int]:
+    """(dep_minute, duration_minutes) ของ pattern จากเวลาที่ _guess_dep_arr ให้"""
+    dep, arr = _guess_dep_arr(code)
+    return dep.hour * 60 + dep.minute, int((arr - dep).total_seconds() // 60)
+
+# ---------- ORM path (ทีละแถว commit ทุกครั้ง; แบบเดิม) — pattern เหมือน bulk, ขบวนรายวันสร้างด้วย materialize ----------
+def _create_pattern_orm(session: Session, line_id: int, code: str, origin_en: str, direction: str,
+                        stop_ids_in_order: List[int], cars: Iterable[Tuple[str,int,int]] = DEFAULT_CARS) -> ServicePattern:
+    dep_minute, duration = _pattern_times(code)
+    p = ServicePattern(line_id=line_id, code=code, origin=origin_en, direction=DirectionEnum(direction),
+                       dep_minute=dep_minute, duration_minutes=duration, days_mask=127)
+    session.add(p); session.commit(); session.refresh(p)
+    for i, st_id in enumerate(stop_ids_in_order, start=1):
+        session.add(PatternStop(pattern_id=p.id, station_id=st_id, stop_order=i)); session.commit()
+    for car_type, car_count, seats in cars:
+        session.add(PatternCar(pattern_id=p.id, car_type=CarTypeEnum(car_type), car_count=car_count, seats_per_car=seats)); session.commit()
+    return p
+
+def _insert_lines_orm(session: Session):
+    for th, en, stations, groups in SEED_LINES:
+        line = _get_or_create_line(session, th, en)
+        ids_out = _ensure_stations(session, stations); ids_in = list(reversed(ids_out))
+        for codes, origin, direction in groups:
+            ids = ids_out if direction == "outbound" else ids_in
+            for c in codes: _create_pattern_orm(session, line.id, c, origin, direction, ids)
+
+# ---------- Bulk path (resolve สถานีทีละสาย + executemany ในทรานแซกชันเดียว) ----------
+# seed เป็น pattern วิ่งทุกวัน; Service ของแต่ละวันสร้างด้วย patterns.materialize (seed สร้างเฉพาะวันนี้)
+def _resolve_stations(conn, pairs: List[Tuple[str,str]]) -> List[int]:
+    names = [en for _, en in pairs]
+    q = select(Station.name_en, Station.id).where(Station.name_en.in_(names))
+    found = dict(conn.execute(q).all())
+    missing, seen = [], set(found)
+    for th, en in pairs:
+        if en not in seen:
+            seen.add(en); missing.append({"name_th": th, "name_en": en})
+    if missing:
+        conn.execute(insert(Station), missing)
+        found = dict(conn.execute(q).all())
+    return [found[en] for en in names]
+
+def _bulk_insert_lines(conn) -> int:
+    """สาย + สถานี + pattern (ป้าย/ตู้) ทั้งหมด; คืนจำนวน pattern"""
+    next_id = (conn.execute(select(func.max(ServicePattern.id))).scalar() or 0) + 1
+    pat_rows, stop_rows, car_rows = [], [], []
+    for th, en, stations, groups in SEED_LINES:
+        line_id = conn.execute(select(Line.id).where(Line.name_en == en)).scalar()
+        if line_id is None:
+            line_id = conn.execute(insert(Line).values(name_th=th, name_en=en)).inserted_primary_key[0]
+        ids_out = _resolve_stations(conn, stations); ids_in = list(reversed(ids_out))
+        for codes, origin, direction in groups:
+            ids = ids_out if direction == "outbound" else ids_in
+            for c in codes:
+                dep_minute, duration = _pattern_times(c)
+                pat_rows.append({"id": next_id, "line_id": line_id, "code": c, "origin": origin,
+                                 "direction": DirectionEnum(direction), "dep_minute": dep_minute,
+                                 "duration_minutes": duration, "days_mask": 127})
+                stop_rows.extend({"pattern_id": next_id, "station_id": sid, "stop_order": i}
+                                 for i, sid in enumerate(ids, start=1))
+                car_rows.extend({"pattern_id": next_id, "car_type": CarTypeEnum(t), "car_count": n, "seats_per_car": seats}
+                                for t, n, seats in DEFAULT_CARS)
+                next_id += 1
+    conn.execute(insert(ServicePattern), pat_rows)
+    conn.execute(insert(PatternStop), stop_rows)
+    conn.execute(insert(PatternCar), car_rows)
+    return len(pat_rows)
+
+# ---------- Snapshot (build ครั้งเดียว แล้ว attach ตอน boot) ----------
+SNAPSHOT_TABLES = [Line.__table__, Station.__table__, ServicePattern.__table__, PatternStop.__table__, PatternCar.__table__]
+
+def seed_version() -> str:
+    """hash ของ seed lists + DEFAULT_CARS + ตารางและคอลัมน์ใน snapshot — แก้รายการสถานี/ขบวนหรือ schema เมื่อไร snapshot เก่าจะถูก build ใหม่"""
+    tables = [(t.name, [c.name for c in t.columns]) for t in SNAPSHOT_TABLES]
+    payload = json.dumps([SEED_LINES, DEFAULT_CARS, tables], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def snapshot_version(path: str = SEED_SNAPSHOT) -> str | None:
+    if not os.path.exists(path): return None
+    try:
+        with sqlite3.connect(path) as conn:
+            row = conn.execute("SELECT value FROM seed_meta WHERE key = 'version'").fetchone()
+            return row[0] if row else None
+    except sqlite3.Error:
+        return None
+
+def build_snapshot(path: str = SEED_SNAPSHOT) -> str:
+    """สร้างฐานข้อมูล seed ลงไฟล์ใหม่ (เขียนไฟล์ชั่วคราวแล้ว rename ทับ)"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp): os.remove(tmp)
+    snap_engine = create_engine(f"sqlite:///{tmp}")
+    SQLModel.metadata.create_all(snap_engine)
+    version = seed_version()
+    with snap_engine.begin() as conn:
+        _bulk_insert_lines(conn)
+        conn.exec_driver_sql("CREATE TABLE seed_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.exec_driver_sql("INSERT INTO seed_meta VALUES ('version', ?)", (version,))
+    snap_engine.dispose()
+    os.replace(tmp, path)
+    return version
+
+def load_snapshot(path: str = SEED_SNAPSHOT, eng=engine) -> int:
+    """ATTACH snapshot แล้ว INSERT ... SELECT ทุกตาราง seed ในทรานแซกชันเดียว (build ใหม่ถ้า version ไม่ตรง)
+    snapshot มีแค่ pattern จึงไม่ผูกกับวันที่ build; คืนจำนวน pattern"""
+    if snapshot_version(path) != seed_version():
+        build_snapshot(path)
+    raw = eng.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute("ATTACH DATABASE ? AS snap", (path,))
+        for t in SNAPSHOT_TABLES:
+            cols = ", ".join(c.name for c in t.columns)
+            cur.execute(f"INSERT INTO main.{t.name} ({cols}) SELECT {cols} FROM snap.{t.name}")
+        raw.commit()
+        cur.execute("DETACH DATABASE snap")
+        return cur.execute("SELECT COUNT(*) FROM main.servicepattern").fetchone()[0]
+    finally:
+        raw.close()
+
+def insert_all_lines(mode: str = SEED_MODE) -> dict:
+    """Seed ทุกสายถ้ายังไม่มีขบวนในระบบ แล้วคืนสรุปว่าใช้เวลาเท่าไร
+    ทำภายใต้ db_file_lock: หลาย worker start พร้อมกัน -> seed ครั้งเดียว ที่เหลือเห็นว่ามีขบวนแล้วก็ข้าม"""
+    with db_file_lock():
+        return _insert_all_lines(mode)
+
+def _insert_all_lines(mode: str) -> dict:
+    t0 = time.perf_counter()
+    with Session(engine) as session:
+        if session.exec(select(Service)).first() or session.exec(select(ServicePattern)).first():
+            return {"mode": mode, "services": 0, "seconds": 0.0, "skipped": True}
+        # snapshot ใช้ id ตายตัว จึงใช้ได้เฉพาะฐานที่ยังไม่มีสาย/สถานี
+        if mode == "snapshot" and (session.exec(select(Line)).first() or session.exec(select(Station)).first()):
+            mode = "bulk"
+    if mode == "orm":
+        with Session(engine) as session:
+            _insert_lines_orm(session)
+        with engine.begin() as conn:
+            n = materialize(conn, date.today(), date.today())
+    elif mode == "snapshot":
+        load_snapshot()
+        with engine.begin() as conn:
+            n = materialize(conn, date.today(), date.today())
+    else:
+        with engine.begin() as conn:
+            _bulk_insert_lines(conn)
+            n = materialize(conn, date.today(), date.today())
+    return {"mode": mode, "services": n, "seconds": round(time.perf_counter() - t0, 4), "skipped": False}
+
+if __name__ == "__main__":
+    # python seed.py             -> seed database.db
+    # python seed.py snapshot    -> build seed_snapshot.db (build step ก่อน deploy)
+    if sys.argv[1:2] == ["snapshot"]:
+        path = sys.argv[2] if len(sys.argv) > 2 else SEED_SNAPSHOT
+        print({"snapshot": path, "version": build_snapshot(path)})
+    else:
+        init_db()
+        print(insert_all_lines())
@@ -0,0 +1,118 @@
+# synth.py  (สร้างเครือข่ายขนาดใหญ่สำหรับวัด performance: สาย/สถานี/ขบวน/ตั๋วตามจำนวนที่กำหนด)
+#   python synth.py --out synth.db --lines 40 --stations 600 --services-per-day 2000 --days 25 --tickets 10000000
+#   python bench.py --db synth.db
+# ขบวนเก็บเป็น ServicePattern แล้ว materialize ทุกวันในช่วง (แบบเดียวกับ seed) ตั๋วเช็กที่นั่งด้วย SegmentTree
+# segment_load/reserved_seats จึงตรงกับตั๋วใน DB — ใช้กับ BOOKING_MODE ไหนก็ได้
+from __future__ import annotations
+import argparse, os, random, time
+from datetime import date, timedelta
+
+from sqlmodel import SQLModel, create_engine, select
+from sqlalchemy import insert, update, bindparam, func
+
+from model import (Line, Station, ServiceStop, ServiceCar, ServicePattern, PatternStop, PatternCar, Ticket,
+                   DirectionEnum, CarTypeEnum)
+from inventory import SegmentTree, pack
+from patterns import materialize
+from seed import DEFAULT_CARS
+
+CHUNK = 50_000   # แถวต่อ executemany
+
+
+def _network(n_lines: int, n_stations: int, stops: int) -> list[list[int]]:
+    """แต่ละสายเป็นช่วงต่อเนื่องของสถานีบนวง (ring) เริ่มห่างกันเท่า ๆ กัน -> สายติดกันใช้สถานีร่วม (จุดเปลี่ยนขบวน)"""
+    stops = min(stops, n_stations)
+    step = max(n_stations // n_lines, 1)
+    return [[(i * step + k) % n_stations + 1 for k in range(stops)] for i in range(n_lines)]
+
+def generate(path: str, lines: int = 10, stations: int = 200, stops: int = 20, services_per_day: int = 500,
+             days: int = 7, tickets: int = 100_000, seed: int = 1, start: date | None = None) -> dict:
+    """เขียนฐานข้อมูลใหม่ที่ path (ไฟล์ชั่วคราวแล้ว rename ทับ); คืนสรุปจำนวนแถว/เวลา"""
+    t0 = time.perf_counter()
+    rnd = random.Random(seed)
+    start = start or date.today()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp): os.remove(tmp)
+    eng = create_engine(f"sqlite:///{tmp}")
+    SQLModel.metadata.create_all(eng)
+    routes = _network(lines, stations, stops)
+    with eng.begin() as conn:
+        # ไฟล์ใหม่ที่ rename ทีหลัง: ไม่ต้อง journal/fsync ระหว่าง build
+        conn.exec_driver_sql("PRAGMA journal_mode=OFF"); conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        conn.execute(insert(Line), [{"id": i + 1, "name_th": f"สาย {i + 1}", "name_en": f"Line {i + 1}"} for i in range(lines)])
+        conn.execute(insert(Station), [{"id": i, "name_th": f"สถานี {i}", "name_en": f"Station {i}"}
+                                       for i in range(1, stations + 1)])
+        pat_rows, stop_rows, car_rows = [], [], []
+        for pid in range(1, services_per_day + 1):
+            li = (pid - 1) % lines
+            outbound = pid % 2 == 1
+            ids = routes[li] if outbound else routes[li][::-1]
+            if pid % 3 == 0: ids = ids[::2] if len(ids) % 2 else ids[::2] + ids[-1:]   # ขบวนเร็ว: จอดเว้นป้าย
+            pat_rows.append({"id": pid, "line_id": li + 1, "code": f"S{pid}", "origin": f"Station {ids[0]}",
+                             "direction": DirectionEnum.outbound if outbound else DirectionEnum.inbound,
+                             "dep_minute": rnd.randrange(5 * 60, 23 * 60), "duration_minutes": 6 * (len(ids) - 1),
+                             "days_mask": 127})
+            stop_rows.extend({"pattern_id": pid, "station_id": sid, "stop_order": k} for k, sid in enumerate(ids, start=1))
+            car_rows.extend({"pattern_id": pid, "car_type": CarTypeEnum(t), "car_count": n, "seats_per_car": seats}
+                            for t, n, seats in DEFAULT_CARS)
+        conn.execute(insert(ServicePattern), pat_rows)
+        conn.execute(insert(PatternStop), stop_rows)
+        conn.execute(insert(PatternCar), car_rows)
+        n_services = materialize(conn, start, start + timedelta(days=days - 1))
+    t_net = time.perf_counter()
+
+    sold = _fill_tickets(eng, rnd, tickets)
+    eng.dispose()
+    os.replace(tmp, path)
+    t1 = time.perf_counter()
+    return {"path": path, "lines": lines, "stations": stations, "patterns": services_per_day, "services": n_services,
+            "tickets": sold, "network_seconds": round(t_net - t0, 2), "ticket_seconds": round(t1 - t_net, 2)}
+
+def _fill_tickets(eng, rnd: random.Random, n: int) -> int:
+    """สุ่มตั๋ว n ใบ (ช่วงสถานีและจำนวนสุ่ม) ลงตู้ที่มีที่นั่ง; ใบที่ที่นั่งไม่พอถูกข้าม (ลองไม่เกิน 2n ครั้ง)
+    จากนั้นเขียน segment_load/reserved_seats ของทุกตู้ที่ถูกจอง"""
+    if n <= 0: return 0
+    with eng.connect() as conn:
+        n_stops = dict(conn.execute(select(ServiceStop.service_id, func.count()).group_by(ServiceStop.service_id)).all())
+        cars = conn.execute(select(ServiceCar.id, ServiceCar.service_id, ServiceCar.car_type, ServiceCar.car_count,
+                                   ServiceCar.seats_per_car).where(ServiceCar.seats_per_car > 0)).all()
+    trees: dict[int, SegmentTree] = {}
+    sold = attempts = 0
+    rows = []
+    with eng.begin() as conn:
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        while sold < n and attempts < 2 * n:
+            attempts += 1
+            car_id, sid, ct, count, seats = cars[rnd.randrange(len(cars))]
+            segs = n_stops[sid] - 1
+            a = rnd.randrange(segs); b = rnd.randrange(a + 1, segs + 1)
+            q = rnd.choice((1, 1, 1, 2, 2, 4))
+            tree = trees.get(car_id)
+            if tree is None: tree = trees[car_id] = SegmentTree([0] * segs)
+            if tree.max(a, b) + q > count * seats: continue
+            tree.add(a, b, q)
+            rows.append({"service_id": sid, "car_type": ct, "quantity": q, "from_order": a + 1, "to_order": b + 1})
+            sold += 1
+            if len(rows) >= CHUNK:
+                conn.execute(insert(Ticket), rows); rows = []
+        if rows: conn.execute(insert(Ticket), rows)
+        car_updates = [{"cid": cid, "load": pack(t), "res": t.max(0, t.n)} for cid, t in trees.items()]
+        for i in range(0, len(car_updates), CHUNK):
+            conn.execute(update(ServiceCar).where(ServiceCar.id == bindparam("cid"))
+                         .values(segment_load=bindparam("load"), reserved_seats=bindparam("res")),
+                         car_updates[i:i + CHUNK])
+    return sold
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="สร้างฐานข้อมูลเครือข่ายรถไฟขนาดใหญ่ (ใช้แทน database.db ได้)")
+    ap.add_argument("--out", default="synth.db")
+    ap.add_argument("--lines", type=int, default=10)
+    ap.add_argument("--stations", type=int, default=200)
+    ap.add_argument("--stops", type=int, default=20, help="ป้ายต่อสาย")
+    ap.add_argument("--services-per-day", type=int, default=500)
+    ap.add_argument("--days", type=int, default=7)
+    ap.add_argument("--tickets", type=int, default=100_000)
+    ap.add_argument("--seed", type=int, default=1)
+    a = ap.parse_args()
+    print(generate(a.out, a.lines, a.stations, a.stops, a.services_per_day, a.days, a.tickets, a.seed))
@@ -0,0 +1,19 @@
+# conftest.py  (แอปเปิด database.db ตาม cwd -> ย้ายไปโฟลเดอร์ชั่วคราวก่อน import main ทุก test ได้ฐานข้อมูลใหม่จาก seed)
+import atexit, os, shutil, sys, tempfile
+
+import pytest
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("QUERY_BUDGET", "strict")   # route ที่เกินงบ SQL -> test ล้ม
+_tmp = tempfile.mkdtemp(prefix="railway-test-")
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+os.chdir(_tmp)
+sys.path.insert(0, HERE)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as c:
+        yield c
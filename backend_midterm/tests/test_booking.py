@@ -0,0 +1,110 @@
+import pytest
+
+from reservation import BOOKING_MODE
+
+
+@pytest.mark.parametrize("size", [30, 100])   # 100 = max_items ของ TicketBatchRequest
+def test_ticket_batch_fits_query_budget(client, size):
+    # conftest ตั้ง QUERY_BUDGET=strict: batch ใหญ่ที่เกินงบของ route -> QueryBudgetExceeded -> test ล้ม
+    services = client.get("/services", params={"limit": 50}).json()
+    cars = [(s["id"], c["car_type"]) for s in services for c in client.get(f"/services/{s['id']}").json()["cars"][:2]]
+    items = [{"service_id": sid, "car_type": ct, "quantity": 1} for sid, ct in cars[:size]]
+    assert len(items) == size
+    r = client.post("/tickets/batch", json={"tickets": items})
+    assert r.status_code == 200
+    assert [(t["service_id"], t["quantity"]) for t in r.json()] == [(i["service_id"], i["quantity"]) for i in items]
+
+
+def _ticket_count() -> int:
+    from sqlmodel import Session, select, func
+    from database import engine
+    from model import Ticket
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(Ticket)).one()
+
+
+@pytest.mark.skipif(BOOKING_MODE == "memory", reason="memory mode ไม่ผ่านคิว (writer เขียน DB ตรง ๆ จะไม่ตรงกับ state ใน memory)")
+def test_cancelled_queue_booking_does_not_kill_writer(client):
+    from booking_queue import BookingQueue
+    from model import TicketRequest
+    svc = client.get("/services", params={"limit": 1}).json()[0]["id"]
+    car_type = client.get(f"/services/{svc}").json()["cars"][0]["car_type"]
+    req = TicketRequest(service_id=svc, car_type=car_type, quantity=1)
+    q = BookingQueue(linger_ms=0)
+    before = _ticket_count()
+    cancelled = q.submit(req)
+    assert cancelled.cancel()   # เหมือน asyncio.wait_for หมดเวลาก่อน writer หยิบไป
+    ok = q.submit(req)
+    q.start()
+    try:
+        t = ok.result(timeout=5)
+        assert t.service_id == svc
+        assert q.submit(req).result(timeout=5).id > t.id   # writer ยังทำงานต่อ
+    finally:
+        q.stop()
+    assert _ticket_count() == before + 2   # รายการที่ถูกยกเลิกไม่ถูกจอง
+
+
+def test_queue_timeout_is_504(client, monkeypatch):
+    import asyncio
+    from fastapi import HTTPException
+    import main
+    from booking_queue import BookingQueue
+    from model import TicketRequest
+    monkeypatch.setattr(main, "booking_queue", BookingQueue())   # ไม่ start = writer ไม่หยิบงาน
+    monkeypatch.setattr(main, "BOOKING_TIMEOUT", 0.05)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main._book_via_queue(TicketRequest(service_id=1, car_type="First", quantity=1)))
+    assert e.value.status_code == 504
+    (_, fut), = list(main.booking_queue._q.queue)
+    assert fut.cancelled()
+
+
+def _first_car(client, index: int = 0):
+    svc = client.get("/services", params={"limit": index + 1}).json()[index]["id"]
+    return svc, client.get(f"/services/{svc}").json()["cars"]
+
+
+def test_batch_is_all_or_nothing(client):
+    svc, cars = _first_car(client)
+    tight = min((c for c in cars if c["total_seats"]), key=lambda c: c["total_seats"])   # quantity สูงสุด 50
+    before, n_tickets = client.get(f"/services/{svc}").json()["cars"], _ticket_count()
+    r = client.post("/tickets/batch", json={"tickets": [
+        {"service_id": svc, "car_type": cars[0]["car_type"], "quantity": 1},
+        {"service_id": svc, "car_type": tight["car_type"], "quantity": tight["total_seats"] - tight["reserved_seats"] + 1},
+    ]})
+    assert r.status_code == 409
+    assert r.json()["detail"].startswith("Item 1:")
+    assert client.get(f"/services/{svc}").json()["cars"] == before   # รายการที่ 0 ไม่ถูกจองด้วย
+    assert _ticket_count() == n_tickets
+
+
+def test_batch_error_names_failing_item(client):
+    svc, cars = _first_car(client)
+    ok = {"service_id": svc, "car_type": cars[0]["car_type"], "quantity": 1}
+    r = client.post("/tickets/batch", json={"tickets": [ok, ok, {**ok, "service_id": 999999}]})
+    assert r.status_code == 404 and r.json()["detail"] == "Item 2: Service not found"
+    r = client.post("/tickets/batch", json={"tickets": [ok, {**ok, "from_station_id": 999999}]})
+    assert r.status_code == 400 and r.json()["detail"].startswith("Item 1:")
+
+
+def test_write_cars_conflict_rolls_back_every_car(client):
+    from sqlmodel import Session
+    from sqlalchemy import update
+    from database import engine
+    from model import ServiceCar, TicketRequest
+    from booking_queue import Conflict, reserve_batch, write_cars
+    svc, cars = _first_car(client, 1)
+    reqs = [TicketRequest(service_id=svc, car_type=c["car_type"], quantity=1) for c in cars if c["total_seats"]][:2]
+    with Session(engine) as session:
+        _, trees = reserve_batch(session, reqs)
+        assert len(trees) == 2
+        (id_a, id_b), before = list(trees), {c.id: (c.version, c.segment_load) for c, _ in trees.values()}
+        with engine.begin() as other:   # อีก writer แก้ตู้ที่สองระหว่าง batch
+            other.execute(update(ServiceCar).where(ServiceCar.id == id_b).values(version=ServiceCar.version + 1))
+        with pytest.raises(Conflict):
+            write_cars(session, trees)
+    with Session(engine) as session:
+        a, b = session.get(ServiceCar, id_a), session.get(ServiceCar, id_b)
+        assert (a.version, a.segment_load) == before[id_a]   # ตู้แรกที่ UPDATE ผ่านถูก rollback ด้วย
+        assert b.version == before[id_b][0] + 1
@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import holds as holds_module
+from holds import HoldManager, holds
+
+TTL = 10
+
+
+@pytest.fixture
+def car(client):
+    svc = client.get("/services", params={"limit": 5}).json()[4]["id"]
+    car = next(c for c in client.get(f"/services/{svc}").json()["cars"] if c["total_seats"])
+    return svc, car["car_type"]
+
+
+def _reserved(client, car) -> int:
+    svc, car_type = car
+    return next(c["reserved_seats"] for c in client.get(f"/services/{svc}").json()["cars"] if c["car_type"] == car_type)
+
+
+def _hold(client, car, quantity: int) -> int:
+    svc, car_type = car
+    r = client.post("/holds", json={"service_id": svc, "car_type": car_type, "quantity": quantity, "ttl_seconds": TTL})
+    assert r.status_code == 200
+    return r.json()["id"]
+
+
+def _later() -> datetime:
+    return datetime.now() + timedelta(seconds=TTL + 1)
+
+
+def test_seats_come_back_after_ttl(client, car):
+    before = _reserved(client, car)
+    hid = _hold(client, car, 3)
+    assert _reserved(client, car) == before + 3
+    assert holds.sweep(now=_later()) >= 1
+    assert _reserved(client, car) == before
+    assert client.post(f"/holds/{hid}/confirm").status_code == 404
+
+
+def test_confirm_expired_hold_fails(client, car, monkeypatch):
+    before = _reserved(client, car)
+    hid = _hold(client, car, 2)
+
+    class Later(datetime):
+        @classmethod
+        def now(cls, tz=None): return _later()
+    monkeypatch.setattr(holds_module, "datetime", Later)   # หมดเวลาแล้วแต่ sweeper ยังไม่ทันคืนที่นั่ง
+    assert client.post(f"/holds/{hid}/confirm").status_code == 404
+    monkeypatch.undo()
+    r = client.post(f"/holds/{hid}/confirm")
+    assert r.status_code == 200 and r.json()["quantity"] == 2
+    assert client.post(f"/holds/{hid}/confirm").status_code == 404
+    assert _reserved(client, car) == before + 2   # ตั๋วใช้ที่นั่งเดิมของ hold
+
+
+def test_cancel_returns_seats(client, car):
+    before = _reserved(client, car)
+    hid = _hold(client, car, 4)
+    assert client.delete(f"/holds/{hid}").status_code == 204
+    assert client.delete(f"/holds/{hid}").status_code == 404
+    assert _reserved(client, car) == before
+
+
+def test_holds_survive_restart(client, car):
+    before = _reserved(client, car)
+    hid = _hold(client, car, 1)
+    restarted = HoldManager()   # process ใหม่: heap ว่าง ต้องโหลดจากตาราง seathold
+    restarted.start()
+    try:
+        assert hid in {h for _, h in restarted._heap}
+        assert _reserved(client, car) == before + 1
+        assert restarted.sweep(now=_later()) >= 1
+    finally:
+        restarted.stop()
+    assert _reserved(client, car) == before
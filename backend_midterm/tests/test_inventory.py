@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from inventory import SegmentTree, leg_orders, load_tree, pack
+
+
+def test_segment_tree_matches_brute_force():
+    rnd = random.Random(7)
+    for n in (1, 2, 5, 16, 53):
+        seats = [rnd.randrange(3) for _ in range(n)]
+        tree = SegmentTree(seats)
+        for _ in range(300):
+            l = rnd.randrange(n); r = rnd.randrange(l + 1, n + 1)
+            if rnd.random() < 0.5:
+                v = rnd.randrange(-min(seats[l:r]), 5)   # ติดลบ = คืนที่นั่ง (ไม่ต่ำกว่า 0)
+                tree.add(l, r, v)
+                for i in range(l, r): seats[i] += v
+            else:
+                assert tree.max(l, r) == max(seats[l:r])
+        assert list(tree.leaves()) == seats
+        assert list(load_tree(pack(tree), 0, n).leaves()) == seats
+
+
+def test_load_tree_without_blob_is_full_route():
+    tree = load_tree(None, 5, 4)
+    assert [tree.max(i, i + 1) for i in range(4)] == [5, 5, 5, 5]
+
+
+def test_leg_orders():
+    stops = [(10, 1), (20, 2), (30, 3), (40, 4)]
+    assert leg_orders(stops, None, None) == (1, 4)
+    assert leg_orders(stops, 20, None) == (2, 4)
+    assert leg_orders(stops, None, 30) == (1, 3)
+    for fr, to in ((99, None), (30, 20), (20, 20)):
+        with pytest.raises(ValueError):
+            leg_orders(stops, fr, to)
+    with pytest.raises(ValueError):
+        leg_orders(stops[:1], None, None)
+
+
+def test_seat_resold_on_legs_that_do_not_overlap(client):
+    svc = client.get("/services", params={"limit": 4}).json()[3]["id"]
+    detail = client.get(f"/services/{svc}").json()
+    car = next(c for c in detail["cars"] if 0 < c["total_seats"] <= 50 and c["reserved_seats"] == 0)
+    stations = [s["station"]["id"] for s in detail["stops"]]
+    first, mid, last = stations[0], stations[len(stations) // 2], stations[-1]
+    book = lambda fr, to, q: client.post("/tickets", json={"service_id": svc, "car_type": car["car_type"], "quantity": q,
+                                                            "from_station_id": fr, "to_station_id": to})
+    full = car["total_seats"]
+    assert book(first, mid, full).status_code == 200
+    assert book(mid, last, full).status_code == 200          # ที่นั่งเดิมขายซ้ำช่วงหลังได้
+    assert book(first, last, 1).status_code == 409           # ทับทั้งสองช่วง
+    before_mid = stations[len(stations) // 2 - 1]
+    assert book(before_mid, stations[len(stations) // 2 + 1], 1).status_code == 409   # ข้ามจุดต่อช่วง
+    legs = client.get(f"/services/{svc}/availability", params={"from_station_id": first, "to_station_id": mid}).json()
+    assert next(l for l in legs if l["car_type"] == car["car_type"])["available_seats"] == 0
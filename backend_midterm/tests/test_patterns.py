@@ -0,0 +1,69 @@
+from datetime import date, datetime, time, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import insert, select, func
+
+from database import engine
+from model import Service, ServicePattern, PatternStop, PatternCar, CarTypeEnum, DirectionEnum
+from patterns import PATTERN_HORIZON_DAYS, days_mask, expander, materialize, operates_on
+
+
+def _window(first: date, last: date) -> dict:
+    return {"start": datetime.combine(first, time.min).isoformat(), "end": datetime.combine(last, time.max).isoformat()}
+
+
+def test_operates_on_days_mask_and_validity():
+    monday = date(2030, 1, 7)
+    p = SimpleNamespace(days_mask=days_mask([0, 4]), valid_from=None, valid_to=None)   # จันทร์, ศุกร์
+    assert [operates_on(p, monday + timedelta(days=k)) for k in range(7)] == [True, False, False, False, True, False, False]
+    p.valid_from, p.valid_to = monday + timedelta(days=1), monday + timedelta(days=7)
+    assert not operates_on(p, monday)
+    assert operates_on(p, monday + timedelta(days=4)) and operates_on(p, monday + timedelta(days=7))
+    assert not operates_on(p, monday + timedelta(days=11))
+
+
+def test_clamp_to_horizon():
+    today = date.today()
+    days = expander.clamp(today - timedelta(days=3), today + timedelta(days=PATTERN_HORIZON_DAYS + 30))
+    assert days[0] == today and days[-1] == today + timedelta(days=PATTERN_HORIZON_DAYS)
+    assert len(days) == PATTERN_HORIZON_DAYS + 1
+    assert expander.clamp(today + timedelta(days=PATTERN_HORIZON_DAYS + 1), today + timedelta(days=PATTERN_HORIZON_DAYS + 5)) == []
+
+
+def test_materialize_is_idempotent_and_follows_mask(client):
+    start = date.today() + timedelta(days=60)   # สัปดาห์ที่ test อื่นไม่ได้ค้น
+    with engine.begin() as conn:
+        line_id = conn.execute(select(ServicePattern.line_id)).scalar()
+        station_ids = conn.execute(select(PatternStop.station_id).limit(3)).scalars().all()
+        pid = conn.execute(insert(ServicePattern).values(
+            line_id=line_id, code="TEST WEEKEND", origin="test", direction=DirectionEnum.outbound,
+            dep_minute=9 * 60, duration_minutes=90, days_mask=days_mask([5, 6]))).inserted_primary_key[0]
+        conn.execute(insert(PatternStop), [{"pattern_id": pid, "station_id": s, "stop_order": i} for i, s in enumerate(station_ids, 1)])
+        conn.execute(insert(PatternCar), [{"pattern_id": pid, "car_type": CarTypeEnum.First, "car_count": 1, "seats_per_car": 40}])
+    end = start + timedelta(days=6)
+    with engine.begin() as conn:
+        first = materialize(conn, start, end)
+    with engine.begin() as conn:
+        assert materialize(conn, start, end) == 0
+        days = conn.execute(select(Service.service_date).where(Service.pattern_id == pid)).scalars().all()
+        n_services = conn.execute(select(func.count()).select_from(Service)
+                                  .where(Service.service_date >= start, Service.service_date <= end)).scalar()
+    assert sorted(d.weekday() for d in days) == [5, 6]
+    assert first == n_services
+
+
+def test_long_search_expands_every_day(client):
+    first = date.today() + timedelta(days=40)
+    last = first + timedelta(days=19)
+    found = client.get("/services/search", params=_window(first, last)).json()
+    assert {s["departure_time"][:10] for s in found} == {(first + timedelta(days=k)).isoformat() for k in range(20)}
+    day12 = first + timedelta(days=12)
+    alone = client.get("/services/search", params=_window(day12, day12)).json()
+    assert alone and [s["id"] for s in found if s["departure_time"].startswith(day12.isoformat())] == [s["id"] for s in alone]
+
+
+def test_pattern_instance_horizon(client):
+    pid = client.get("/patterns").json()[0]["id"]
+    ok = client.get(f"/patterns/{pid}/instances/{date.today() + timedelta(days=7)}")
+    assert ok.status_code == 200 and ok.json()["departure_time"].startswith(str(date.today() + timedelta(days=7)))
+    assert client.get(f"/patterns/{pid}/instances/{date.today() + timedelta(days=PATTERN_HORIZON_DAYS + 1)}").status_code == 400
@@ -0,0 +1,14 @@
+import pytest
+
+from profiler import Sampler
+
+
+def test_sampler_error_reaches_future(monkeypatch):
+    s = Sampler(interval_ms=1)
+    def boom(*a): raise RuntimeError("boom")
+    monkeypatch.setattr(s, "_sample_once", boom)
+    with pytest.raises(RuntimeError, match="boom"):
+        s.run(1).result(timeout=5)
+    # หลัง error ต้องเริ่ม profile ใหม่ได้ (ไม่ค้าง Busy)
+    monkeypatch.undo()
+    assert s.run(0.01).result(timeout=5)[1]["samples"] >= 1
@@ -0,0 +1,49 @@
+import pytest
+from sqlmodel import Session
+
+from database import engine
+from model import Ticket
+import reservation
+from reservation import BOOKING_MODE, ReservationEngine, reservations
+
+
+@pytest.fixture
+def res(client):
+    """memory mode ใช้ตัวจริงของแอป; mode อื่นใช้ engine ใหม่ (state ใน memory ไม่ชนกับของแอป)"""
+    if BOOKING_MODE == "memory":
+        yield reservations; return
+    r = ReservationEngine(flush_interval=60)   # interval ยาว: ต้อง flush เพราะ book() ปลุก ไม่ใช่เพราะครบเวลา
+    r.start()
+    yield r
+    r.stop()
+
+
+def _car(client):
+    svc = client.get("/services", params={"limit": 1}).json()[0]["id"]
+    return svc, client.get(f"/services/{svc}").json()["cars"][0]
+
+
+def test_book_returns_after_ticket_is_committed(client, res):
+    svc, car = _car(client)
+    t = res.book(svc, car["car_type"], 1)
+    with Session(engine) as session:
+        row = session.get(Ticket, t.id)
+    assert row is not None and (row.service_id, row.quantity) == (svc, 1)
+
+
+def test_flush_failure_reaches_caller_and_returns_seats(client, res, monkeypatch):
+    svc, car = _car(client)
+    res.book(svc, car["car_type"], 1)   # โหลดตู้และ id ตั๋วถัดไปก่อนทำให้ DB เสีย
+    before = res.reserved(svc, car["car_type"])
+
+    class Broken:
+        def begin(self): raise RuntimeError("database is locked")
+    monkeypatch.setattr(reservation, "engine", Broken())
+    with pytest.raises(RuntimeError, match="locked"):
+        res.book(svc, car["car_type"], 2)
+    assert res.reserved(svc, car["car_type"]) == before
+    monkeypatch.undo()
+    t = res.book(svc, car["car_type"], 1)   # flush รอบถัดไปเขียนได้ตามปกติ
+    assert res.reserved(svc, car["car_type"]) == before + 1
+    with Session(engine) as session:
+        assert session.get(Ticket, t.id) is not None
@@ -0,0 +1,42 @@
+from datetime import date, datetime, time, timezone, timedelta
+
+
+def _aware_and_local(hour: int):
+    """เวลาเดียวกันสองแบบ: มี offset +07:00 และเวลาท้องถิ่นของ server แบบ naive"""
+    aware = datetime.combine(date.today(), time(hour), tzinfo=timezone(timedelta(hours=7)))
+    return aware, aware.astimezone().replace(tzinfo=None)
+
+
+def test_search_services_accepts_utc_offset(client):
+    (s, s_local), (e, e_local) = _aware_and_local(8), _aware_and_local(14)
+    r = client.get("/services/search", params={"start": s.isoformat(), "end": e.isoformat()})
+    assert r.status_code == 200
+    assert r.json() == client.get("/services/search", params={"start": s_local.isoformat(), "end": e_local.isoformat()}).json()
+
+
+def test_search_trips_accepts_utc_offset(client):
+    stops = client.get(f"/services/{client.get('/services').json()[0]['id']}").json()["stops"]
+    od = {"origin": stops[0]["station"]["id"], "destination": stops[-1]["station"]["id"]}
+    (s, s_local), (e, e_local) = _aware_and_local(0), _aware_and_local(23)
+    r = client.get("/trips/search", params={**od, "start": s.isoformat(), "end": e.isoformat()})
+    assert r.status_code == 200
+    assert r.json() == client.get("/trips/search", params={**od, "start": s_local.isoformat(), "end": e_local.isoformat()}).json()
+
+
+def test_search_journeys_accepts_utc_offset(client):
+    stops = client.get(f"/services/{client.get('/services').json()[0]['id']}").json()["stops"]
+    od = {"origin": stops[0]["station"]["id"], "destination": stops[-1]["station"]["id"]}
+    t, t_local = _aware_and_local(5)
+    r = client.get("/journeys/search", params={**od, "depart_after": t.isoformat()})
+    assert r.status_code == 200
+    assert r.json() == client.get("/journeys/search", params={**od, "depart_after": t_local.isoformat()}).json()
+
+
+def test_window_availability_accepts_utc_offset(client):
+    (s, s_local), (e, e_local) = _aware_and_local(8), _aware_and_local(14)
+    r = client.get("/availability", params={"start": s.isoformat(), "end": e.isoformat()})
+    assert r.status_code == 200
+    local = client.get("/availability", params={"start": s_local.isoformat(), "end": e_local.isoformat()}).json()
+    assert r.json() == local
+    assert [a["service_id"] for a in local] == [x["id"] for x in client.get(
+        "/services/search", params={"start": s_local.isoformat(), "end": e_local.isoformat()}).json()]
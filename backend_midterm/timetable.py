@@ -0,0 +1,228 @@
+# timetable.py  (ตารางเดินรถแบบกะทัดรัดในหน่วยความจำ: typed arrays + index สำหรับค้นตามเวลา/สถานี + RAPTOR)
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlmodel import Session, select
+
+from model import Service, ServiceStop, Station, DirectionEnum
+
+EPOCH = datetime(2000, 1, 1)
+INF = 2**31 - 1
+DIRECTIONS = list(DirectionEnum)
+
+
+def to_sec(dt: datetime) -> int:
+    return int((dt - EPOCH).total_seconds())
+
+def from_sec(s: int) -> datetime:
+    return EPOCH + timedelta(seconds=s)
+
+def to_min(dt: datetime) -> int:
+    return to_sec(dt) // 60
+
+def from_min(m: int) -> datetime:
+    return EPOCH + timedelta(minutes=m)
+
+
+class Route:
+    """ขบวนที่จอดสถานีชุดเดียวกันตามลำดับเดียวกัน และไม่แซงกัน (FIFO)
+    times เก็บแบบ stop-major: times[pos*T + trip] -> bisect หา trip แรกที่ออกหลังเวลาใด ๆ ได้ทันที"""
+    __slots__ = ("stops", "trips", "times")
+
+    def __init__(self, stops: array, trips: array, times: array):
+        self.stops, self.trips, self.times = stops, trips, times
+
+    def at(self, trip: int, pos: int) -> int:
+        return self.times[pos * len(self.trips) + trip]
+
+    def earliest_trip(self, pos: int, ready: int) -> int | None:
+        T = len(self.trips)
+        i = bisect_left(self.times, ready, pos * T, pos * T + T) - pos * T
+        return i if i < T else None
+
+
+def _split_fifo(stops: Tuple[int, ...], trips: List[Tuple[int, List[int]]]) -> List[Route]:
+    """แบ่งขบวนที่จอดชุดเดียวกันเป็นหลาย route ถ้ามีขบวนแซงกัน (RAPTOR ต้องการ FIFO)"""
+    groups: list[list[Tuple[int, List[int]]]] = []
+    for sid, times in sorted(trips, key=lambda t: (t[1][0], t[0])):
+        for g in groups:
+            if all(a <= b for a, b in zip(g[-1][1], times)):
+                g.append((sid, times)); break
+        else:
+            groups.append([(sid, times)])
+    routes = []
+    for g in groups:
+        flat = array("i", (g[t][1][p] for p in range(len(stops)) for t in range(len(g))))
+        routes.append(Route(array("i", stops), array("i", (sid for sid, _ in g)), flat))
+    return routes
+
+
+class Timetable:
+    """snapshot อ่านอย่างเดียวของ Service/ServiceStop/Station — สร้างใหม่ทั้งก้อนแล้วสลับ reference (atomic)
+
+    ระดับขบวน (index i เรียงตาม departure, id): ids, dep/arr (วินาทีนับจาก EPOCH), line, direction, code, origin
+    ป้ายหยุด (CSR): สถานีของขบวน i คือ stop_st[stop_ptr[i]:stop_ptr[i+1]]
+    สถานี -> (ขบวน, ลำดับป้าย): at_station[st] = (array ของ i, array ของ pos)
+    เวลาที่แต่ละป้ายเป็นค่าประมาณ: เฉลี่ยเส้นตรงระหว่างเวลาออกกับเวลาถึง (ปัดเป็นนาที)"""
+
+    def __init__(self, services: list, stops: List[Tuple[int, int]], stations: list):
+        services = sorted(services, key=lambda s: (s[5], s[0]))   # (id, line_id, code, origin, direction, dep, arr)
+        self.ids = array("i", (s[0] for s in services))
+        self.line = array("i", (s[1] for s in services))
+        self.code = [s[2] for s in services]
+        self.origin = [s[3] for s in services]
+        self.direction = array("b", (DIRECTIONS.index(DirectionEnum(s[4])) for s in services))
+        self.dep = array("q", (to_sec(s[5]) for s in services))
+        self.arr = array("q", (to_sec(s[6]) for s in services))
+        self.index_of = {sid: i for i, sid in enumerate(self.ids)}
+
+        seq: dict[int, list[int]] = {}
+        for service_id, station_id in stops:
+            seq.setdefault(service_id, []).append(station_id)
+        self.stop_ptr, self.stop_st = array("i", [0]), array("i")
+        at: dict[int, tuple[list, list]] = {}
+        for i, sid in enumerate(self.ids):
+            for pos, st in enumerate(seq.get(sid, ())):
+                self.stop_st.append(st)
+                lst = at.setdefault(st, ([], []))
+                lst[0].append(i); lst[1].append(pos)
+            self.stop_ptr.append(len(self.stop_st))
+        self.at_station = {st: (array("i", i), array("i", p)) for st, (i, p) in at.items()}
+
+        self.stations = {sid: (th, en) for sid, th, en in stations}
+        # ชื่อสถานีซ้ำกันได้ถ้าต่างตัวพิมพ์ (เช่น "BANGKOK" สายเหนือ กับ "Bangkok" สายตะวันออก)
+        self.by_name: dict[str, list[int]] = {}
+        for sid, _, en in stations:
+            self.by_name.setdefault(en.casefold(), []).append(sid)
+
+        # routes สำหรับ RAPTOR (หน่วยนาที)
+        by_pattern: dict[Tuple[int, ...], list] = {}
+        for i in range(len(self.ids)):
+            n = self.n_stops(i)
+            if n < 2: continue
+            st = tuple(self.stop_st[self.stop_ptr[i]:self.stop_ptr[i + 1]])
+            by_pattern.setdefault(st, []).append((self.ids[i], [self.stop_time(i, k) // 60 for k in range(n)]))
+        self.routes: List[Route] = []
+        for stations_seq, trips in by_pattern.items():
+            self.routes.extend(_split_fifo(stations_seq, trips))
+        self.routes_at: dict[int, list[Tuple[int, int]]] = {}
+        for r, route in enumerate(self.routes):
+            for pos, st in enumerate(route.stops):
+                self.routes_at.setdefault(st, []).append((r, pos))
+
+    @classmethod
+    def build(cls, session: Session) -> "Timetable":
+        services = session.exec(select(
+            Service.id, Service.line_id, Service.code, Service.origin, Service.direction,
+            Service.departure_time, Service.arrival_time,
+        )).all()
+        stops = session.exec(select(ServiceStop.service_id, ServiceStop.station_id)
+                             .order_by(ServiceStop.service_id, ServiceStop.stop_order)).all()
+        stations = session.exec(select(Station.id, Station.name_th, Station.name_en)).all()
+        return cls(services, stops, stations)
+
+    # ---------- ระดับขบวน ----------
+    def n_stops(self, i: int) -> int:
+        return self.stop_ptr[i + 1] - self.stop_ptr[i]
+
+    def stop_time(self, i: int, pos: int) -> int:
+        """วินาทีที่ป้าย pos (0-based) ของขบวน i"""
+        n, dep = self.n_stops(i), self.dep[i]
+        if n <= 1: return dep
+        return dep + round((self.arr[i] - dep) / 60 * pos / (n - 1)) * 60
+
+    def window(self, start: datetime, end: datetime) -> range:
+        """index ของขบวนที่ออกในช่วง [start, end] — binary search บน dep ที่เรียงไว้แล้ว"""
+        return range(bisect_left(self.dep, to_sec(start)), bisect_right(self.dep, to_sec(end)))
+
+    def basic(self, i: int) -> dict:
+        """field ของ ServiceBasicOut"""
+        return dict(id=self.ids[i], line_id=self.line[i], code=self.code[i], origin=self.origin[i],
+                    direction=DIRECTIONS[self.direction[i]], departure_time=from_sec(self.dep[i]),
+                    arrival_time=from_sec(self.arr[i]))
+
+    # ---------- สถานี ----------
+    def resolve(self, key: str) -> list[int]:
+        """station id (ตัวเลข) หรือ name_en (ไม่สนตัวพิมพ์) -> station ids"""
+        if key.isdigit(): return [int(key)] if int(key) in self.stations else []
+        return self.by_name.get(key.strip().casefold(), [])
+
+    def trips(self, from_ids: list[int], to_ids: list[int], start: datetime, end: datetime) -> list[tuple]:
+        """ขบวนที่จอด from ก่อน to และออกจาก from ในช่วง start–end (set intersection ของขบวนที่ผ่านสองสถานี)
+        คืน (i, from_st, from_pos, to_st, to_pos, dep_sec, arr_sec) เรียงตามเวลาออก"""
+        lo, hi = to_sec(start), to_sec(end)
+        out = []
+        for o in from_ids:
+            at_o = dict(zip(*self.at_station.get(o, ((), ()))))
+            for d in to_ids:
+                at_d = dict(zip(*self.at_station.get(d, ((), ()))))
+                for i in at_o.keys() & at_d.keys():
+                    fp, tp = at_o[i], at_d[i]
+                    if fp >= tp: continue
+                    dep = self.stop_time(i, fp)
+                    if lo <= dep <= hi:
+                        out.append((i, o, fp, d, tp, dep, self.stop_time(i, tp)))
+        out.sort(key=lambda t: (t[5], self.ids[t[0]]))
+        return out
+
+    # ---------- RAPTOR ----------
+    def plan(self, sources: List[int], targets: List[int], depart: int,
+             max_transfers: int = 2, min_transfer: int = 10) -> List[List[tuple]]:
+        """RAPTOR: earliest arrival ต่อจำนวนต่อรถ (Pareto บน arrival × transfers); depart เป็นนาที
+        คืน list ของ journey; แต่ละ journey คือ list ของ leg (service_id, from_st, from_pos, to_st, to_pos, dep, arr)"""
+        targets_set, sources_set = set(targets), set(sources)
+        labels: list[dict[int, int]] = [{s: depart for s in sources}]   # round k: station -> arrival (ใช้ ≤k ขบวน)
+        parents: list[dict[int, tuple]] = [{}]
+        best = dict(labels[0])
+        marked = set(sources)
+        journeys, target_best, recorded = [], INF, INF
+        for k in range(1, max_transfers + 2):
+            prev = labels[k - 1]
+            cur, par = dict(prev), {}
+            queue: dict[int, int] = {}
+            for p in marked:
+                for r, pos in self.routes_at.get(p, ()):
+                    if pos < queue.get(r, INF): queue[r] = pos
+            marked = set()
+            for r, start in queue.items():
+                route = self.routes[r]
+                trip, board = None, None
+                for pos in range(start, len(route.stops)):
+                    st = route.stops[pos]
+                    if trip is not None:
+                        t = route.at(trip, pos)
+                        if t < best.get(st, INF) and t < target_best:
+                            best[st] = cur[st] = t
+                            par[st] = (r, trip, board, pos)
+                            marked.add(st)
+                            if st in targets_set: target_best = t
+                    if st in prev:
+                        # ต่อรถที่สถานีเดียวกันต้องเผื่อเวลาเปลี่ยนขบวน (ยกเว้นต้นทาง)
+                        ready = prev[st] + (0 if st in sources_set else min_transfer)
+                        if trip is None or ready <= route.at(trip, pos):
+                            t2 = route.earliest_trip(pos, ready)
+                            if t2 is not None and (trip is None or route.at(t2, pos) < route.at(trip, pos)):
+                                trip, board = t2, pos
+            labels.append(cur); parents.append(par)
+            if target_best < recorded:
+                tg = next(t for t in targets if t in par and cur[t] == target_best)
+                journeys.append(self._backtrack(parents, k, tg))
+                recorded = target_best
+            if not marked: break
+        return journeys
+
+    def _backtrack(self, parents: list[dict[int, tuple]], k: int, st: int) -> List[tuple]:
+        """ย้อน parent pointer จากปลายทาง: label ของ st ในรอบ k มาจากรอบ j ล่าสุด (≤k) ที่มี parent"""
+        legs = []
+        while k > 0:
+            j = next((j for j in range(k, 0, -1) if st in parents[j]), None)
+            if j is None: break
+            r, trip, board, alight = parents[j][st]
+            route = self.routes[r]
+            frm = route.stops[board]
+            legs.append((route.trips[trip], frm, board, st, alight, route.at(trip, board), route.at(trip, alight)))
+            st, k = frm, j - 1
+        return legs[::-1]